@@ -0,0 +1,108 @@
+# alerts.py
+from collections import deque
+
+
+class AlertWindow:
+    """
+    Скользящее окно алертов по времени: счётчики (всего и по символу)
+    ведутся на ходу, чтение — O(1), вытеснение старых — амортизированно O(1).
+    Память ограничена числом алертов внутри окна.
+    """
+
+    __slots__ = ("window_ms", "total", "_events", "_by_symbol")
+
+    def __init__(self, window_ms):
+        self.window_ms = window_ms
+        self.total = 0
+        self._events = deque()  # (ts_ms, symbol) в порядке поступления
+        self._by_symbol = {}
+
+    def add(self, symbol, ts_ms):
+        self._events.append((ts_ms, symbol))
+        self._by_symbol[symbol] = self._by_symbol.get(symbol, 0) + 1
+        self.total += 1
+
+    def expire(self, now_ms):
+        cutoff = now_ms - self.window_ms
+        events = self._events
+        while events and events[0][0] < cutoff:
+            _, symbol = events.popleft()
+            left = self._by_symbol[symbol] - 1
+            if left:
+                self._by_symbol[symbol] = left
+            else:
+                del self._by_symbol[symbol]
+            self.total -= 1
+
+    def count(self, now_ms, symbol=None):
+        """Алертов за окно до now_ms (всего или по символу)."""
+        self.expire(now_ms)
+        if symbol is None:
+            return self.total
+        return self._by_symbol.get(symbol, 0)
+
+    def events(self):
+        return list(self._events)
+
+
+class AlertTracker:
+    """
+    Учёт отправленных алертов: дедупликация по event_id и окна для
+    BUILDUP-счётчика / market state (alerts) и activity regime (activity).
+    event_id живут, пока не выйдут из самого длинного окна.
+    """
+
+    __slots__ = ("alerts", "activity", "id_ttl_ms", "_ids")
+
+    def __init__(self, alert_window_ms, activity_window_ms):
+        self.alerts = AlertWindow(alert_window_ms)
+        self.activity = (
+            self.alerts if activity_window_ms == alert_window_ms
+            else AlertWindow(activity_window_ms)
+        )
+        self.id_ttl_ms = max(alert_window_ms, activity_window_ms)
+        self._ids = {}  # event_id -> ts_ms; порядок вставки = порядок времени
+
+    def record(self, event_id, symbol, ts_ms):
+        """False — этот event_id уже учтён."""
+        self._evict_ids(ts_ms)
+        if event_id in self._ids:
+            return False
+
+        self._ids[event_id] = ts_ms
+        self.alerts.add(symbol, ts_ms)
+        if self.activity is not self.alerts:
+            self.activity.add(symbol, ts_ms)
+        self.alerts.expire(ts_ms)
+        return True
+
+    def _evict_ids(self, now_ms):
+        cutoff = now_ms - self.id_ttl_ms
+        ids = self._ids
+        while ids:
+            event_id = next(iter(ids))
+            if ids[event_id] >= cutoff:
+                break
+            del ids[event_id]
+
+    def __len__(self):
+        return len(self._ids)
+
+    def checkpoint(self):
+        longest = max((self.alerts, self.activity), key=lambda w: w.window_ms)
+        return {"ids": dict(self._ids), "events": longest.events()}
+
+    def restore(self, saved, now_ms):
+        """Только то, что ещё внутри окон; возвращает число восстановленных алертов."""
+        cutoff = now_ms - self.id_ttl_ms
+        for event_id, ts_ms in saved["ids"].items():
+            if ts_ms >= cutoff:
+                self._ids[event_id] = ts_ms
+        for ts_ms, symbol in saved["events"]:
+            if ts_ms >= cutoff:
+                self.alerts.add(symbol, ts_ms)
+                if self.activity is not self.alerts:
+                    self.activity.add(symbol, ts_ms)
+        self.alerts.expire(now_ms)
+        self.activity.expire(now_ms)
+        return self.alerts.total
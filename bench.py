@@ -0,0 +1,437 @@
+# bench.py
+"""
+Бенчмарки горячих путей на синтетических данных.
+
+    python bench.py                      # всё, JSON в stdout
+    python bench.py --quick --out b.json
+    python bench.py --only ingest tick
+
+Разделы:
+  ingest  — кадров/с через ws.dispatch (aggTrade, forceOrder-каскады, markPrice, смесь)
+  scoring — стоимость оценки одного символа: calculate_risk + detect_divergence
+            + calculate_confidence и то же через risk_batch, на 256 и 2048 символах
+  tick    — полный risk_tick (режим, activity, все символы) на 16/100/500 символах
+  log     — log_event (постановка в очередь) и flush() до локального stub-сервера
+
+Данные детерминированы (--seed); результаты сравнимы между релизами.
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import bot
+import clock
+import divergence
+import logger
+import meta
+import risk
+import risk_batch
+import triggers
+import tsstore
+import ws_binance as ws
+from config import LIQ_THRESHOLDS, SYMBOLS
+from symbol_state import SymbolState
+
+START_TS = 1_700_000_000.0
+
+
+# =========================
+# ГЕНЕРАТОРЫ
+# =========================
+
+def _frame(symbol, stream, data):
+    return json.dumps({"stream": f"{symbol.lower()}@{stream}", "data": data})
+
+
+def gen_agg_trades(symbols, n, rnd):
+    """Пачки сделок: символ держит серию из 5–50 сделок подряд, как в горячие минуты."""
+    frames = []
+    while len(frames) < n:
+        s = rnd.choice(symbols)
+        buy_bias = rnd.random()
+        for _ in range(rnd.randint(5, 50)):
+            frames.append(_frame(s, "aggTrade", {
+                "e": "aggTrade", "s": s, "p": f"{rnd.uniform(1, 60000):.2f}",
+                "q": f"{rnd.expovariate(1.0):.4f}", "T": 0, "m": rnd.random() > buy_bias,
+            }))
+    return frames[:n]
+
+
+def gen_force_orders(symbols, n, rnd):
+    """Каскады ликвидаций: десятки ордеров одной стороны по одному символу."""
+    frames = []
+    while len(frames) < n:
+        s = rnd.choice(symbols)
+        side = rnd.choice(("SELL", "BUY"))
+        price = rnd.uniform(1, 60000)
+        for _ in range(rnd.randint(10, 80)):
+            price *= 1 - 0.0005 if side == "SELL" else 1 + 0.0005
+            frames.append(_frame(s, "forceOrder", {
+                "e": "forceOrder",
+                "o": {"s": s, "S": side, "q": f"{rnd.expovariate(0.1):.3f}", "ap": f"{price:.2f}"},
+            }))
+    return frames[:n]
+
+
+def gen_mark_prices(symbols, n, rnd):
+    """markPrice@1s: по кадру на символ в секунду, цена — случайное блуждание."""
+    prices = {s: rnd.uniform(1, 60000) for s in symbols}
+    frames = []
+    while len(frames) < n:
+        for s in symbols:
+            prices[s] *= 1 + rnd.gauss(0, 0.0005)
+            frames.append(_frame(s, "markPrice@1s", {
+                "e": "markPriceUpdate", "s": s, "p": f"{prices[s]:.4f}",
+                "r": f"{rnd.gauss(0.0001, 0.0003):.8f}",
+            }))
+    return frames[:n]
+
+
+def gen_mixed(symbols, n, rnd):
+    frames = (
+        gen_agg_trades(symbols, int(n * 0.85), rnd)
+        + gen_mark_prices(symbols, int(n * 0.12), rnd)
+        + gen_force_orders(symbols, n - int(n * 0.85) - int(n * 0.12), rnd)
+    )
+    rnd.shuffle(frames)
+    return frames
+
+
+# =========================
+# УТИЛИТЫ
+# =========================
+
+def _summary(samples_ns):
+    ms = sorted(x / 1e6 for x in samples_ns)
+    return {
+        "runs": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min_ms": round(ms[0], 3),
+    }
+
+
+def _reset_state():
+    bot.cache.clear()
+    bot.alert_tracker = bot.AlertTracker(
+        bot.alert_tracker.alerts.window_ms, bot.alert_tracker.activity.window_ms
+    )
+    bot.last_funding.clear()
+    bot.prev_funding.clear()
+    bot.last_oi_snapshot.clear()
+    divergence._last_seen.clear()
+    triggers.dirty.clear()
+
+
+def _register_symbols(n):
+    """Синтетическая вселенная из n символов во всех структурах, что читает risk_tick."""
+    symbols = [f"BENCH{i:03d}USDT" for i in range(n)]
+    for s in symbols:
+        ws.states[s] = SymbolState(s)
+        bot.price_history[s] = deque(maxlen=3)
+        bot.oi_poller.oi_window[s] = deque(maxlen=bot.oi_poller.window)
+        LIQ_THRESHOLDS.setdefault(s, 5_000_000)
+    return symbols
+
+
+# =========================
+# РАЗДЕЛЫ
+# =========================
+
+def bench_ingest(rnd, n, repeat):
+    symbols = SYMBOLS
+    table = ws.build_stream_table(symbols)
+    workloads = {
+        "agg_trade": gen_agg_trades(symbols, n, rnd),
+        "force_order": gen_force_orders(symbols, n, rnd),
+        "mark_price": gen_mark_prices(symbols, n, rnd),
+        "mixed": gen_mixed(symbols, n, rnd),
+    }
+
+    out = {"frames": n, "symbols": len(symbols)}
+    for name, frames in workloads.items():
+        best = None
+        for _ in range(repeat):
+            sim = clock.SimClock(START_TS)
+            clock.set_clock(sim)
+            for st in ws.states.values():
+                st.__init__(st.symbol)
+            triggers.dirty.clear()
+
+            t = time.perf_counter_ns()
+            for i, raw in enumerate(frames):
+                if not i & 1023:
+                    sim.advance(START_TS + i / 5000)
+                ws.dispatch(raw, table)
+            elapsed = time.perf_counter_ns() - t
+            best = elapsed if best is None else min(best, elapsed)
+        out[name] = {
+            "frames_per_sec": int(n / (best / 1e9)),
+            "ns_per_frame": round(best / n, 1),
+        }
+    clock.set_clock()
+    return out
+
+
+def _random_inputs(rnd, k):
+    rows = []
+    for i in range(k):
+        symbol = SYMBOLS[i % len(SYMBOLS)]
+        base_oi = rnd.uniform(1e5, 1e8)
+        oi_window = [(START_TS + j * 300, base_oi * (1 + rnd.gauss(0, 0.01))) for j in range(12)]
+        oi_live = [(START_TS + j * 10, base_oi * (1 + rnd.gauss(0, 0.004))) for j in range(30)]
+        liq_long = rnd.choice((0.0, rnd.expovariate(1 / 5e6)))
+        liq_short = rnd.choice((0.0, rnd.expovariate(1 / 5e6)))
+        rows.append({
+            "symbol": symbol,
+            "funding": rnd.gauss(0.0001, 0.0004),
+            "prev_funding": rnd.gauss(0.0001, 0.0004),
+            "long_ratio": rnd.random(),
+            "oi_window": oi_window,
+            "oi_live": oi_live,
+            "liquidations": liq_long + liq_short,
+            "liq_threshold": LIQ_THRESHOLDS[symbol],
+            "price": rnd.uniform(1, 60000),
+            "liq_sides": {"long": liq_long, "short": liq_short},
+            "price_trend": rnd.choice(("UP", "DOWN", "FLAT")),
+        })
+    return rows
+
+
+def bench_scoring(rnd, sizes, repeat):
+    """Скалярно и батчем на каждом размере; market regime один на тик, как в боте."""
+    return {str(k): _bench_scoring(rnd, k, repeat) for k in sizes}
+
+
+def _bench_scoring(rnd, k, repeat):
+    rows = _random_inputs(rnd, k)
+    state = "STRESS"
+
+    def scalar():
+        for r in rows:
+            score, direction, _, funding_spike, oi_spike, _ = risk.calculate_risk(
+                r["funding"], r["prev_funding"], r["long_ratio"], r["oi_window"],
+                r["liquidations"], r["liq_threshold"], r["price"], r["liq_sides"], r["oi_live"],
+            )
+            divergence.detect_divergence(
+                r["symbol"], state, r["long_ratio"], r["oi_window"],
+                r["price_trend"], r["liquidations"], r["oi_live"],
+            )
+            meta.calculate_confidence(
+                score, direction, oi_spike, funding_spike,
+                r["liquidations"], r["price"], r["liq_sides"],
+            )
+
+    def batched():
+        inputs = risk_batch.BatchInputs()
+        for r in rows:
+            inputs.add(
+                r["symbol"], r["funding"], r["prev_funding"], r["long_ratio"], r["oi_window"],
+                r["liquidations"], r["liq_threshold"], r["price"], r["liq_sides"], r["price_trend"],
+                r["oi_live"],
+            )
+        batch = risk_batch.evaluate(inputs, state)
+        for i, r in enumerate(rows):
+            batch.risk(i)
+            divergence.divergences_from_candidates(r["symbol"], batch.divergence_candidates(i))
+            batch.confidence[i]
+
+    out = {"symbols": k}
+    fns = {"scalar": scalar, "batch": batched}
+    samples = {name: [] for name in fns}
+    # замеры вперемешку: дрейф нагрузки машины не ложится на один вариант
+    for _ in range(repeat):
+        for name, fn in fns.items():
+            divergence._last_seen.clear()
+            t = time.perf_counter_ns()
+            fn()
+            samples[name].append(time.perf_counter_ns() - t)
+    for name in fns:
+        out[name] = {
+            "us_per_symbol": round(min(samples[name]) / k / 1000, 3),
+            **_summary(samples[name]),
+        }
+    out["speedup"] = round(out["scalar"]["us_per_symbol"] / out["batch"]["us_per_symbol"], 2)
+    return out
+
+
+def bench_tick(rnd, sizes, ticks, trades_per_symbol):
+    out = {}
+    saved_symbols = bot.SYMBOLS
+    saved_store = (tsstore.ENABLED, tsstore.TSSTORE_DIR)
+    # запись в хранилище — часть тика, но не в настоящий TSSTORE_DIR
+    store_dir = tempfile.TemporaryDirectory()
+    tsstore.ENABLED, tsstore.TSSTORE_DIR = True, store_dir.name
+
+    for n in sizes:
+        _reset_state()
+        symbols = _register_symbols(n)
+        table = ws.build_stream_table(symbols)
+        sim = clock.SimClock(START_TS)
+        clock.set_clock(sim)
+
+        for s in symbols:
+            base_oi = rnd.uniform(1e5, 1e8)
+            for j in range(12):
+                bot.oi_poller.oi_window[s].append((START_TS - (12 - j) * 300, base_oi * (1 + rnd.gauss(0, 0.02))))
+
+        frames = (
+            gen_agg_trades(symbols, n * trades_per_symbol, rnd)
+            + gen_mark_prices(symbols, n * 3, rnd)
+            + gen_force_orders(symbols, n * 2, rnd)
+        )
+
+        bot.SYMBOLS = symbols
+        samples = []
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                step = len(frames) // ticks
+                for t in range(ticks):
+                    sim.advance(START_TS + t * 10)
+                    for raw in frames[t * step:(t + 1) * step]:
+                        ws.dispatch(raw, table)
+                    # режим рынка/activity пересчитываются на каждом тике
+                    bot.last_regime_ts = 0
+                    bot.last_activity_ts = 0
+                    t0 = time.perf_counter_ns()
+                    bot.risk_tick()
+                    samples.append(time.perf_counter_ns() - t0)
+        finally:
+            bot.SYMBOLS = saved_symbols
+            clock.set_clock()
+            tsstore.close()
+
+        out[str(n)] = {
+            "symbols": n,
+            "us_per_symbol": round(statistics.median(samples) / n / 1000, 2),
+            **_summary(samples),
+        }
+
+    tsstore.ENABLED, tsstore.TSSTORE_DIR = saved_store
+    store_dir.cleanup()
+    return out
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_log(n):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    saved = (logger._SUPABASE_URL, logger._LOG_TO_SUPABASE, logger.LOG_QUEUE_MAX, logger._session, logger._spool)
+    logger._SUPABASE_URL = f"http://127.0.0.1:{server.server_port}"
+    logger._LOG_TO_SUPABASE = True
+    logger.LOG_QUEUE_MAX = n + 1
+    logger._session = None
+    logger._spool = None
+    logger._queue.clear()
+
+    payload = {"symbol": "BTCUSDT", "risk": 5, "funding": 0.0001, "price": 65000.5, "direction": "LONG"}
+    try:
+        t = time.perf_counter_ns()
+        for _ in range(n):
+            logger.log_event("risk_eval", payload)
+        enqueue_ns = time.perf_counter_ns() - t
+
+        sent_before = logger.stats["sent"]
+        t = time.perf_counter_ns()
+        asyncio.run(logger.flush())
+        flush_ns = time.perf_counter_ns() - t
+        sent = logger.stats["sent"] - sent_before
+    finally:
+        (logger._SUPABASE_URL, logger._LOG_TO_SUPABASE, logger.LOG_QUEUE_MAX,
+         logger._session, logger._spool) = saved
+        logger._queue.clear()
+        server.shutdown()
+
+    return {
+        "events": n,
+        "batch_size": logger.LOG_BATCH_SIZE,
+        "log_event_ns": round(enqueue_ns / n, 1),
+        "flush_rows_per_sec": int(sent / (flush_ns / 1e9)) if sent else 0,
+        "flush_ms_per_batch": round(flush_ns / 1e6 / max(1, -(-sent // logger.LOG_BATCH_SIZE)), 3),
+        "sent": sent,
+    }
+
+
+# =========================
+# CLI
+# =========================
+
+SECTIONS = ("ingest", "scoring", "tick", "log")
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": risk_batch.np.__version__,
+        "orjson": importlib.util.find_spec("orjson") is not None,
+    }
+
+
+def run(sections=SECTIONS, quick=False, seed=42):
+    rnd = random.Random(seed)
+    results = {"started_at": int(time.time()), "quick": quick, "seed": seed, "env": _environment()}
+
+    if "ingest" in sections:
+        results["ingest"] = bench_ingest(rnd, 20_000 if quick else 200_000, 1 if quick else 3)
+    if "scoring" in sections:
+        results["scoring"] = bench_scoring(rnd, (256,) if quick else (256, 2048), 3 if quick else 10)
+    if "tick" in sections:
+        results["tick"] = bench_tick(rnd, (16, 100, 500), 5 if quick else 20, 20 if quick else 100)
+    if "log" in sections:
+        results["log"] = bench_log(5_000 if quick else 50_000)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hot-path benchmarks with JSON output")
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a smoke run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.quick, args.seed)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
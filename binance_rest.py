@@ -0,0 +1,155 @@
+# binance_rest.py
+"""
+Общий клиент REST Binance: пул keep-alive соединений и бюджет веса запросов.
+
+Binance считает вес по IP в окне календарной минуты и возвращает текущее
+значение в заголовке X-MBX-USED-WEIGHT-1M. Каждый запрос сначала резервирует
+свой вес (WEIGHTS) в текущей минуте; если бюджет REST_WEIGHT_BUDGET исчерпан,
+запрос ждёт следующей минуты. Ответ сверяет учёт с заголовком — так видны и
+чужие запросы с того же IP. 429/418 блокируют все запросы на Retry-After.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from config import REST_WEIGHT_BUDGET
+
+BINANCE_FAPI = "https://fapi.binance.com"
+
+REST_POOL_SIZE = 16
+
+# вес по пути; не указанные — 1
+WEIGHTS = {
+    "/fapi/v1/aggTrades": 20,
+}
+
+_session = None
+_executor = ThreadPoolExecutor(max_workers=REST_POOL_SIZE, thread_name_prefix="binance-rest")
+
+
+def request_weight(url, params=None):
+    path = urlsplit(url).path
+    if path == "/fapi/v1/premiumIndex":
+        return 1 if params and params.get("symbol") else 10
+    if path == "/fapi/v1/markPriceKlines":
+        limit = int((params or {}).get("limit", 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    return WEIGHTS.get(path, 1)
+
+
+class WeightBudget:
+    """Учёт веса в окне минуты; потокобезопасный (sync-вызовы идут из пула)."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.minute = None
+        self.used = 0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "throttled_sec": 0.0, "rate_limited": 0}
+
+    def _roll(self, now):
+        minute = int(now // 60)
+        if minute != self.minute:
+            self.minute = minute
+            self.used = 0
+
+    def reserve(self, weight):
+        """0 — вес зарезервирован; иначе сколько секунд подождать до повтора."""
+        with self.lock:
+            now = time.time()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._roll(now)
+            # запрос тяжелее всего бюджета пропускаем в пустой минуте
+            if self.used and self.used + weight > self.budget:
+                return (self.minute + 1) * 60 - now + 0.05
+            self.used += weight
+            self.stats["requests"] += 1
+            return 0.0
+
+    def update(self, headers, status):
+        with self.lock:
+            now = time.time()
+            self._roll(now)
+            used = headers.get("X-MBX-USED-WEIGHT-1M")
+            if used is not None:
+                self.used = max(self.used, int(used))
+            if status in (418, 429):
+                self.stats["rate_limited"] += 1
+                retry = float(headers.get("Retry-After") or 60)
+                self.blocked_until = max(self.blocked_until, now + retry)
+
+    def _throttled(self, delay):
+        self.stats["throttled"] += 1
+        self.stats["throttled_sec"] += delay
+
+    def acquire(self, weight):
+        while (delay := self.reserve(weight)) > 0:
+            self._throttled(delay)
+            time.sleep(delay)
+
+    async def acquire_async(self, weight):
+        while (delay := self.reserve(weight)) > 0:
+            self._throttled(delay)
+            await asyncio.sleep(delay)
+
+
+budget = WeightBudget(REST_WEIGHT_BUDGET)
+
+
+@metrics.collector
+def _rest_metrics():
+    return [
+        ("binance_rest_requests_total", "counter", "REST requests sent", [({}, budget.stats["requests"])]),
+        ("binance_rest_weight_used", "gauge", "Request weight used in the current minute", [({}, budget.used)]),
+        ("binance_rest_weight_budget", "gauge", "Request weight budget per minute", [({}, budget.budget)]),
+        ("binance_rest_throttled_total", "counter", "Requests delayed by the weight budget", [
+            ({}, budget.stats["throttled"]),
+        ]),
+        ("binance_rest_rate_limited_total", "counter", "429/418 responses", [({}, budget.stats["rate_limited"])]),
+    ]
+
+
+def get_session():
+    """Один пул keep-alive соединений на все REST-запросы к Binance."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=REST_POOL_SIZE)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def _get(url, params, timeout):
+    r = get_session().get(url, params=params, timeout=timeout)
+    budget.update(r.headers, r.status_code)
+    r.raise_for_status()
+    return r.json()
+
+
+def get_json(url, params=None, timeout=10):
+    budget.acquire(request_weight(url, params))
+    return _get(url, params, timeout)
+
+
+async def get_json_async(url, params=None, timeout=10):
+    """
+    Неблокирующий GET: ожидание бюджета — на loop, сам запрос уходит
+    в собственный пул потоков (по размеру пула соединений).
+    wait_for гарантирует общий таймаут, даже если сокет завис.
+    """
+    await budget.acquire_async(request_weight(url, params))
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_executor, partial(_get, url, params, timeout)),
+        timeout=timeout + 1,
+    )
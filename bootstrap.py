@@ -0,0 +1,139 @@
+# bootstrap.py
+import asyncio
+import time
+
+import clock
+import recorder
+import ws_binance as ws
+from binance_rest import BINANCE_FAPI, get_json_async
+from config import INTERVAL_SECONDS, SYMBOLS, WINDOW_SECONDS
+from logger import log_event
+
+PREMIUM_INDEX_URL = f"{BINANCE_FAPI}/fapi/v1/premiumIndex"
+MARK_KLINES_URL = f"{BINANCE_FAPI}/fapi/v1/markPriceKlines"
+AGG_TRADES_URL = f"{BINANCE_FAPI}/fapi/v1/aggTrades"
+
+BOOTSTRAP_CONCURRENCY = 8
+BOOTSTRAP_TIMEOUT = 30
+AGG_TRADES_LIMIT = 1000
+
+# интервал свечей под шаг global_risk_loop (price_history = 1 точка на тик)
+_KLINE_INTERVALS = {60: "1m", 180: "3m", 300: "5m", 900: "15m", 1800: "30m", 3600: "1h"}
+
+
+async def _backfill_premium():
+    """Funding и mark price по всем символам одним запросом."""
+    data = await get_json_async(PREMIUM_INDEX_URL)
+    recorder.record("boot_premium", data)
+    return apply_premium(data)
+
+
+def apply_premium(data):
+    filled = 0
+    for item in data:
+        symbol = item.get("symbol")
+        if symbol not in SYMBOLS:
+            continue
+        st = ws.states[symbol]
+        st.funding = float(item["lastFundingRate"])
+        st.mark_price = float(item["markPrice"])
+        filled += 1
+    return filled
+
+
+async def _backfill_prices(symbol, price_history):
+    interval = _KLINE_INTERVALS.get(INTERVAL_SECONDS)
+    if interval is None:
+        return 0
+
+    # последняя свеча ещё не закрыта — её цену даст первый тик risk loop
+    limit = price_history[symbol].maxlen
+    klines = await get_json_async(
+        MARK_KLINES_URL, {"symbol": symbol, "interval": interval, "limit": limit}
+    )
+    recorder.record("boot_klines", {"symbol": symbol, "data": klines})
+    return apply_klines(symbol, klines, price_history)
+
+
+def apply_klines(symbol, klines, price_history):
+    closes = [float(k[4]) for k in klines[:-1]]
+    if not price_history[symbol]:
+        price_history[symbol].extend(closes)
+    return len(closes)
+
+
+async def _backfill_trades(symbol):
+    """
+    Последние aggTrades за WINDOW_SECONDS. Одного запроса (1000 сделок)
+    хватает на полное окно для спокойных символов; для BTC/ETH в горячие
+    минуты это только хвост окна, но соотношение лонг/шорт уже осмысленно.
+    """
+    trades = await get_json_async(AGG_TRADES_URL, {"symbol": symbol, "limit": AGG_TRADES_LIMIT})
+    recorder.record("boot_trades", {"symbol": symbol, "data": trades})
+    return apply_trades(symbol, trades, clock.now())
+
+
+def apply_trades(symbol, trades, now):
+    cutoff = now - WINDOW_SECONDS
+    # после восстановления из чекпоинта сделки до последнего кадра WS уже в окне
+    seen_upto = ws.states[symbol].last_update
+    added = 0
+    for t in trades:
+        ts = t["T"] / 1000
+        if ts < cutoff or (seen_upto is not None and ts <= seen_upto):
+            continue
+        ws.add_trade(symbol, ts, float(t["q"]), "short" if t["m"] else "long")
+        added += 1
+    return added
+
+
+async def warm_start(oi_poller, price_history, symbols=SYMBOLS, ws_state=True):
+    """
+    Прогрев окон до первого тика global_risk_loop: история OI, цены
+    для price_history, свежие сделки для trades_window, funding/mark price.
+    Все запросы идут параллельно; ошибки по символу не мешают остальным.
+
+    В pipeline.py части делятся между процессами: oi_poller / price_history
+    = None пропускают свои шаги, ws_state=False — funding/mark и сделки.
+    """
+    started = time.time()
+    sem = asyncio.Semaphore(BOOTSTRAP_CONCURRENCY)
+    errors = []
+
+    async def guarded(name, coro):
+        async with sem:
+            try:
+                return await coro
+            except Exception as e:
+                errors.append(f"{name}: {type(e).__name__} {e}")
+                return 0
+
+    async def total(coros):
+        return sum(await asyncio.gather(*coros))
+
+    async def nothing():
+        return 0
+
+    # сделки пишутся в окно до старта WS, иначе порядок по времени нарушится
+    results = await asyncio.gather(
+        oi_poller.backfill_async() if oi_poller is not None else nothing(),
+        guarded("premiumIndex", _backfill_premium()) if ws_state else nothing(),
+        total(
+            guarded(f"klines {s}", _backfill_prices(s, price_history)) for s in symbols
+        ) if price_history is not None else nothing(),
+        total(guarded(f"aggTrades {s}", _backfill_trades(s)) for s in symbols) if ws_state else nothing(),
+        return_exceptions=True,
+    )
+    results = [r if isinstance(r, int) else 0 for r in results]
+
+    summary = {
+        "elapsed_sec": round(time.time() - started, 2),
+        "oi_symbols": results[0],
+        "premium_symbols": results[1],
+        "price_points": results[2],
+        "trades": results[3],
+        "errors": errors[:10],
+    }
+    print(f"bootstrap: {summary}", flush=True)
+    log_event("bootstrap", summary)
+    return summary
@@ -1,20 +1,33 @@
 import asyncio
-import threading
+import signal
 import time
-from collections import defaultdict, deque
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import deque
 
-from oi_binance import BinanceOIPoller
+from alerts import AlertTracker
+from bootstrap import BOOTSTRAP_TIMEOUT, warm_start
+from oi_binance import MAX_OI_AGE, PERIOD_SECONDS, BinanceOIPoller
+from risk import oi_live_change
 
+import checkpoint
+import clock
+import dispatch
 import divergence
+import http_api
+import loop_monitor
 import meta
-import risk
+import metrics
+import params
+import recorder
+import risk_batch
+import triggers
+import tsstore
 import ws_binance as ws
 from config import *
-from logger import log_event, now_ts_ms
+from logger import log_event, now_ts_ms, run_shipper, spool_stats, stats as log_stats
 
 
-oi_poller = BinanceOIPoller(SYMBOLS, period="5m", window=12)
+oi_poller = BinanceOIPoller(SYMBOLS, period="5m", window=12, live_window=OI_LIVE_WINDOW)
+oi_live_spiking = {}  # symbol -> был ли спайк живого OI на прошлом опросе
 
 ACTIVITY_WINDOW_HOURS = 4
 ACTIVITY_CALM_MAX = 2
@@ -22,9 +35,11 @@ ACTIVITY_FRAGILE_MAX = 5
 last_activity_regime = None
 
 ALERT_WINDOW_HOURS = 4
-alert_history = defaultdict(deque)
-recorded_alert_ids = {}
+alert_tracker = AlertTracker(ALERT_WINDOW_HOURS * 3600 * 1000, ACTIVITY_WINDOW_HOURS * 3600 * 1000)
 LAST_RISK_EVAL_TS = 0
+ALERT_LEVEL_RANK = {None: 0, "BUILDUP": 1, "HARD": 2}
+alert_levels = {}  # symbol -> уровень риска на прошлой оценке
+trigger_alert_ts = {}  # symbol -> ts последнего HARD/BUILDUP по триггеру
 
 MARKET_REGIME_INTERVAL = 900
 last_regime_ts = 0
@@ -46,6 +61,11 @@ price_history = {s: deque(maxlen=3) for s in SYMBOLS}
 ws_task = None
 ws_running = False
 
+RISK_EVAL_SECONDS = metrics.Histogram(
+    "risk_eval_seconds", "Per-symbol risk evaluation: inputs, share of the batch pass, alerts"
+)
+RISK_TICK_SECONDS = metrics.Histogram("risk_tick_seconds", "Full risk loop pass over all symbols")
+
 
 
 def record_alert_if_first(alert_meta):
@@ -56,29 +76,36 @@ def record_alert_if_first(alert_meta):
     symbol = alert_meta.get("symbol")
     ts_ms = alert_meta.get("ts_unix_ms")
 
-    if not event_id or not symbol or not ts_ms or event_id in recorded_alert_ids:
+    if not event_id or not symbol or not ts_ms:
         return
 
-    recorded_alert_ids[event_id] = ts_ms
-    alert_history[symbol].append(ts_ms)
-
-    cutoff = ts_ms - ALERT_WINDOW_HOURS * 3600 * 1000
-    while alert_history[symbol] and alert_history[symbol][0] < cutoff:
-        alert_history[symbol].popleft()
+    alert_tracker.record(event_id, symbol, ts_ms)
 
 
 def emit_alert(text, alert_meta, event_type="alert_sent"):
     record_alert_if_first(alert_meta)
     payload = {"text": text, **(alert_meta or {})}
-    print(f"{event_type}: {payload}", flush=True)
+    dispatch.submit(event_type, payload)
     log_event(event_type, payload)
 
 
-def detect_activity_regime_live():
-    now_ms = now_ts_ms()
-    cutoff = now_ms - ACTIVITY_WINDOW_HOURS * 3600 * 1000
+def trigger_alert_due(symbol, level, now_ms):
+    """
+    HARD/BUILDUP по триггеру — только при росте уровня с прошлой оценки и не
+    чаще раза в INTERVAL_SECONDS на символ. Символ, который держится выше
+    порога, алертит с каденсом sweep, а не на каждое срабатывание триггера.
+    """
+    if ALERT_LEVEL_RANK[level] <= ALERT_LEVEL_RANK[alert_levels.get(symbol)]:
+        return False
+    last = trigger_alert_ts.get(symbol)
+    if last is not None and now_ms - last < INTERVAL_SECONDS * 1000:
+        return False
+    trigger_alert_ts[symbol] = now_ms
+    return True
 
-    alerts_count = sum(1 for q in alert_history.values() for ts in q if ts >= cutoff)
+
+def detect_activity_regime_live():
+    alerts_count = alert_tracker.activity.count(now_ts_ms())
 
     if alerts_count <= ACTIVITY_CALM_MAX:
         regime = "CALM"
@@ -99,10 +126,6 @@ def build_market_state():
     directions = []
 
     raw_buildups = 0
-    alert_buildups = 0
-
-    now_ms = now_ts_ms()
-    cutoff = now_ms - ALERT_WINDOW_HOURS * 3600 * 1000
 
     for _, data in cache.items():
         score, direction = data[0], data[1]
@@ -114,8 +137,7 @@ def build_market_state():
         if score is not None and score >= EARLY_ALERT_LEVEL:
             raw_buildups += 1
 
-    for q in alert_history.values():
-        alert_buildups += sum(1 for ts in q if ts >= cutoff)
+    alert_buildups = alert_tracker.alerts.count(now_ts_ms())
 
     avg_risk = sum(risks) / len(risks) if risks else 0
 
@@ -158,16 +180,23 @@ async def start_ws_safe():
 
 
 
-def detect_price_trend(symbol, prices):
+def price_delta(prices):
     if len(prices) < 2:
-        return "FLAT"
+        return None
 
     start = prices[0]
     end = prices[-1]
     if start <= 0:
+        return None
+
+    return (end - start) / start
+
+
+def detect_price_trend(symbol, prices):
+    delta = price_delta(prices)
+    if delta is None:
         return "FLAT"
 
-    delta = (end - start) / start
     trend_delta = divergence.get_price_trend_delta(symbol)
     if delta > trend_delta:
         return "UP"
@@ -176,7 +205,12 @@ def detect_price_trend(symbol, prices):
     return "FLAT"
 
 
-def detect_oi_trend(oi_window):
+def detect_oi_trend(oi_window, oi_live=None):
+    # спайк живого OI виден раньше, чем тренд часового окна
+    live_change = oi_live_change(oi_live)
+    if live_change is not None and abs(live_change) > OI_LIVE_SPIKE_THRESHOLD:
+        return "UP" if live_change > 0 else "DOWN"
+
     if len(oi_window) < 2:
         return "FLAT"
 
@@ -223,11 +257,11 @@ async def ws_watchdog():
     while True:
         await asyncio.sleep(60)
 
-        if not ws.last_update:
+        freshest = ws.freshest_update()
+        if freshest is None:
             continue
 
-        freshest = max(ws.last_update.values())
-        if time.time() - freshest > 180:
+        if clock.now() - freshest > 180:
             if ws_task and not ws_task.done():
                 ws_task.cancel()
                 try:
@@ -240,275 +274,481 @@ async def ws_watchdog():
 cache = {}
 
 
-async def global_risk_loop():
-    await asyncio.sleep(10)
+def collect_symbol_inputs(symbol, sweep=True):
+    """
+    Входы риск-оценки символа. Плановый проход (sweep) заодно ведёт историю
+    funding/OI/цены по тикам; внеочередная оценка её только читает.
+    """
+    now_ms = now_ts_ms()
+    snap = ws.snapshot(symbol)
 
-    while True:
-        global last_regime_ts, current_market_regime
+    f = snap.funding
+    pf = last_funding.get(symbol)
 
-        now_ms = now_ts_ms()
+    if f is not None and sweep:
+        prev_funding[symbol] = pf
+        last_funding[symbol] = f
 
-        if now_ms - last_regime_ts >= MARKET_REGIME_INTERVAL * 1000:
-            global stress_confirm_counter, stress_exit_counter, crowd_confirm_counter
+    oi_vals = oi_poller.oi_window.get(symbol, [])
+    oi_for_risk = oi_vals
 
-            state = build_market_state()
-            candidate = detect_market_regime(state)
+    if len(oi_vals) == 1:
+        prev_oi_snapshot = last_oi_snapshot.get(symbol)
+        if prev_oi_snapshot and prev_oi_snapshot > 0:
+            oi_for_risk = [(now_ms - INTERVAL_SECONDS * 1000, prev_oi_snapshot), oi_vals[0]]
 
-            if candidate == "STRESS":
-                stress_confirm_counter += 1
-            else:
-                stress_confirm_counter = 0
+    if oi_vals and sweep:
+        last_oi_snapshot[symbol] = oi_vals[-1][1]
 
-            if current_market_regime == "STRESS" and candidate != "STRESS":
-                stress_exit_counter += 1
-            else:
-                stress_exit_counter = 0
+    liq = snap.liquidations
+    pressure_ratio = snap.pressure_ratio
 
-            if candidate == "CROWD_IMBALANCE":
-                crowd_confirm_counter += 1
-            else:
-                crowd_confirm_counter = 0
+    price = snap.mark_price
+    liq_sides = snap.liq_sides
 
-            if candidate == "STRESS":
-                regime = "STRESS" if stress_confirm_counter >= STRESS_CONFIRM_TICKS else "LATENT_STRESS"
-            elif current_market_regime == "STRESS":
-                regime = candidate if stress_exit_counter >= STRESS_EXIT_TICKS else "STRESS"
-            elif candidate == "CROWD_IMBALANCE":
-                regime = "CROWD_IMBALANCE" if crowd_confirm_counter >= CROWD_CONFIRM_TICKS else "CALM"
-            else:
-                regime = candidate
+    prices = price_history[symbol]
+    if price is not None:
+        if sweep:
+            prices.append(price)
+        else:
+            # как если бы текущая цена была очередной точкой истории
+            prices = list(prices)[1 - prices.maxlen:] + [price]
 
-            log_event(
-                "market_regime",
-                {
-                    "regime": regime,
-                    "candidate": candidate,
-                    "stress_enter_ticks": stress_confirm_counter,
-                    "stress_exit_ticks": stress_exit_counter,
-                    "crowd_ticks": crowd_confirm_counter,
-                    **state,
-                },
+    return {
+        "symbol": symbol,
+        "now_ms": now_ms,
+        "snap": snap,
+        "funding": f,
+        "prev_funding": pf,
+        "oi": oi_for_risk,
+        "oi_live": oi_poller.oi_live.get(symbol),
+        "liq": liq,
+        "pressure_ratio": pressure_ratio,
+        "price": price,
+        "liq_sides": liq_sides,
+        "price_trend": detect_price_trend(symbol, prices),
+        "price_delta": price_delta(prices),
+        "trigger": None,
+    }
+
+
+def process_symbol(ctx, batch, i):
+    """Логирование, алерты и дивергенции по результату батч-оценки."""
+    global LAST_RISK_EVAL_TS
+
+    symbol = ctx["symbol"]
+    now_ms = ctx["now_ms"]
+    snap = ctx["snap"]
+    f = ctx["funding"]
+    oi_for_risk = ctx["oi"]
+    liq = ctx["liq"]
+    pressure_ratio = ctx["pressure_ratio"]
+    price = ctx["price"]
+    price_trend = ctx["price_trend"]
+
+    score, direction, reasons, funding_spike, oi_spike, risk_driver = batch.risk(i)
+    cache[symbol] = (score, direction, reasons, risk_driver)
+
+    risk_eval_payload = {
+        "symbol": symbol,
+        "risk": score,
+        "funding": f,
+        "price": price,
+    }
+    if score != 0:
+        risk_eval_payload.update(
+            {
+                "direction": direction,
+                "risk_driver": risk_driver,
+                "funding_spike": funding_spike,
+                "oi_spike": oi_spike,
+                "liq": liq,
+            }
+        )
+    if ctx["trigger"]:
+        risk_eval_payload["trigger"] = ctx["trigger"]
+    log_event("risk_eval", risk_eval_payload)
+
+    LAST_RISK_EVAL_TS = now_ms
+    triggers.mark_evaluated(ws.states[symbol], snap, LIQ_THRESHOLDS[symbol])
+
+    quality = meta.stream_quality(symbol, snap)
+
+    if tsstore.ENABLED:
+        oi_live = ctx["oi_live"]
+        tsstore.append(
+            symbol,
+            ts=snap.ts,
+            funding=f,
+            prev_funding=ctx["prev_funding"],
+            pressure=pressure_ratio,
+            oi_start=oi_for_risk[0][1] if oi_for_risk else None,
+            oi=oi_for_risk[-1][1] if oi_for_risk else None,
+            oi_len=len(oi_for_risk),
+            oi_live=oi_live[-1][1] if oi_live else None,
+            oi_live_change=oi_live_change(oi_live),
+            liq=liq,
+            liq_long=snap.liq_long,
+            liq_short=snap.liq_short,
+            price=price,
+            price_delta=ctx["price_delta"],
+            score=score,
+            direction=batch.direction[i],
+            driver=batch.driver[i],
+            regime=current_market_regime,
+            trigger=bool(ctx["trigger"]),
+            quality=quality["level"],
+        )
+
+    if quality["level"] == "LOW":
+        return
+
+    confidence = batch.confidence[i]  # meta.calculate_confidence, посчитан батчем
+    if funding_spike:
+        confidence += 1
+    if oi_spike:
+        confidence += 1
+    confidence = min(confidence, 5)
+    conf_level = meta.confidence_level(confidence)
+
+    if score >= HARD_ALERT_LEVEL and direction and confidence >= 3:
+        level = "HARD"
+    elif score >= EARLY_ALERT_LEVEL:
+        level = "BUILDUP"
+    else:
+        level = None
+
+    # внеочередная оценка не дублирует sweep: алерт только на рост уровня
+    triggered = ctx["trigger"] is not None
+    if triggered and not trigger_alert_due(symbol, level, now_ms):
+        alert = None
+    else:
+        alert = level
+    alert_levels[symbol] = level
+
+    if alert == "HARD":
+        text = (
+            f"🚨 HARD RISK ALERT {symbol}\n\n"
+            f"Risk: {score}\n"
+            f"Direction: {direction}\n"
+            f"Confidence: {conf_level}"
+        )
+        emit_alert(
+            text,
+            {
+                "symbol": symbol,
+                "risk": score,
+                "direction": direction,
+                "confidence": confidence,
+                "type": "HARD",
+                "event_id": f"{symbol}:{now_ms}:HARD",
+                "ts_unix_ms": now_ms,
+                "risk_driver": risk_driver,
+                "price": price,
+            },
+        )
+    elif alert == "BUILDUP":
+        symbol_alerts_count = alert_tracker.alerts.count(now_ms, symbol)
+
+        text = (
+            f"⚠️ RISK BUILDUP {symbol}\n\n"
+            f"Risk: {score}\n"
+            f"Direction: {direction}\n"
+            f"Alerts last {ALERT_WINDOW_HOURS}h: {symbol_alerts_count}"
+        )
+        if conf_level in ("MEDIUM", "HIGH") and reasons:
+            text += f"\nConfidence: {conf_level}\nReason: {reasons[0]}"
+
+        emit_alert(
+            text,
+            {
+                "symbol": symbol,
+                "risk": score,
+                "direction": direction,
+                "confidence": confidence,
+                "type": "BUILDUP",
+                "event_id": f"{symbol}:{now_ms}:BUILDUP",
+                "ts_unix_ms": now_ms,
+                "price": price,
+            },
+        )
+
+    oi_trend = detect_oi_trend(oi_for_risk, ctx["oi_live"])
+    divergences = divergence.divergences_from_candidates(
+        symbol, batch.divergence_candidates(i)
+    )
+
+    for idx, div_text in enumerate(divergences):
+        divergence_type = divergence_type_from_message(div_text)
+        confidence = divergence_confidence(
+            pressure_ratio=pressure_ratio,
+            liq=liq,
+            price_trend=price_trend,
+            oi_trend=oi_trend,
+            score=score,
+        )
+
+        emit_alert(
+            f"🧭 DIVERGENCE {symbol}\n\n{div_text}",
+            {
+                "symbol": symbol,
+                "type": "DIVERGENCE",
+                "event_id": f"{symbol}:{now_ms}:DIV:{idx}",
+                "ts_unix_ms": now_ms,
+                "market_regime": current_market_regime,
+                "price_trend": price_trend,
+                "pressure_ratio": round(pressure_ratio, 4),
+                "risk": score,
+                "price": price,
+                "divergence_type": divergence_type,
+                "confidence": confidence,
+                "pressure": round(pressure_ratio, 4),
+                "oi_trend": oi_trend,
+                "liquidations": liq,
+                "message": div_text,
+            },
+            event_type="risk_divergence",
+        )
+
+
+def evaluate_symbols(symbols, trigger_reasons=None):
+    """
+    Оценка набора символов: сбор входов по каждому, один векторный проход
+    risk_batch по всем, затем алерты по каждому.
+    trigger_reasons (symbol -> причина) — внеочередная оценка вне sweep.
+    """
+    sweep = trigger_reasons is None
+    ctxs = []
+    spent = []
+    inputs = risk_batch.BatchInputs()
+
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        try:
+            ctx = collect_symbol_inputs(symbol, sweep=sweep)
+            if not sweep:
+                ctx["trigger"] = trigger_reasons.get(symbol)
+            inputs.add(
+                symbol,
+                ctx["funding"],
+                ctx["prev_funding"],
+                ctx["pressure_ratio"],
+                ctx["oi"],
+                ctx["liq"],
+                LIQ_THRESHOLDS[symbol],
+                ctx["price"],
+                ctx["liq_sides"],
+                ctx["price_trend"],
+                ctx["oi_live"],
             )
+            ctxs.append(ctx)
+            spent.append(time.perf_counter() - t0)
+        except Exception as e:
+            log_event("risk_loop_error", {"symbol": symbol, "error": str(e)})
+
+    if not ctxs:
+        return
+
+    t0 = time.perf_counter()
+    try:
+        batch = risk_batch.evaluate(inputs, current_market_regime)
+    except Exception as e:
+        log_event("risk_loop_error", {"symbol": None, "error": str(e)})
+        return
+    batch_share = (time.perf_counter() - t0) / len(ctxs)
+
+    for i, ctx in enumerate(ctxs):
+        t0 = time.perf_counter()
+        try:
+            process_symbol(ctx, batch, i)
+        except Exception as e:
+            log_event("risk_loop_error", {"symbol": ctx["symbol"], "error": str(e)})
+        RISK_EVAL_SECONDS.observe(spent[i] + batch_share + time.perf_counter() - t0)
+
+    try:
+        http_api.publish(build_state())
+    except Exception as e:
+        log_event("risk_loop_error", {"symbol": None, "error": f"publish: {e}"})
+
+
+def build_state():
+    """Вычисленное состояние для /state: режимы и последний риск по символам."""
+    now = clock.now()
+    now_ms = int(now * 1000)
+    snaps = ws.snapshot_all(now)
+
+    symbols = {}
+    for symbol in SYMBOLS:
+        snap = snaps.get(symbol)
+        if snap is None:
+            continue
+        score, direction, reasons, risk_driver = cache.get(symbol, (None, None, [], None))
+        quality = meta.stream_quality(symbol, snap)
+        symbols[symbol] = {
+            "risk": score,
+            "direction": direction,
+            "reasons": reasons,
+            "risk_driver": risk_driver,
+            "funding": snap.funding,
+            "mark_price": snap.mark_price,
+            "pressure_ratio": round(snap.pressure_ratio, 4),
+            "liquidations": snap.liquidations,
+            "quality": quality["level"],
+            "quality_score": quality["score"],
+            "alerts_window": alert_tracker.alerts.count(now_ms, symbol),
+            "last_eval_ts": ws.states[symbol].last_eval_ts,
+        }
+
+    return {
+        "ts": now_ms,
+        "market_regime": current_market_regime,
+        "activity_regime": last_activity_regime,
+        "alerts_window_h": ALERT_WINDOW_HOURS,
+        "alerts_window": alert_tracker.alerts.count(now_ms),
+        "symbols": symbols,
+    }
+
 
-            current_market_regime = regime
-            last_regime_ts = now_ms
+def health_state():
+    now = clock.now()
+    freshest = ws.freshest_update()
+    ws_age = now - freshest if freshest is not None else None
+    risk_age = (now_ts_ms() - LAST_RISK_EVAL_TS) / 1000 if LAST_RISK_EVAL_TS else None
 
-        global last_activity_ts, last_activity_regime
+    ws_ok = ws_age is not None and ws_age < 180
+    risk_ok = risk_age is None or risk_age < 330
 
-        if now_ms - last_activity_ts >= ACTIVITY_REGIME_INTERVAL * 1000:
-            activity = detect_activity_regime_live()
+    return {
+        "status": "ok" if ws_ok and risk_ok else "degraded",
+        "ts": int(now * 1000),
+        "ws_last_msg_sec_ago": round(ws_age, 1) if ws_age is not None else None,
+        "risk_last_eval_sec_ago": round(risk_age, 1) if risk_age is not None else None,
+        "market_regime": current_market_regime,
+        "shards": {str(shard_id): h for shard_id, h in ws.shard_health.items()},
+        "loop_max_lag_sec": round(loop_monitor.stats["max_lag_sec"], 4),
+        "loop_blocks": loop_monitor.stats["blocks"],
+        "log": {**log_stats, "spool": spool_stats()},
+        "alert_sinks": dispatch.stats(),
+        "params": params.status,
+    }
 
-            if last_activity_regime is None:
-                last_activity_regime = activity["regime"]
-            elif last_activity_regime != activity["regime"]:
-                log_event(
-                    "activity_transition",
-                    {
-                        "from": last_activity_regime,
-                        "to": activity["regime"],
-                        "alerts": activity["alerts"],
-                        "window_h": activity["window_h"],
-                    },
-                )
-                last_activity_regime = activity["regime"]
 
+def risk_tick():
+    """
+    Один полный проход: режим рынка, activity, оценка всех символов.
+    Синхронный — его же вызывает replay.py на записанных данных.
+    """
+    started = time.perf_counter()
+    global last_regime_ts, current_market_regime
+
+    now_ms = now_ts_ms()
+
+    if now_ms - last_regime_ts >= MARKET_REGIME_INTERVAL * 1000:
+        global stress_confirm_counter, stress_exit_counter, crowd_confirm_counter
+
+        state = build_market_state()
+        candidate = detect_market_regime(state)
+
+        if candidate == "STRESS":
+            stress_confirm_counter += 1
+        else:
+            stress_confirm_counter = 0
+
+        if current_market_regime == "STRESS" and candidate != "STRESS":
+            stress_exit_counter += 1
+        else:
+            stress_exit_counter = 0
+
+        if candidate == "CROWD_IMBALANCE":
+            crowd_confirm_counter += 1
+        else:
+            crowd_confirm_counter = 0
+
+        if candidate == "STRESS":
+            regime = "STRESS" if stress_confirm_counter >= STRESS_CONFIRM_TICKS else "LATENT_STRESS"
+        elif current_market_regime == "STRESS":
+            regime = candidate if stress_exit_counter >= STRESS_EXIT_TICKS else "STRESS"
+        elif candidate == "CROWD_IMBALANCE":
+            regime = "CROWD_IMBALANCE" if crowd_confirm_counter >= CROWD_CONFIRM_TICKS else "CALM"
+        else:
+            regime = candidate
+
+        log_event(
+            "market_regime",
+            {
+                "regime": regime,
+                "candidate": candidate,
+                "stress_enter_ticks": stress_confirm_counter,
+                "stress_exit_ticks": stress_exit_counter,
+                "crowd_ticks": crowd_confirm_counter,
+                **state,
+            },
+        )
+
+        current_market_regime = regime
+        last_regime_ts = now_ms
+
+    global last_activity_ts, last_activity_regime
+
+    if now_ms - last_activity_ts >= ACTIVITY_REGIME_INTERVAL * 1000:
+        activity = detect_activity_regime_live()
+
+        if last_activity_regime is None:
+            last_activity_regime = activity["regime"]
+        elif last_activity_regime != activity["regime"]:
             log_event(
-                "activity_regime",
+                "activity_transition",
                 {
-                    "regime": activity["regime"],
+                    "from": last_activity_regime,
+                    "to": activity["regime"],
                     "alerts": activity["alerts"],
                     "window_h": activity["window_h"],
                 },
             )
+            last_activity_regime = activity["regime"]
+
+        log_event(
+            "activity_regime",
+            {
+                "regime": activity["regime"],
+                "alerts": activity["alerts"],
+                "window_h": activity["window_h"],
+            },
+        )
+
+        last_activity_ts = now_ms
+
+    evaluate_symbols(SYMBOLS)
+    RISK_TICK_SECONDS.observe(time.perf_counter() - started)
+
+
+async def global_risk_loop():
+    await asyncio.sleep(10)
 
-            last_activity_ts = now_ms
-
-        for symbol in SYMBOLS:
-            try:
-                now_ms = now_ts_ms()
-
-                f = ws.funding.get(symbol)
-                pf = last_funding.get(symbol)
-
-                if f is not None:
-                    prev_funding[symbol] = pf
-                    last_funding[symbol] = f
-
-                oi_vals = oi_poller.oi_window.get(symbol, [])
-                oi_for_risk = oi_vals
-
-                if len(oi_vals) == 1:
-                    prev_oi_snapshot = last_oi_snapshot.get(symbol)
-                    if prev_oi_snapshot and prev_oi_snapshot > 0:
-                        oi_for_risk = [(now_ms - INTERVAL_SECONDS * 1000, prev_oi_snapshot), oi_vals[0]]
-
-                if oi_vals:
-                    last_oi_snapshot[symbol] = oi_vals[-1][1]
-
-                liq = ws.liquidations.get(symbol, 0)
-                ls = ws.long_short_ratio.get(symbol, {"long": 0, "short": 0})
-                total = ls["long"] + ls["short"]
-                pressure_ratio = ls["long"] / total if total else 0.5
-
-                price = getattr(ws, "mark_price", {}).get(symbol)
-                liq_sides = getattr(ws, "liq_sides", {}).get(symbol, {})
-
-                if price is not None:
-                    price_history[symbol].append(price)
-
-                result = risk.calculate_risk(
-                    f,
-                    pf,
-                    pressure_ratio,
-                    oi_for_risk,
-                    liq,
-                    LIQ_THRESHOLDS[symbol],
-                    price,
-                    liq_sides,
-                )
-                score, direction, reasons, funding_spike, oi_spike, risk_driver = result
-                cache[symbol] = (score, direction, reasons, risk_driver)
-
-                risk_eval_payload = {
-                    "symbol": symbol,
-                    "risk": score,
-                    "funding": f,
-                    "price": price,
-                }
-                if score != 0:
-                    risk_eval_payload.update(
-                        {
-                            "direction": direction,
-                            "risk_driver": risk_driver,
-                            "funding_spike": funding_spike,
-                            "oi_spike": oi_spike,
-                            "liq": liq,
-                        }
-                    )
-                log_event("risk_eval", risk_eval_payload)
-
-                global LAST_RISK_EVAL_TS
-                LAST_RISK_EVAL_TS = now_ms
-
-                quality = meta.stream_quality(symbol)
-                if quality["level"] == "LOW":
-                    continue
-
-                confidence = meta.calculate_confidence(
-                    score,
-                    direction,
-                    oi_spike,
-                    funding_spike,
-                    liq,
-                    price,
-                    liq_sides,
-                )
-                if funding_spike:
-                    confidence += 1
-                if oi_spike:
-                    confidence += 1
-                confidence = min(confidence, 5)
-                conf_level = meta.confidence_level(confidence)
-
-                if score >= HARD_ALERT_LEVEL and direction and confidence >= 3:
-                    text = (
-                        f"🚨 HARD RISK ALERT {symbol}\n\n"
-                        f"Risk: {score}\n"
-                        f"Direction: {direction}\n"
-                        f"Confidence: {conf_level}"
-                    )
-                    emit_alert(
-                        text,
-                        {
-                            "symbol": symbol,
-                            "risk": score,
-                            "direction": direction,
-                            "confidence": confidence,
-                            "type": "HARD",
-                            "event_id": f"{symbol}:{now_ms}:HARD",
-                            "ts_unix_ms": now_ms,
-                            "risk_driver": risk_driver,
-                            "price": price,
-                        },
-                    )
-                elif score >= EARLY_ALERT_LEVEL:
-                    cutoff = now_ms - ALERT_WINDOW_HOURS * 3600 * 1000
-                    while alert_history[symbol] and alert_history[symbol][0] < cutoff:
-                        alert_history[symbol].popleft()
-                    symbol_alerts_count = len(alert_history[symbol])
-
-                    text = (
-                        f"⚠️ RISK BUILDUP {symbol}\n\n"
-                        f"Risk: {score}\n"
-                        f"Direction: {direction}\n"
-                        f"Alerts last {ALERT_WINDOW_HOURS}h: {symbol_alerts_count}"
-                    )
-                    if conf_level in ("MEDIUM", "HIGH") and reasons:
-                        text += f"\nConfidence: {conf_level}\nReason: {reasons[0]}"
-
-                    emit_alert(
-                        text,
-                        {
-                            "symbol": symbol,
-                            "risk": score,
-                            "direction": direction,
-                            "confidence": confidence,
-                            "type": "BUILDUP",
-                            "event_id": f"{symbol}:{now_ms}:BUILDUP",
-                            "ts_unix_ms": now_ms,
-                            "price": price,
-                        },
-                    )
-
-                price_trend = detect_price_trend(symbol, price_history[symbol])
-                oi_trend = detect_oi_trend(oi_for_risk)
-                divergences = divergence.detect_divergence(
-                    symbol=symbol,
-                    state=current_market_regime,
-                    pressure_ratio=pressure_ratio,
-                    oi_window=oi_for_risk,
-                    price_trend=price_trend,
-                    liquidations=liq,
-                )
-
-                for idx, div_text in enumerate(divergences):
-                    divergence_type = divergence_type_from_message(div_text)
-                    confidence = divergence_confidence(
-                        pressure_ratio=pressure_ratio,
-                        liq=liq,
-                        price_trend=price_trend,
-                        oi_trend=oi_trend,
-                        score=score,
-                    )
-
-                    emit_alert(
-                        f"🧭 DIVERGENCE {symbol}\n\n{div_text}",
-                        {
-                            "symbol": symbol,
-                            "type": "DIVERGENCE",
-                            "event_id": f"{symbol}:{now_ms}:DIV:{idx}",
-                            "ts_unix_ms": now_ms,
-                            "market_regime": current_market_regime,
-                            "price_trend": price_trend,
-                            "pressure_ratio": round(pressure_ratio, 4),
-                            "risk": score,
-                            "price": price,
-                            "divergence_type": divergence_type,
-                            "confidence": confidence,
-                            "pressure": round(pressure_ratio, 4),
-                            "oi_trend": oi_trend,
-                            "liquidations": liq,
-                            "message": div_text,
-                        },
-                        event_type="risk_divergence",
-                    )
-
-            except Exception as e:
-                log_event("risk_loop_error", {"symbol": symbol, "error": str(e)})
+    while True:
+        recorder.record("sweep", "")
+        risk_tick()
 
         await asyncio.sleep(INTERVAL_SECONDS)
 
 
+async def risk_trigger_loop():
+    """
+    Переоценивает только «грязные» символы (см. triggers.py) с debounce.
+    Символ оценивается не чаще раза в RISK_TRIGGER_MIN_INTERVAL.
+    """
+    await asyncio.sleep(10)
+
+    while True:
+        await triggers.wait_dirty()
+        await asyncio.sleep(RISK_TRIGGER_DEBOUNCE)
+
+        due = triggers.take_due(ws.states, RISK_TRIGGER_MIN_INTERVAL, clock.now())
+        if due:
+            recorder.record("trigger", due)
+            evaluate_symbols(list(due), trigger_reasons=due)
+
+
 async def risk_loop_watchdog():
     while True:
         await asyncio.sleep(120)
@@ -526,43 +766,230 @@ async def risk_loop_watchdog():
             )
 
 
-class PingHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.end_headers()
-        self.wfile.write(b"OK")
+def checkpoint_state():
+    """Всё, что теряется при рестарте (см. checkpoint.py)."""
+    return {
+        "ts": clock.now(),
+        "regime": {
+            "current_market_regime": current_market_regime,
+            "last_regime_ts": last_regime_ts,
+            "stress_confirm_counter": stress_confirm_counter,
+            "stress_exit_counter": stress_exit_counter,
+            "crowd_confirm_counter": crowd_confirm_counter,
+            "last_activity_regime": last_activity_regime,
+            "last_activity_ts": last_activity_ts,
+        },
+        "alerts": alert_tracker.checkpoint(),
+        "cooldowns": divergence._last_seen,
+        "cache": cache,
+        "last_funding": last_funding,
+        "prev_funding": prev_funding,
+        "last_oi_snapshot": last_oi_snapshot,
+        "price_history": price_history,
+        "oi_window": oi_poller.oi_window,
+        "oi_last_update_ts": oi_poller.last_update_ts,
+        "oi_live": oi_poller.oi_live,
+        "symbols": {s: st.checkpoint() for s, st in ws.states.items()},
+    }
+
+
+def restore_state(state):
+    """
+    Восстановление из чекпоинта с отбрасыванием протухшего по возрасту:
+    алерты — по окну ALERT_WINDOW_HOURS, cooldown'ы — по своему TTL,
+    режим и гистерезис — если чекпоинт моложе двух интервалов режима,
+    история тиков — если моложе её длины, окна сделок — по горизонту.
+    """
+    global current_market_regime, last_regime_ts, last_activity_regime, last_activity_ts
+    global stress_confirm_counter, stress_exit_counter, crowd_confirm_counter
+
+    now = clock.now()
+    age = now - state["ts"]
+    if age < 0 or age > checkpoint.CHECKPOINT_MAX_AGE:
+        return None
+
+    summary = {"age_sec": round(age, 1)}
+    summary["alerts"] = alert_tracker.restore(state["alerts"], int(now * 1000))
+    summary["cooldowns"] = divergence.restore_cooldowns(state["cooldowns"], now)
+
+    regime = state["regime"]
+    last_activity_regime = regime["last_activity_regime"]
+    last_activity_ts = regime["last_activity_ts"]
+    if age <= 2 * MARKET_REGIME_INTERVAL:
+        current_market_regime = regime["current_market_regime"]
+        last_regime_ts = regime["last_regime_ts"]
+        stress_confirm_counter = regime["stress_confirm_counter"]
+        stress_exit_counter = regime["stress_exit_counter"]
+        crowd_confirm_counter = regime["crowd_confirm_counter"]
+        summary["regime"] = current_market_regime
+
+    if age <= 2 * INTERVAL_SECONDS:
+        cache.update(state["cache"])
+        last_funding.update(state["last_funding"])
+        prev_funding.update(state["prev_funding"])
+        last_oi_snapshot.update(state["last_oi_snapshot"])
+
+    for symbol, prices in state["price_history"].items():
+        if symbol in price_history and age <= INTERVAL_SECONDS * prices.maxlen:
+            price_history[symbol].extend(prices)
+
+    for symbol, ts in state["oi_last_update_ts"].items():
+        if symbol in oi_poller.oi_window and now - ts <= MAX_OI_AGE:
+            oi_poller.oi_window[symbol].extend(state["oi_window"][symbol])
+            oi_poller.last_update_ts[symbol] = ts
+    summary["oi_symbols"] = len(oi_poller.last_update_ts)
+
+    for symbol, points in state.get("oi_live", {}).items():
+        if symbol in oi_poller.oi_live:
+            oi_poller.oi_live[symbol].extend(
+                p for p in points if now - p[0] <= oi_poller.live_window
+            )
+
+    for symbol, saved in state["symbols"].items():
+        st = ws.states.get(symbol)
+        if st is None:
+            continue
+        if age > ROLLING_MAX_HORIZON:
+            saved = {k: v for k, v in saved.items() if k not in ("trades", "liqs")}
+        st.restore(saved, now)
+    summary["symbols"] = len(state["symbols"])
+
+    return summary
 
-    def do_HEAD(self):
-        self.send_response(200)
-        self.end_headers()
 
+def _save_and_exit():
+    try:
+        checkpoint.save(checkpoint_state())
+    except Exception as e:
+        print(f"CHECKPOINT ERROR: {type(e).__name__} {e}", flush=True)
+    raise SystemExit(0)
 
-def start_http():
-    HTTPServer(("0.0.0.0", 8080), PingHandler).serve_forever()
+
+def oi_poll_delay(now, due):
+    """
+    Сколько ждать до следующего опроса openInterestHist: точка появляется
+    раз в период, поэтому опрос — сразу после границы, а символы, по которым
+    её ещё нет, переспрашиваются недолго после неё.
+    """
+    since = now - oi_poller.period_start(now)
+    if due and since < OI_RETRY_WINDOW:
+        return OI_RETRY_SECONDS
+    period = PERIOD_SECONDS[oi_poller.period]
+    return max(period - since + OI_BOUNDARY_DELAY, 1)
 
 
 async def oi_loop():
     while True:
+        due = oi_poller.due_symbols(clock.now())
         try:
-            oi_poller.update()
+            if due:
+                before = dict(oi_poller.last_update_ts)
+                await oi_poller.update_async(due)
+                for symbol, ts in oi_poller.last_update_ts.items():
+                    if ts != before.get(symbol):
+                        triggers.mark_dirty(symbol, "oi")
         except Exception as e:
             log_event("oi_poll_error", {"ts_unix_ms": now_ts_ms(), "error": str(e)})
-        await asyncio.sleep(60)
+        now = clock.now()
+        await asyncio.sleep(oi_poll_delay(now, oi_poller.due_symbols(now)))
+
+
+def mark_oi_live_dirty(symbols):
+    """Внеочередная оценка, когда спайк живого OI появился или пропал."""
+    for symbol in symbols:
+        change = oi_live_change(oi_poller.oi_live[symbol])
+        spiking = change is not None and abs(change) > OI_LIVE_SPIKE_THRESHOLD
+        if spiking != oi_live_spiking.get(symbol, False):
+            oi_live_spiking[symbol] = spiking
+            triggers.mark_dirty(symbol, "oi_live")
+
+
+async def oi_live_loop():
+    while True:
+        try:
+            mark_oi_live_dirty(await oi_poller.update_live_async())
+        except Exception as e:
+            log_event("oi_poll_error", {"ts_unix_ms": now_ts_ms(), "error": str(e)})
+        await asyncio.sleep(OI_LIVE_INTERVAL)
+
+
+def on_params_reload(current, error):
+    if error:
+        print(f"PARAMS RELOAD FAILED: {error}", flush=True)
+        log_event("params_reload_error", {"error": error})
+    else:
+        print(f"PARAMS RELOADED: {current}", flush=True)
+        log_event("params_reload", {"params": current})
 
 
-async def main():
+def reload_params():
+    """POST /admin/reload: перечитать PARAMS_PATH сейчас."""
+    try:
+        current = params.load_file()
+    except ValueError as e:
+        on_params_reload(params.current, str(e))
+        return 400, {"ok": False, "error": str(e), "params": params.current}
+    on_params_reload(current, None)
+    return 200, {"ok": True, "params": current}
+
+
+async def main(ingest=True):
+    """
+    ingest=False — scoring-процесс pipeline.py: WS и его часть прогрева
+    живут в ingestion-процессах, состояние символов читается из shared memory.
+    """
     global ws_task
-    ws_task = asyncio.create_task(start_ws_safe())
-    asyncio.create_task(ws_watchdog())
+    http_api.set_health_source(health_state)
+    asyncio.create_task(http_api.serve())
+    asyncio.create_task(run_shipper())
+    asyncio.create_task(dispatch.run())
+    asyncio.create_task(loop_monitor.run())
+
+    # до чекпоинта: cooldown'ы восстанавливаются по действующим множителям
+    try:
+        params.load_file()
+    except ValueError as e:
+        on_params_reload(params.current, str(e))
+    http_api.add_admin_action("/admin/reload", reload_params)
+    asyncio.create_task(params.watch(on_params_reload))
+
+    saved = checkpoint.load()
+    if saved is not None:
+        try:
+            restored = restore_state(saved)
+            log_event("checkpoint_restore", restored or {"skipped": "stale"})
+        except Exception as e:
+            log_event("checkpoint_error", {"error_type": type(e).__name__, "error": str(e)})
+
+    try:
+        await asyncio.wait_for(
+            warm_start(oi_poller, price_history, ws_state=ingest), timeout=BOOTSTRAP_TIMEOUT
+        )
+    except Exception as e:
+        log_event("bootstrap_error", {"error_type": type(e).__name__, "error": str(e)})
+
+    if ingest:
+        ws_task = asyncio.create_task(start_ws_safe())
+        asyncio.create_task(ws_watchdog())
     asyncio.create_task(global_risk_loop())
     asyncio.create_task(risk_loop_watchdog())
+    if RISK_TRIGGERS_ENABLED:
+        asyncio.create_task(risk_trigger_loop())
     asyncio.create_task(oi_loop())
+    if OI_LIVE_INTERVAL > 0:
+        asyncio.create_task(oi_live_loop())
+    asyncio.create_task(checkpoint.run(checkpoint_state))
+
+    # Render останавливает контейнер SIGTERM'ом — успеваем записать чекпоинт
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, _save_and_exit)
+    except NotImplementedError:
+        pass
 
     await asyncio.Event().wait()
 
 
 if __name__ == "__main__":
-    threading.Thread(target=start_http, daemon=True).start()
     asyncio.run(main())
 
 
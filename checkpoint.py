@@ -0,0 +1,98 @@
+# checkpoint.py
+"""
+Чекпоинт состояния в памяти для быстрых рестартов.
+
+Формат файла: MAGIC + версия + zlib(pickle(state)). Запись атомарная:
+временный файл, fsync, os.replace — после падения на диске либо старый,
+либо новый чекпоинт целиком. Сериализация (pickle) идёт на loop — это
+единственный момент, когда структуры не меняются; сжатие и запись —
+в потоке.
+"""
+import asyncio
+import os
+import pickle
+import time
+import zlib
+
+import metrics
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoint/state.ckpt")
+CHECKPOINT_INTERVAL = int(os.getenv("CHECKPOINT_INTERVAL", "60"))
+# старше — не восстанавливаем ничего: проще начать с нуля, чем с мусора
+CHECKPOINT_MAX_AGE = int(os.getenv("CHECKPOINT_MAX_AGE", str(6 * 3600)))
+
+MAGIC = b"RBCK"
+VERSION = 2  # 2: alert_tracker вместо alert_history/recorded_alert_ids
+
+stats = {"saved": 0, "failed": 0, "last_bytes": 0, "last_save_ms": 0.0, "last_saved_at": None}
+
+
+@metrics.collector
+def _checkpoint_metrics():
+    saved_at = stats["last_saved_at"]
+    return [
+        ("checkpoint_saves_total", "counter", "Checkpoints written", [({}, stats["saved"])]),
+        ("checkpoint_failures_total", "counter", "Checkpoint writes that failed", [({}, stats["failed"])]),
+        ("checkpoint_bytes", "gauge", "Size of the last checkpoint before compression", [({}, stats["last_bytes"])]),
+        ("checkpoint_save_seconds", "gauge", "Duration of the last checkpoint write", [
+            ({}, stats["last_save_ms"] / 1000),
+        ]),
+        # нет сэмпла, пока не было ни одной записи
+        ("checkpoint_age_seconds", "gauge", "Seconds since the last checkpoint", [
+            ({}, round(time.time() - saved_at, 1)),
+        ] if saved_at is not None else []),
+    ]
+
+
+def _write(path, blob):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + bytes([VERSION]) + zlib.compress(blob, 6))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save(state, path=CHECKPOINT_PATH):
+    """Синхронная запись (при остановке процесса)."""
+    _write(path, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+async def save_async(state, path=CHECKPOINT_PATH):
+    started = time.perf_counter()
+    blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    await asyncio.to_thread(_write, path, blob)
+    stats["saved"] += 1
+    stats["last_saved_at"] = time.time()
+    stats["last_bytes"] = len(blob)
+    stats["last_save_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def load(path=CHECKPOINT_PATH):
+    """Состояние из файла или None (нет файла, чужой формат, битые данные)."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+
+    if raw[:4] != MAGIC or raw[4:5] != bytes([VERSION]):
+        return None
+    try:
+        return pickle.loads(zlib.decompress(raw[5:]))
+    except Exception:
+        return None
+
+
+async def run(collect, interval=CHECKPOINT_INTERVAL, path=CHECKPOINT_PATH):
+    """Фоновая задача: collect() -> dict, раз в interval секунд."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await save_async(collect(), path)
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"CHECKPOINT ERROR: {type(e).__name__} {e}", flush=True)
@@ -0,0 +1,32 @@
+# clock.py
+"""
+Единые часы бота. В проде — time.time; replay подставляет SimClock,
+и весь код (окна, cooldown, таймстемпы событий) живёт в записанном времени.
+"""
+import time
+
+_time = time.time
+
+
+def now():
+    return _time()
+
+
+def set_clock(fn=None):
+    """fn() -> unix seconds; None — вернуть системные часы."""
+    global _time
+    _time = fn or time.time
+
+
+class SimClock:
+    """Ручные часы: время двигает тот, кто проигрывает события."""
+
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def __call__(self):
+        return self.t
+
+    def advance(self, to):
+        if to > self.t:
+            self.t = to
@@ -18,8 +18,40 @@ SYMBOLS = [
 ]
 
 INTERVAL_SECONDS = 300
+
+# Внеочередная переоценка символа при существенном изменении входов;
+# полный проход раз в INTERVAL_SECONDS остаётся страховкой
+RISK_TRIGGERS_ENABLED = True
+RISK_TRIGGER_DEBOUNCE = 2
+RISK_TRIGGER_MIN_INTERVAL = 60
 WINDOW_SECONDS = 300
 
+# Горизонты, доступные из окон сделок/ликвидаций (1m / 5m / 15m)
+ROLLING_HORIZONS = (60, 300, 900)
+ROLLING_MAX_HORIZON = max(ROLLING_HORIZONS)
+
+# WebSocket: сколько соединений держать и сколько стримов максимум на одно
+WS_SHARDS = 1
+WS_MAX_STREAMS_PER_CONN = 200
+WS_STALL_SECONDS = 60
+
+# Монитор event loop: частота замера лага, порог «loop заблокирован»,
+# частота снятия стека с потока loop во время блокировки
+LOOP_LAG_INTERVAL = 0.1
+LOOP_BLOCK_THRESHOLD = 0.25
+LOOP_SAMPLE_INTERVAL = 0.05
+LOOP_WARN_COOLDOWN = 60
+
+# HTTP API (/health, /state, /metrics)
+HTTP_HOST = "0.0.0.0"
+HTTP_PORT = 8080
+
+# pipeline.py (опционально): ingestion-процессы WS + scoring-процесс
+PIPELINE_INGEST_WORKERS = 2
+PIPELINE_PUBLISH_INTERVAL = 0.1
+PIPELINE_HEARTBEAT_TIMEOUT = 30
+PIPELINE_RESTART_MAX_BACKOFF = 30
+
 EARLY_ALERT_LEVEL = 5
 HARD_ALERT_LEVEL = 8
 
@@ -27,6 +59,22 @@ FUNDING_EXTREME_THRESHOLD = 0.0005
 FUNDING_SPIKE_THRESHOLD = 0.0001
 OI_SPIKE_THRESHOLD = 0.01
 
+# Живой OI (/fapi/v1/openInterest) раз в OI_LIVE_INTERVAL секунд; 0 — выключено.
+# Спайк за последние OI_LIVE_WINDOW секунд виден сразу, а не на границе 5m.
+OI_LIVE_INTERVAL = 10
+OI_LIVE_WINDOW = 300
+OI_LIVE_SPIKE_THRESHOLD = 0.005
+
+# openInterestHist обновляется раз в 5m: опрос через OI_BOUNDARY_DELAY секунд
+# после границы периода; символы без свежей точки — повтор раз в OI_RETRY_SECONDS,
+# пока не пройдёт OI_RETRY_WINDOW секунд от границы
+OI_BOUNDARY_DELAY = 5
+OI_RETRY_SECONDS = 15
+OI_RETRY_WINDOW = 60
+
+# Вес REST-запросов Binance в минуту (лимит IP — 2400); сверх — ждём следующей минуты
+REST_WEIGHT_BUDGET = 1200
+
 LIQ_THRESHOLDS = {
     "BTCUSDT": 30_000_000,
     "ETHUSDT": 15_000_000,
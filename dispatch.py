@@ -0,0 +1,240 @@
+# dispatch.py
+"""
+Доставка алертов по каналам (sinks): у каждого своя очередь и свой воркер
+на event loop бота.
+
+    ALERT_SINKS=stdout,telegram,webhook
+    TELEGRAM_BOT_TOKEN=...  TELEGRAM_CHAT_ID=...
+    ALERT_WEBHOOK_URL=https://...
+
+bot.emit_alert только кладёт алерт в очереди (submit) — risk loop сети не
+ждёт, медленный канал не задерживает ни оценку, ни другие каналы. HTTP-каналы
+держат свою requests.Session (keep-alive) и шлют из потока; сбой — до
+ALERT_RETRIES повторов с экспоненциальной задержкой, 429 — через retry_after.
+Переполненная очередь вытесняет самые старые алерты.
+
+Пока диспетчер не запущен (replay.py, bench.py), алерты только печатаются.
+TELEGRAM_API_URL переопределяется на локальную заглушку для проверки.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import NamedTuple
+
+import requests
+
+import metrics
+
+ALERT_SINKS = os.getenv("ALERT_SINKS", "stdout")
+ALERT_QUEUE_MAX = int(os.getenv("ALERT_QUEUE_MAX", "1000"))
+ALERT_RETRIES = int(os.getenv("ALERT_RETRIES", "3"))
+ALERT_RETRY_BASE = float(os.getenv("ALERT_RETRY_BASE", "1"))
+ALERT_RETRY_MAX = float(os.getenv("ALERT_RETRY_MAX", "30"))
+ALERT_POST_TIMEOUT = float(os.getenv("ALERT_POST_TIMEOUT", "5"))
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+
+
+class Alert(NamedTuple):
+    event_type: str
+    payload: dict
+    submitted: float  # perf_counter() в момент submit
+
+
+class DeliveryError(Exception):
+    """Ответ канала; retry=False — повтор бессмыслен (4xx кроме 429)."""
+
+    def __init__(self, message, retry=True, retry_after=None):
+        super().__init__(message)
+        self.retry = retry
+        self.retry_after = retry_after
+
+
+class Sink:
+    """
+    Очередь и воркер одного канала. Наследники задают deliver(alert):
+    blocking=True — он уходит в поток, иначе вызывается прямо на loop.
+    """
+
+    name = None
+    blocking = True
+
+    def __init__(self):
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "retries": 0}
+        # от submit до ответа канала: очередь + повторы
+        self.latency = metrics.Histogram(
+            f"alert_{self.name}_delivery_seconds",
+            f"Alert delivery latency to {self.name}, from submit",
+            buckets=metrics.LATENCY_BUCKETS[7:],
+        )
+
+    def put(self, alert):
+        if len(self.queue) >= ALERT_QUEUE_MAX:
+            self.queue.popleft()
+            self.stats["dropped"] += 1
+        self.queue.append(alert)
+        self.stats["queued"] += 1
+        self.wakeup.set()
+
+    def deliver(self, alert):
+        raise NotImplementedError
+
+    async def _attempt(self, alert):
+        if self.blocking:
+            await asyncio.to_thread(self.deliver, alert)
+        else:
+            self.deliver(alert)
+
+    async def send(self, alert):
+        for attempt in range(ALERT_RETRIES + 1):
+            try:
+                await self._attempt(alert)
+                self.stats["sent"] += 1
+                self.latency.observe(time.perf_counter() - alert.submitted)
+                return True
+            except DeliveryError as e:
+                error, retry, delay = e, e.retry, e.retry_after
+            except Exception as e:
+                error, retry, delay = e, True, None
+
+            if not retry or attempt == ALERT_RETRIES:
+                break
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay or min(ALERT_RETRY_BASE * 2 ** attempt, ALERT_RETRY_MAX))
+
+        self.stats["failed"] += 1
+        print(f"ALERT SINK {self.name} FAILED: {type(error).__name__} {error}", flush=True)
+        return False
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.queue:
+                await self.send(self.queue.popleft())
+
+
+class StdoutSink(Sink):
+    name = "stdout"
+    blocking = False
+
+    def deliver(self, alert):
+        print(f"{alert.event_type}: {alert.payload}", flush=True)
+
+
+class HttpSink(Sink):
+    """POST JSON через свою Session: соединение с каналом переиспользуется."""
+
+    def __init__(self):
+        super().__init__()
+        self.session = requests.Session()
+
+    def post(self, url, body):
+        r = self.session.post(url, json=body, timeout=ALERT_POST_TIMEOUT)
+        if r.status_code < 300:
+            return r
+        if r.status_code == 429:
+            raise DeliveryError("429", retry_after=self.retry_after(r))
+        raise DeliveryError(f"HTTP {r.status_code}", retry=r.status_code >= 500)
+
+    def retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        return float(value) if value else None
+
+
+class TelegramSink(HttpSink):
+    name = "telegram"
+
+    def __init__(self):
+        if not (TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID):
+            raise ValueError("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID are required")
+        super().__init__()
+        self.url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+
+    def retry_after(self, response):
+        # Bot API отдаёт задержку в теле: {"parameters": {"retry_after": N}}
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except Exception:
+            return super().retry_after(response)
+
+    def deliver(self, alert):
+        self.post(self.url, {
+            "chat_id": TELEGRAM_CHAT_ID,
+            "text": alert.payload.get("text", ""),
+            "disable_web_page_preview": True,
+        })
+
+
+class WebhookSink(HttpSink):
+    name = "webhook"
+
+    def __init__(self):
+        if not ALERT_WEBHOOK_URL:
+            raise ValueError("ALERT_WEBHOOK_URL is required")
+        super().__init__()
+
+    def deliver(self, alert):
+        self.post(ALERT_WEBHOOK_URL, {"event_type": alert.event_type, **alert.payload})
+
+
+SINK_TYPES = {
+    "stdout": StdoutSink,
+    "telegram": TelegramSink,
+    "webhook": WebhookSink,
+}
+
+_sinks = {}
+
+
+@metrics.collector
+def _dispatch_metrics():
+    def per_sink(key):
+        return [({"sink": name}, sink.stats[key]) for name, sink in _sinks.items()]
+
+    return [
+        ("alert_sink_queued_total", "counter", "Alerts queued per sink", per_sink("queued")),
+        ("alert_sink_sent_total", "counter", "Alerts delivered per sink", per_sink("sent")),
+        ("alert_sink_failed_total", "counter", "Alerts given up after retries", per_sink("failed")),
+        ("alert_sink_dropped_total", "counter", "Alerts evicted from a full queue", per_sink("dropped")),
+        ("alert_sink_retries_total", "counter", "Delivery retries per sink", per_sink("retries")),
+        ("alert_sink_queue", "gauge", "Alerts waiting per sink", [
+            ({"sink": name}, len(sink.queue)) for name, sink in _sinks.items()
+        ]),
+    ]
+
+
+def submit(event_type, payload):
+    """Ставит алерт во все каналы; не блокирует."""
+    if not _sinks:
+        print(f"{event_type}: {payload}", flush=True)
+        return
+    alert = Alert(event_type, payload, time.perf_counter())
+    for sink in _sinks.values():
+        sink.put(alert)
+
+
+def stats():
+    return {name: {**sink.stats, "queue": len(sink.queue)} for name, sink in _sinks.items()}
+
+
+async def run(names=None):
+    """Фоновая задача: создаёт каналы из ALERT_SINKS и крутит их воркеры."""
+    if names is None:
+        names = [n.strip() for n in ALERT_SINKS.split(",") if n.strip()]
+
+    for name in names:
+        try:
+            _sinks[name] = SINK_TYPES[name]()
+        except KeyError:
+            print(f"ALERT SINK {name} UNKNOWN", flush=True)
+        except ValueError as e:
+            print(f"ALERT SINK {name} DISABLED: {e}", flush=True)
+
+    await asyncio.gather(*(sink.run() for sink in _sinks.values()))
@@ -1,4 +1,10 @@
-import time
+import operator
+from types import MappingProxyType
+from typing import Callable, NamedTuple, Optional
+
+import clock
+from config import OI_LIVE_SPIKE_THRESHOLD
+from risk import oi_live_change
 
 # Базовый cooldown в секундах по типам дивергенций
 BASE_DIVERGENCE_COOLDOWN = {
@@ -121,13 +127,139 @@ SYMBOL_PARAM_OVERRIDES = {
     },
 }
 
-_last_seen = {}  # (symbol, type) -> ts
+# Декларативные правила дивергенций. Проверяются по порядку:
+#   states      — режимы рынка, в которых правило активно
+#   pressure    — (">" | "<", ключ параметра из таблицы символа)
+#   oi_trend    — требуемый тренд OI ("UP" | "DOWN")
+#   price_trend — допустимые тренды цены (если не задано — любой)
+#   liquidations — нужны ли ненулевые ликвидации
+DIVERGENCE_RULES = (
+    {
+        # 🔻 LONG TRAP
+        "type": "LONG_TRAP",
+        "states": ("LATENT_STRESS", "NEUTRAL", "CROWD_IMBALANCE", "STRESS"),
+        "pressure": (">", "long_trap_pressure"),
+        "oi_trend": "UP",
+        "price_trend": ("FLAT", "DOWN"),
+        "message": (
+            "LONG TRAP — активные покупки, позиции растут, но цена не идёт. "
+            "Риск: покупатели могут остаться без продолжения движения."
+        ),
+    },
+    {
+        # 🔺 SHORT SQUEEZE
+        "type": "SHORT_SQUEEZE",
+        "states": ("CROWD_IMBALANCE", "STRESS"),
+        "pressure": (">", "short_squeeze_pressure"),
+        "oi_trend": "UP",
+        "liquidations": True,
+        "message": (
+            "SHORT SQUEEZE — агрессивные покупки при росте открытого интереса. "
+            "Риск: шорты могут быть вынуждены закрываться выше."
+        ),
+    },
+    {
+        # 🔻 FAKE MOVE
+        "type": "FAKE_MOVE",
+        "states": ("LATENT_STRESS", "NEUTRAL", "CROWD_IMBALANCE", "STRESS"),
+        "pressure": (">", "fake_move_pressure"),
+        "oi_trend": "DOWN",
+        "price_trend": ("UP", "FLAT"),
+        "message": (
+            "FAKE MOVE — сделки есть, но позиции сокращаются. "
+            "Риск: движение не подтверждено интересом."
+        ),
+    },
+    {
+        # 🧨 CAPITULATION
+        "type": "CAPITULATION",
+        "states": ("STRESS",),
+        "pressure": ("<", "capitulation_pressure"),
+        "oi_trend": "DOWN",
+        "liquidations": True,
+        "message": (
+            "CAPITULATION — закрытие позиций под давлением ликвидаций. "
+            "Риск: это выход, а не начало тренда."
+        ),
+    },
+)
 
+_OPS = {">": operator.gt, "<": operator.lt}
 
-def get_divergence_params(symbol):
+
+class CompiledRule(NamedTuple):
+    type: str
+    message: str
+    states: frozenset
+    op: Callable
+    param: str
+    oi_trend: Optional[str]
+    price_trends: Optional[frozenset]
+    needs_liq: bool
+    match: Callable
+
+
+def _compile_rule(spec):
+    states = frozenset(spec["states"])
+    op_name, param = spec["pressure"]
+    op = _OPS[op_name]
+    oi_trend = spec.get("oi_trend")
+    price_trends = frozenset(spec["price_trend"]) if "price_trend" in spec else None
+    needs_liq = bool(spec.get("liquidations", False))
+
+    def match(state, pressure, params, oi, price_trend, liquidations):
+        return (
+            state in states
+            and op(pressure, params[param])
+            and (oi_trend is None or oi == oi_trend)
+            and (price_trends is None or price_trend in price_trends)
+            and (not needs_liq or liquidations > 0)
+        )
+
+    return CompiledRule(
+        spec["type"], spec["message"], states, op, param,
+        oi_trend, price_trends, needs_liq, match,
+    )
+
+
+def compile_rules(rules=None):
+    """Собирает DIVERGENCE_RULES в предикаты; вызывать после изменения правил."""
+    global COMPILED_RULES, DIVERGENCE_MESSAGES
+    COMPILED_RULES = tuple(_compile_rule(r) for r in (rules or DIVERGENCE_RULES))
+    DIVERGENCE_MESSAGES = {r.type: r.message for r in COMPILED_RULES}
+    return COMPILED_RULES
+
+
+def _resolve_params(symbol):
     symbol_class = SYMBOL_CLASSES.get(symbol, "L3")
     params = dict(CLASS_DIVERGENCE_PARAMS[symbol_class])
     params.update(SYMBOL_PARAM_OVERRIDES.get(symbol, {}))
+    return MappingProxyType(params)
+
+
+def compile_params():
+    """
+    Таблица параметров symbol -> неизменяемый mapping. Строится один раз
+    при импорте (и заново после изменения классов/оверрайдов).
+    """
+    global PARAM_TABLE
+    PARAM_TABLE = {s: _resolve_params(s) for s in SYMBOL_CLASSES}
+    return PARAM_TABLE
+
+
+COMPILED_RULES = ()
+DIVERGENCE_MESSAGES = {}
+PARAM_TABLE = {}
+compile_rules()
+compile_params()
+
+_last_seen = {}  # (symbol, type) -> ts
+
+
+def get_divergence_params(symbol):
+    params = PARAM_TABLE.get(symbol)
+    if params is None:
+        params = PARAM_TABLE[symbol] = _resolve_params(symbol)
     return params
 
 
@@ -135,12 +267,16 @@ def get_price_trend_delta(symbol):
     return get_divergence_params(symbol)["price_trend_delta"]
 
 
-def _cooldown_ok(symbol, div_type):
-    now = time.time()
-    key = (symbol, div_type)
+def cooldown_ttl(symbol, div_type):
     params = get_divergence_params(symbol)
     base_ttl = BASE_DIVERGENCE_COOLDOWN.get(div_type, 900)
-    ttl = int(base_ttl * params["cooldown_multiplier"])
+    return int(base_ttl * params["cooldown_multiplier"])
+
+
+def _cooldown_ok(symbol, div_type):
+    now = clock.now()
+    key = (symbol, div_type)
+    ttl = cooldown_ttl(symbol, div_type)
 
     last = _last_seen.get(key)
     if last and now - last < ttl:
@@ -150,6 +286,28 @@ def _cooldown_ok(symbol, div_type):
     return True
 
 
+def restore_cooldowns(last_seen, now):
+    """Cooldown'ы из чекпоинта; уже истёкшие отбрасываются."""
+    kept = {
+        key: ts for key, ts in last_seen.items()
+        if now - ts < cooldown_ttl(*key)
+    }
+    _last_seen.update(kept)
+    return len(kept)
+
+
+def divergences_from_candidates(symbol, div_types):
+    """
+    Cooldown + тексты для уже найденных кандидатов (см. risk_batch);
+    порядок и побочные эффекты те же, что в detect_divergence.
+    """
+    return [
+        DIVERGENCE_MESSAGES[div_type]
+        for div_type in div_types
+        if _cooldown_ok(symbol, div_type)
+    ]
+
+
 def detect_divergence(
     symbol,
     state,
@@ -157,13 +315,17 @@ def detect_divergence(
     oi_window,
     price_trend,
     liquidations,
+    oi_live=None,
 ):
     """
     WS-only divergence detection.
     Возвращает список human-readable строк.
+    oi_live — живой OI; его спайк задаёт тренд OI раньше часового окна.
     """
 
-    divergences = []
+    # ❌ В CALM — ничего не показываем
+    if state == "CALM":
+        return []
 
     # --- базовые вычисления ---
     oi_trend = None
@@ -175,65 +337,15 @@ def detect_divergence(
         elif end < start:
             oi_trend = "DOWN"
 
-    pressure = pressure_ratio
-    params = get_divergence_params(symbol)
-    
-    # ---------------- STATE-AWARE RULES ----------------
+    live_change = oi_live_change(oi_live)
+    if live_change is not None and abs(live_change) > OI_LIVE_SPIKE_THRESHOLD:
+        oi_trend = "UP" if live_change > 0 else "DOWN"
 
-    # ❌ В CALM — ничего не показываем
-    if state == "CALM":
-        return []
+    params = get_divergence_params(symbol)
 
-    # 🔻 LONG TRAP
-    if (
-        state in ("LATENT_STRESS", "NEUTRAL", "CROWD_IMBALANCE", "STRESS")
-        and pressure > params["long_trap_pressure"]
-        and oi_trend == "UP"
-        and price_trend in ("FLAT", "DOWN")
-    ):
-        if _cooldown_ok(symbol, "LONG_TRAP"):
-            divergences.append(
-                "LONG TRAP — активные покупки, позиции растут, но цена не идёт. "
-                "Риск: покупатели могут остаться без продолжения движения."
-            )
-
-    # 🔺 SHORT SQUEEZE
-    if (
-        state in ("CROWD_IMBALANCE", "STRESS")
-        and pressure > params["short_squeeze_pressure"]
-        and oi_trend == "UP"
-        and liquidations > 0
-    ):
-        if _cooldown_ok(symbol, "SHORT_SQUEEZE"):
-            divergences.append(
-                "SHORT SQUEEZE — агрессивные покупки при росте открытого интереса. "
-                "Риск: шорты могут быть вынуждены закрываться выше."
-            )
-
-    # 🔻 FAKE MOVE
-    if (
-        state in ("LATENT_STRESS", "NEUTRAL", "CROWD_IMBALANCE", "STRESS")
-        and pressure > params["fake_move_pressure"]
-        and oi_trend == "DOWN"
-        and price_trend in ("UP", "FLAT")
-    ):
-        if _cooldown_ok(symbol, "FAKE_MOVE"):
-            divergences.append(
-                "FAKE MOVE — сделки есть, но позиции сокращаются. "
-                "Риск: движение не подтверждено интересом."
-            )
-
-    # 🧨 CAPITULATION
-    if (
-        state == "STRESS"
-        and pressure < params["capitulation_pressure"]
-        and oi_trend == "DOWN"
-        and liquidations > 0
-    ):
-        if _cooldown_ok(symbol, "CAPITULATION"):
-            divergences.append(
-                "CAPITULATION — закрытие позиций под давлением ликвидаций. "
-                "Риск: это выход, а не начало тренда."
-            )
-
-    return divergences
+    return [
+        rule.message
+        for rule in COMPILED_RULES
+        if rule.match(state, pressure_ratio, params, oi_trend, price_trend, liquidations)
+        and _cooldown_ok(symbol, rule.type)
+    ]
@@ -0,0 +1,226 @@
+# http_api.py
+"""
+HTTP API на том же event loop, что и бот (asyncio.start_server).
+
+    /                 "OK" (health check хостинга)
+    /health           живость: WS, risk loop, loop lag, логи
+    /state            всё вычисленное состояние: режимы, риск по символам
+    /state/{symbol}   то же по одному символу
+    /metrics          Prometheus
+    POST /admin/...   действия (add_admin_action), Bearer HTTP_ADMIN_TOKEN
+
+/state* сериализуются один раз на проход risk loop (publish) и хранятся
+готовыми ответами целиком — заголовки + тело, плюс готовый 304 под ETag.
+Запрос поллера стоит один поиск в словаре и одну запись в сокет.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import NamedTuple
+
+import metrics
+from config import HTTP_HOST, HTTP_PORT
+
+try:
+    import orjson
+
+    def _dumps(obj):
+        # нестроковые ключи — как у json: в строки
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+HTTP_IDLE_TIMEOUT = 30
+HTTP_ADMIN_TOKEN = os.getenv("HTTP_ADMIN_TOKEN", "")  # пусто — /admin/* выключены
+HEALTH_TTL = 1.0  # /health пересобирается не чаще раза в секунду
+
+_REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+    404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error",
+}
+
+
+class Cached(NamedTuple):
+    etag: str
+    ok: bytes  # полный ответ 200
+    head: bytes  # только заголовки 200 (для HEAD)
+    not_modified: bytes  # полный ответ 304
+
+
+_cache = {}  # path -> Cached
+_health_source = None
+_admin_actions = {}  # path -> fn() -> (status, dict)
+_health_built = 0.0
+
+stats = {"requests": 0, "not_modified": 0, "publishes": 0, "errors": 0}
+
+
+@metrics.collector
+def _http_metrics():
+    return [
+        ("http_requests_total", "counter", "HTTP requests served", [({}, stats["requests"])]),
+        ("http_not_modified_total", "counter", "Requests answered 304 by ETag", [({}, stats["not_modified"])]),
+        ("http_errors_total", "counter", "Requests answered 500", [({}, stats["errors"])]),
+        ("http_state_publishes_total", "counter", "State snapshots serialized for /state", [({}, stats["publishes"])]),
+    ]
+
+
+def _response_head(status, content_type, length, etag=None):
+    lines = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Length: {length}"]
+    if content_type:
+        lines.append(f"Content-Type: {content_type}")
+    if etag:
+        lines.append(f"ETag: {etag}")
+        lines.append("Cache-Control: no-cache")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _build(body, content_type="application/json"):
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    head = _response_head(200, content_type, len(body), etag)
+    return Cached(etag, head + body, head, _response_head(304, None, 0, etag))
+
+
+def publish(state):
+    """
+    Сериализует состояние для /state и /state/{symbol}.
+    state = {..., "symbols": {symbol: {...}}}; вызывается после прохода risk loop.
+    """
+    fresh = {"/state": _build(_dumps(state))}
+    for symbol, item in state.get("symbols", {}).items():
+        fresh[f"/state/{symbol}"] = _build(_dumps({"ts": state.get("ts"), "symbol": symbol, **item}))
+
+    # старые /state/* уходят целиком: символ, пропавший из состояния, — 404
+    for path in [p for p in _cache if p.startswith("/state")]:
+        if path not in fresh:
+            del _cache[path]
+    _cache.update(fresh)
+    stats["publishes"] += 1
+
+
+def set_health_source(fn):
+    """fn() -> dict; вызывается не чаще раза в HEALTH_TTL."""
+    global _health_source
+    _health_source = fn
+
+
+def _health():
+    global _health_built
+    now = time.monotonic()
+    cached = _cache.get("/health")
+    if cached is None or now - _health_built >= HEALTH_TTL:
+        payload = _health_source() if _health_source else {"status": "ok"}
+        cached = _cache["/health"] = _build(_dumps(payload))
+        _health_built = now
+    return cached
+
+
+def add_admin_action(path, fn):
+    """POST path -> fn() -> (status, dict); fn выполняется прямо на loop."""
+    _admin_actions[path] = fn
+
+
+_OK = _build(b"OK", "text/plain")
+
+
+def _route(path):
+    path = path.split("?", 1)[0].rstrip("/") or "/"
+    if path == "/":
+        return _OK
+    if path == "/health":
+        return _health()
+    if path == "/metrics":
+        return _build(metrics.render().encode(), "text/plain; version=0.0.4")
+    return _cache.get(path)
+
+
+def _error(status):
+    body = _REASONS[status].encode()
+    return _response_head(status, "text/plain", len(body)) + body
+
+
+def _admin(target, headers):
+    fn = _admin_actions.get(target.split("?", 1)[0].rstrip("/"))
+    if fn is None or not HTTP_ADMIN_TOKEN:
+        return _error(404)
+    if not hmac.compare_digest(headers.get("authorization", ""), f"Bearer {HTTP_ADMIN_TOKEN}"):
+        return _error(401)
+    status, payload = fn()
+    body = _dumps(payload)
+    return _response_head(status, "application/json", len(body)) + body
+
+
+def _respond(method, target, headers):
+    if method == "POST":
+        return _admin(target, headers)
+    if method not in ("GET", "HEAD"):
+        return _error(405)
+    cached = _route(target)
+    if cached is None:
+        return _error(404)
+    if headers.get("if-none-match") == cached.etag:
+        stats["not_modified"] += 1
+        return cached.not_modified
+    return cached.head if method == "HEAD" else cached.ok
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, version = line.decode("latin-1").split()
+    headers = {}
+    while True:
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length:
+        await reader.readexactly(length)
+    return method, target, version, headers
+
+
+async def _handle(reader, writer):
+    try:
+        while True:
+            try:
+                async with asyncio.timeout(HTTP_IDLE_TIMEOUT):
+                    request = await _read_request(reader)
+            except ValueError:
+                writer.write(_error(400))
+                break
+            if request is None:
+                break
+
+            method, target, version, headers = request
+            stats["requests"] += 1
+
+            # сбой источника /health, сериализации или admin-действия —
+            # 500 этому запросу, соединение и сервер живут дальше
+            try:
+                response = _respond(method, target, headers)
+            except Exception as e:
+                stats["errors"] += 1
+                print(f"HTTP {method} {target} FAILED: {type(e).__name__} {e}", flush=True)
+                response = _error(500)
+            writer.write(response)
+            await writer.drain()
+
+            if version != "HTTP/1.1" or headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, TimeoutError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=HTTP_HOST, port=HTTP_PORT):
+    server = await asyncio.start_server(_handle, host, port)
+    async with server:
+        await server.serve_forever()
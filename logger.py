@@ -1,45 +1,205 @@
 # logger.py
+import asyncio
 import os
 import time
+from collections import deque
 
 import requests
 
+import clock
+import metrics
+from spool import LogSpool
+
 _SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
 _SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 _SUPABASE_LOGS_TABLE = os.getenv("SUPABASE_LOGS_TABLE", "logs")
 _LOG_TO_SUPABASE = bool(_SUPABASE_URL and _SUPABASE_KEY)
 
+# Параметры фонового шиппера
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "100"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+LOG_POST_TIMEOUT = float(os.getenv("LOG_POST_TIMEOUT", "5"))
+LOG_SPOOL_ENABLED = os.getenv("LOG_SPOOL_ENABLED", "1") == "1"
+LOG_REPLAY_BATCH_SIZE = int(os.getenv("LOG_REPLAY_BATCH_SIZE", "1000"))
+LOG_REPLAY_MAX_BATCHES = int(os.getenv("LOG_REPLAY_MAX_BATCHES", "10"))
+
+_queue = deque()
+_wakeup = None
+_session = None
+_spool = None
+_endpoint_ok = True
+
+stats = {
+    "queued": 0,
+    "sent": 0,
+    "dropped": 0,
+    "failed_batches": 0,
+}
+
+LOG_POST_SECONDS = metrics.Histogram(
+    "log_post_seconds", "Supabase batch insert latency", buckets=metrics.LATENCY_BUCKETS[7:]
+)
+
+
+@metrics.collector
+def _log_metrics():
+    families = [
+        ("log_rows_queued_total", "counter", "Rows accepted by log_event", [({}, stats["queued"])]),
+        ("log_rows_sent_total", "counter", "Rows delivered to Supabase", [({}, stats["sent"])]),
+        ("log_rows_dropped_total", "counter", "Rows lost (queue full, no spool)", [({}, stats["dropped"])]),
+        ("log_failed_batches_total", "counter", "Batch inserts that failed", [({}, stats["failed_batches"])]),
+        ("log_queue_rows", "gauge", "Rows waiting in memory", [({}, len(_queue))]),
+    ]
+    spool = spool_stats()
+    if spool is not None:
+        families += [
+            ("log_spool_backlog_rows", "gauge", "Rows waiting in the disk spool", [({}, spool["backlog_rows"])]),
+            ("log_spool_backlog_bytes", "gauge", "Bytes waiting in the disk spool", [({}, spool["backlog_bytes"])]),
+            ("log_spool_rows_total", "counter", "Rows written to the disk spool", [({}, spool["spooled_rows"])]),
+            ("log_spool_replayed_rows_total", "counter", "Spooled rows delivered on replay", [({}, spool["replayed_rows"])]),
+            ("log_spool_dropped_rows_total", "counter", "Spooled rows lost (spool full)", [({}, spool["dropped_rows"])]),
+            ("log_spool_replay_rows_per_sec", "gauge", "Throughput of the last spool replay", [({}, spool["replay_rows_per_sec"])]),
+        ]
+    return families
+
+
 def now_ts_ms():
-    return int(time.time() * 1000)
+    return int(clock.now() * 1000)
+
 
 def log_event(event_type: str, payload: dict):
-    """Универсальный логгер событий бота (только Supabase)."""
+    """
+    Универсальный логгер событий бота (только Supabase).
+    Только кладёт строку в очередь — отправкой занимается run_shipper().
+    """
+
+    if not _LOG_TO_SUPABASE:
+        return
 
-    record = {
+    if len(_queue) >= LOG_QUEUE_MAX:
+        stats["dropped"] += 1
+        return
+
+    _queue.append({
         "ts": now_ts_ms(),
-        "type": event_type,
+        "event": event_type,
+        "symbol": payload.get("symbol"),
         "data": payload,   # 👈 важный момент
-    }
+    })
+    stats["queued"] += 1
 
-    if _LOG_TO_SUPABASE:
-        try:
-            resp = requests.post(
-                f"{_SUPABASE_URL}/rest/v1/{_SUPABASE_LOGS_TABLE}",
-                headers={
-                    "apikey": _SUPABASE_KEY,
-                    "Authorization": f"Bearer {_SUPABASE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=minimal",
-                },
-                json={
-                    "ts": record["ts"],
-                    "event": event_type,
-                    "symbol": payload.get("symbol"),
-                    "data": payload,
-                },
-                timeout=5,
-            )
-            if resp.status_code >= 300:
-                return
-        except Exception:
+    if _wakeup is not None and len(_queue) >= LOG_BATCH_SIZE:
+        _wakeup.set()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update({
+            "apikey": _SUPABASE_KEY,
+            "Authorization": f"Bearer {_SUPABASE_KEY}",
+            "Content-Type": "application/json",
+            "Prefer": "return=minimal",
+        })
+    return _session
+
+
+def _post_rows(rows):
+    """PostgREST bulk insert: один POST с массивом строк."""
+    t0 = time.perf_counter()
+    try:
+        resp = _get_session().post(
+            f"{_SUPABASE_URL}/rest/v1/{_SUPABASE_LOGS_TABLE}",
+            json=rows,
+            timeout=LOG_POST_TIMEOUT,
+        )
+        return resp.status_code < 300
+    except Exception:
+        return False
+    finally:
+        LOG_POST_SECONDS.observe(time.perf_counter() - t0)
+
+
+def _take_batch(size):
+    n = min(size, len(_queue))
+    return [_queue.popleft() for _ in range(n)]
+
+
+async def _spool_rows(rows):
+    if _spool is None:
+        stats["dropped"] += len(rows)
+        return
+    await asyncio.to_thread(_spool.append, rows)
+
+
+async def _replay_spool():
+    """Дренаж спула большими батчами, пока endpoint отвечает."""
+    global _endpoint_ok
+
+    for _ in range(LOG_REPLAY_MAX_BATCHES):
+        rows = await asyncio.to_thread(_spool.read_batch, LOG_REPLAY_BATCH_SIZE)
+        if not rows:
             return
+        if not await asyncio.to_thread(_post_rows, rows):
+            _endpoint_ok = False
+            stats["failed_batches"] += 1
+            return
+        _endpoint_ok = True
+        _spool.commit(len(rows))
+
+
+async def flush():
+    """
+    Отправляет всё, что накопилось в очереди, батчами.
+    Пока Supabase недоступен, строки уходят в спул, а не теряются;
+    спул проигрывается, как только endpoint снова отвечает.
+    """
+    global _endpoint_ok
+
+    while _queue:
+        rows = _take_batch(LOG_BATCH_SIZE)
+        if not _endpoint_ok:
+            await _spool_rows(rows)
+            continue
+
+        if await asyncio.to_thread(_post_rows, rows):
+            stats["sent"] += len(rows)
+        else:
+            _endpoint_ok = False
+            stats["failed_batches"] += 1
+            await _spool_rows(rows)
+
+    if _spool is not None and _spool.segments:
+        await _replay_spool()
+    else:
+        _endpoint_ok = True
+
+
+def spool_stats():
+    return _spool.stats() if _spool is not None else None
+
+
+async def run_shipper():
+    """Фоновая задача: сбрасывает очередь раз в LOG_FLUSH_INTERVAL или при заполнении батча."""
+    global _wakeup, _spool
+    _wakeup = asyncio.Event()
+
+    if LOG_SPOOL_ENABLED and _spool is None:
+        try:
+            _spool = LogSpool()
+        except OSError as e:
+            print(f"LOG SPOOL DISABLED: {e}", flush=True)
+
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=LOG_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+        try:
+            await flush()
+        except Exception as e:
+            print(f"LOG SHIPPER ERROR: {e}", flush=True)
@@ -0,0 +1,149 @@
+# loop_monitor.py
+"""
+Монитор отзывчивости event loop.
+
+Корутина run() просыпается каждые LOOP_LAG_INTERVAL и меряет, насколько
+позже обещанного её разбудили (лаг планировщика). Отдельный поток следит
+за «пульсом» этой корутины: если пульса нет дольше LOOP_BLOCK_THRESHOLD,
+loop кем-то занят — поток снимает стек с потока loop, пока блокировка
+не кончится, и по самому частому стеку называет виновника (функцию из кода
+бота, напр. BinanceOIPoller.update). Итог уходит в system_warning.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+import metrics
+from config import (
+    LOOP_BLOCK_THRESHOLD,
+    LOOP_LAG_INTERVAL,
+    LOOP_SAMPLE_INTERVAL,
+    LOOP_WARN_COOLDOWN,
+)
+from logger import log_event
+
+_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_STACK_DEPTH = 12
+
+LAG_SECONDS = metrics.Histogram("event_loop_lag_seconds", "Extra delay of a scheduled loop wakeup")
+
+_heartbeat = None  # time.monotonic() последнего пробуждения монитора
+_pending = deque()  # отчёты о блокировках от потока-сэмплера
+_last_warned = {}  # function -> monotonic
+offenders = {}  # function -> {"blocks", "total_sec", "max_sec", "path"}
+stats = {"max_lag_sec": 0.0, "blocks": 0}
+
+
+@metrics.collector
+def _loop_metrics():
+    items = list(offenders.items())
+    return [
+        ("event_loop_max_lag_seconds", "gauge", "Worst wakeup lag since start", [({}, stats["max_lag_sec"])]),
+        ("event_loop_blocks_total", "counter", "Loop blocks over threshold by culprit", [
+            ({"function": fn}, o["blocks"]) for fn, o in items
+        ]),
+        ("event_loop_blocked_seconds_total", "counter", "Time the loop was blocked by culprit", [
+            ({"function": fn}, o["total_sec"]) for fn, o in items
+        ]),
+    ]
+
+
+def _own_frames(frame):
+    """Кадры кода бота от внешнего к внутреннему (без stdlib/site-packages)."""
+    chain = []
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(_ROOT) and "site-packages" not in path and not path.endswith("loop_monitor.py"):
+            chain.append(frame)
+        frame = frame.f_back
+    chain.reverse()
+    return chain
+
+
+def _sample(thread_id):
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    chain = _own_frames(frame)
+    names = tuple(f.f_code.co_qualname for f in chain)
+    stack = "".join(traceback.format_stack(frame)[-_STACK_DEPTH:])
+    return names, stack
+
+
+def _sampler(thread_id):
+    """Поток: ждёт пропажи пульса и снимает стеки, пока loop занят."""
+    limit = LOOP_LAG_INTERVAL + LOOP_BLOCK_THRESHOLD
+    while True:
+        time.sleep(LOOP_SAMPLE_INTERVAL)
+        beat = _heartbeat
+        if beat is None or time.monotonic() - beat < limit:
+            continue
+
+        samples = Counter()
+        stacks = {}
+        while _heartbeat == beat:
+            taken = _sample(thread_id)
+            if taken is not None:
+                names, stack = taken
+                samples[names] += 1
+                stacks.setdefault(names, stack)
+            time.sleep(LOOP_SAMPLE_INTERVAL)
+
+        blocked = (_heartbeat or time.monotonic()) - beat - LOOP_LAG_INTERVAL
+        if samples:
+            names, hits = samples.most_common(1)[0]
+            _pending.append((blocked, names, hits, sum(samples.values()), stacks[names]))
+
+
+def _report(blocked, names, hits, total, stack):
+    function = names[-1] if names else "<external>"
+    stats["blocks"] += 1
+    o = offenders.setdefault(function, {"blocks": 0, "total_sec": 0.0, "max_sec": 0.0, "path": None})
+    o["blocks"] += 1
+    o["total_sec"] += blocked
+    o["max_sec"] = max(o["max_sec"], blocked)
+    o["path"] = " > ".join(names)
+
+    now = time.monotonic()
+    if now - _last_warned.get(function, -LOOP_WARN_COOLDOWN) < LOOP_WARN_COOLDOWN:
+        return
+    _last_warned[function] = now
+
+    log_event(
+        "system_warning",
+        {
+            "type": "EVENT_LOOP_BLOCKED",
+            "function": function,
+            "path": o["path"],
+            "blocked_sec": round(blocked, 3),
+            "samples": f"{hits}/{total}",
+            "stack": stack,
+        },
+    )
+
+
+async def run():
+    """Фоновая задача; поток-сэмплер стартует из неё, чтобы знать поток loop."""
+    global _heartbeat
+    _heartbeat = time.monotonic()
+    threading.Thread(
+        target=_sampler, args=(threading.get_ident(),), name="loop-monitor", daemon=True
+    ).start()
+
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        _heartbeat = time.monotonic()
+
+        lag = max(0.0, loop.time() - expected)
+        LAG_SECONDS.observe(lag)
+        if lag > stats["max_lag_sec"]:
+            stats["max_lag_sec"] = lag
+
+        while _pending:
+            _report(*_pending.popleft())
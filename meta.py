@@ -1,4 +1,3 @@
-import time
 import ws_binance as ws
 
 
@@ -6,33 +5,35 @@ import ws_binance as ws
 # QUALITY
 # =========================
 
-def stream_quality(symbol):
+def stream_quality(symbol, snap=None):
     """
     Диагностика здоровья потоков данных.
     НЕ влияет на сигналы.
     """
 
-    now = time.time()
+    if snap is None:
+        snap = ws.snapshot(symbol)
+
+    now = snap.ts
     checks = {}
 
     # WebSocket жив
     checks["ws"] = (
-        symbol in ws.last_update
-        and now - ws.last_update[symbol] < 180
+        snap.last_update is not None
+        and now - snap.last_update < 180
     )
 
     # Funding
-    checks["funding"] = ws.funding.get(symbol) is not None
+    checks["funding"] = snap.funding is not None
 
     # Trades (long/short ratio)
-    ls = ws.long_short_ratio.get(symbol)
-    checks["trades"] = bool(ls and (ls["long"] + ls["short"]) > 0)
+    checks["trades"] = (snap.trade_long + snap.trade_short) > 0
 
     # Liquidations
-    checks["liq"] = ws.liquidations.get(symbol, 0) > 0
+    checks["liq"] = snap.liquidations > 0
 
     # Price
-    checks["price"] = symbol in getattr(ws, "mark_price", {})
+    checks["price"] = snap.mark_price is not None
 
     score = sum(checks.values())
     max_score = len(checks)
@@ -0,0 +1,83 @@
+# metrics.py
+"""
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Горячие пути только увеличивают счётчики и раскладывают замеры по корзинам
+гистограмм; всё остальное (размеры окон, состояние шардов, очередь логов)
+собирается коллекторами модулей в момент запроса /metrics.
+"""
+from bisect import bisect_left
+
+# Время обработчика WS меряется на каждом N-м кадре — perf_counter на каждый
+# кадр стоил бы заметную долю самого обработчика
+HANDLER_SAMPLE_EVERY = 64
+
+LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_histograms = []
+_collectors = []
+
+
+class Histogram:
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        _histograms.append(self)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:.9g}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+def collector(fn):
+    """
+    Регистрирует функцию, которая при запросе /metrics возвращает
+    [(name, type, help, [(labels, value), ...]), ...].
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def render():
+    lines = []
+    for fn in _collectors:
+        try:
+            families = fn()
+        except Exception as e:
+            lines.append(f"# collector {fn.__module__}.{fn.__name__} failed: {type(e).__name__}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {value:.9g}")
+    for h in _histograms:
+        lines.extend(h.render())
+    return "\n".join(lines) + "\n"
@@ -1,39 +1,70 @@
+import asyncio
 import time
-import requests
 from collections import deque
 
+import clock
+import metrics
+import recorder
+from binance_rest import get_json, get_json_async
+
 BINANCE_OI_URL = "https://fapi.binance.com/futures/data/openInterestHist"
+BINANCE_OI_LIVE_URL = "https://fapi.binance.com/fapi/v1/openInterest"
 
 MAX_OI_AGE = 15 * 60  # 15 минут
 
+PERIOD_SECONDS = {"5m": 300, "15m": 900, "30m": 1800, "1h": 3600}
+
+OI_POLL_SECONDS = metrics.Histogram("oi_poll_seconds", "openInterestHist request latency")
+OI_LIVE_POLL_SECONDS = metrics.Histogram("oi_live_poll_seconds", "openInterest request latency")
+poll_stats = {"requests": 0, "failures": 0, "live_requests": 0, "live_failures": 0}
+
+
+@metrics.collector
+def _oi_metrics():
+    return [
+        ("oi_poll_requests_total", "counter", "OI requests sent", [({}, poll_stats["requests"])]),
+        ("oi_poll_failures_total", "counter", "OI requests failed", [({}, poll_stats["failures"])]),
+        ("oi_live_poll_requests_total", "counter", "Live OI requests sent", [({}, poll_stats["live_requests"])]),
+        ("oi_live_poll_failures_total", "counter", "Live OI requests failed", [({}, poll_stats["live_failures"])]),
+    ]
+
 
 class BinanceOIPoller:
-    def __init__(self, symbols, period="5m", window=12):
+    def __init__(self, symbols, period="5m", window=12, concurrency=16, timeout=10,
+                 live_window=300):
         """
         period: 5m
         window: number of points to keep (12 * 5m = 1h)
+        concurrency: max parallel requests in update_async()
+        timeout: per-symbol request timeout, seconds
+        live_window: seconds of live OI samples to keep (update_live_async)
         """
         self.symbols = symbols
         self.period = period
         self.window = window
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.live_window = live_window
 
         self.oi_window = {
             s: deque(maxlen=window) for s in symbols
         }
+        # живой OI: (ts, oi) за последние live_window секунд
+        self.oi_live = {
+            s: deque() for s in symbols
+        }
 
         self.last_update_ts = {}
 
-    def fetch_oi(self, symbol):
-        params = {
+    def _params(self, symbol, limit=1):
+        return {
             "symbol": symbol,
             "period": self.period,
-            "limit": 1,
+            "limit": limit,
         }
 
-        r = requests.get(BINANCE_OI_URL, params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-
+    @staticmethod
+    def _parse(data):
         if not data:
             return None
 
@@ -44,29 +75,178 @@ class BinanceOIPoller:
         ts = ts_ms / 1000 if ts_ms is not None else None
         return oi_value, ts
 
+    def fetch_oi(self, symbol):
+        poll_stats["requests"] += 1
+        t0 = time.perf_counter()
+        data = get_json(BINANCE_OI_URL, self._params(symbol), self.timeout)
+        OI_POLL_SECONDS.observe(time.perf_counter() - t0)
+        recorder.record("oi", {"symbol": symbol, "data": data})
+        return self._parse(data)
+
+    async def fetch_oi_async(self, symbol):
+        poll_stats["requests"] += 1
+        t0 = time.perf_counter()
+        data = await get_json_async(BINANCE_OI_URL, self._params(symbol), self.timeout)
+        OI_POLL_SECONDS.observe(time.perf_counter() - t0)
+        recorder.record("oi", {"symbol": symbol, "data": data})
+        return self._parse(data)
+
+    def _apply(self, symbol, result, now):
+        # --- сброс протухшего окна ---
+        last_ts = self.last_update_ts.get(symbol)
+        if last_ts and now - last_ts > MAX_OI_AGE:
+            self.oi_window[symbol].clear()
+
+        if result is None:
+            return
+
+        oi, ts = result
+        if ts is None:
+            ts = now
+
+        if last_ts and ts <= last_ts:
+            return
+
+        self.oi_window[symbol].append((ts, oi))
+        self.last_update_ts[symbol] = ts
+
+    @staticmethod
+    def _parse_live(data):
+        if not data:
+            return None
+        return float(data["openInterest"]), data["time"] / 1000
+
+    def fetch_oi_live(self, symbol):
+        poll_stats["live_requests"] += 1
+        t0 = time.perf_counter()
+        data = get_json(BINANCE_OI_LIVE_URL, {"symbol": symbol}, self.timeout)
+        OI_LIVE_POLL_SECONDS.observe(time.perf_counter() - t0)
+        recorder.record("oi_live", {"symbol": symbol, "data": data})
+        return self._parse_live(data)
+
+    async def fetch_oi_live_async(self, symbol):
+        poll_stats["live_requests"] += 1
+        t0 = time.perf_counter()
+        data = await get_json_async(BINANCE_OI_LIVE_URL, {"symbol": symbol}, self.timeout)
+        OI_LIVE_POLL_SECONDS.observe(time.perf_counter() - t0)
+        recorder.record("oi_live", {"symbol": symbol, "data": data})
+        return self._parse_live(data)
+
+    def _apply_live(self, symbol, result, now):
+        """True — добавлена новая точка."""
+        window = self.oi_live[symbol]
+        added = False
+        if result is not None:
+            oi, ts = result
+            if not window or ts > window[-1][0]:
+                window.append((ts, oi))
+                added = True
+
+        # окно отсчитывается от времени биржи — replay режет его так же, как вживую;
+        # без новой точки (ошибка запроса) — от текущего времени, чтобы не залипал спайк
+        cutoff = (window[-1][0] if added else now) - self.live_window
+        while window and window[0][0] < cutoff:
+            window.popleft()
+        return added
+
+    def _apply_hist(self, symbol, data):
+        last_ts = self.last_update_ts.get(symbol)
+        for point in sorted(data or [], key=lambda p: p["timestamp"]):
+            ts = point["timestamp"] / 1000
+            if last_ts and ts <= last_ts:
+                continue
+            self.oi_window[symbol].append((ts, float(point["sumOpenInterest"])))
+            self.last_update_ts[symbol] = last_ts = ts
+
+    def period_start(self, now):
+        """Начало текущего периода openInterestHist (границы кратны периоду)."""
+        period = PERIOD_SECONDS[self.period]
+        return int(now // period) * period
+
+    def due_symbols(self, now):
+        """Символы без точки текущего периода — только их есть смысл опрашивать."""
+        start = self.period_start(now)
+        return [s for s in self.symbols if self.last_update_ts.get(s, 0) < start]
+
     def update(self):
-        now = time.time()
+        now = clock.now()
 
         for symbol in self.symbols:
             try:
-                # --- сброс протухшего окна ---
-                last_ts = self.last_update_ts.get(symbol)
-                if last_ts and now - last_ts > MAX_OI_AGE:
-                    self.oi_window[symbol].clear()
-
                 result = self.fetch_oi(symbol)
-                if result is None:
-                    continue
-
-                oi, ts = result
-                if ts is None:
-                    ts = now
-
-                if last_ts and ts <= last_ts:
-                    continue
-
-                self.oi_window[symbol].append((ts, oi))
-                self.last_update_ts[symbol] = ts
-
             except Exception as e:
+                poll_stats["failures"] += 1
                 print(f"OI ERROR {symbol}: {e}")
+                result = None
+            self._apply(symbol, result, now)
+
+    async def update_async(self, symbols=None):
+        """
+        То же, что update(), но все символы (или только `symbols`) опрашиваются
+        параллельно (не более `concurrency` запросов одновременно) — цикл
+        занимает один round-trip вместо N и не блокирует event loop.
+        """
+        now = clock.now()
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(symbol):
+            async with sem:
+                try:
+                    result = await self.fetch_oi_async(symbol)
+                except Exception as e:
+                    poll_stats["failures"] += 1
+                    print(f"OI ERROR {symbol}: {type(e).__name__} {e}")
+                    result = None
+                # окно проверяем на протухание даже при ошибке
+                self._apply(symbol, result, now)
+
+        await asyncio.gather(*(one(s) for s in (self.symbols if symbols is None else symbols)))
+
+    async def update_live_async(self):
+        """
+        Живой OI по всем символам параллельно; возвращает символы с новой
+        точкой. Исторический ряд (oi_window) это не трогает.
+        """
+        now = clock.now()
+        sem = asyncio.Semaphore(self.concurrency)
+        updated = []
+
+        async def one(symbol):
+            async with sem:
+                try:
+                    result = await self.fetch_oi_live_async(symbol)
+                except Exception as e:
+                    poll_stats["live_failures"] += 1
+                    print(f"OI LIVE ERROR {symbol}: {type(e).__name__} {e}")
+                    result = None
+                if self._apply_live(symbol, result, now):
+                    updated.append(symbol)
+
+        await asyncio.gather(*(one(s) for s in self.symbols))
+        return updated
+
+    async def backfill_async(self):
+        """
+        Прогрев после старта: забирает последние `window` точек истории OI,
+        чтобы тренд и спайки работали сразу, а не через час.
+        """
+        sem = asyncio.Semaphore(self.concurrency)
+        filled = 0
+
+        async def one(symbol):
+            nonlocal filled
+            async with sem:
+                try:
+                    data = await get_json_async(
+                        BINANCE_OI_URL, self._params(symbol, self.window), self.timeout
+                    )
+                except Exception as e:
+                    print(f"OI BACKFILL ERROR {symbol}: {type(e).__name__} {e}")
+                    return
+
+            recorder.record("oi_hist", {"symbol": symbol, "data": data})
+            self._apply_hist(symbol, data)
+            filled += 1
+
+        await asyncio.gather(*(one(s) for s in self.symbols))
+        return filled
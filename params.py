@@ -0,0 +1,223 @@
+# params.py
+"""
+Пороги риска и дивергенций поверх значений из кода — без рестарта.
+
+Переопределения — плоский словарь (тот же формат, что params у sweep.py):
+
+    {
+        "OI_SPIKE_THRESHOLD": 0.012,
+        "HARD_ALERT_LEVEL": 9,
+        "LIQ_THRESHOLDS.*": 1.5,               # множитель ко всем символам
+        "LIQ_THRESHOLDS.BTCUSDT": 25000000,    # поверх множителя
+        "L1.long_trap_pressure": 0.7,          # CLASS_DIVERGENCE_PARAMS
+        "ZECUSDT.price_trend_delta": 0.002     # SYMBOL_PARAM_OVERRIDES
+    }
+
+Бот перечитывает PARAMS_PATH при изменении файла (watch) и по
+POST /admin/reload. Новый набор сначала целиком собирается и проверяется
+поверх значений из кода, затем ставится одним синхронным шагом — на том же
+event loop, что и risk loop, то есть между тиками. Ошибка в файле оставляет
+прежние параметры. Окна, OI, cooldown'ы и WS не трогаются. Удалённый файл —
+возврат к значениям из кода.
+"""
+import asyncio
+import copy
+import json
+import math
+import os
+import sys
+import time
+
+import config
+import divergence
+
+PARAMS_PATH = os.getenv("PARAMS_PATH", "params.json")
+PARAMS_WATCH_INTERVAL = float(os.getenv("PARAMS_WATCH_INTERVAL", "5"))
+
+CONFIG_KEYS = (
+    "FUNDING_EXTREME_THRESHOLD",
+    "FUNDING_SPIKE_THRESHOLD",
+    "OI_SPIKE_THRESHOLD",
+    "OI_LIVE_SPIKE_THRESHOLD",
+    "EARLY_ALERT_LEVEL",
+    "HARD_ALERT_LEVEL",
+)
+_INT_KEYS = ("EARLY_ALERT_LEVEL", "HARD_ALERT_LEVEL")
+
+# импортируют константы по значению (from config import ...)
+_BOUND_MODULES = ("bot", "risk", "triggers", "divergence")
+
+
+def _bound_modules():
+    modules = [sys.modules.get(name) for name in _BOUND_MODULES]
+    # python bot.py: бот загружен как __main__, а не как bot
+    main = sys.modules.get("__main__")
+    if os.path.basename(getattr(main, "__file__", None) or "") == "bot.py":
+        modules.append(main)
+    return [m for m in modules if m is not None]
+
+
+def _snapshot():
+    return {
+        "config": {k: getattr(config, k) for k in CONFIG_KEYS},
+        "liq": dict(config.LIQ_THRESHOLDS),
+        "classes": copy.deepcopy(divergence.CLASS_DIVERGENCE_PARAMS),
+        "overrides": copy.deepcopy(divergence.SYMBOL_PARAM_OVERRIDES),
+    }
+
+
+_baseline = _snapshot()  # значения из кода
+
+current = {}  # действующие переопределения
+status = {"path": PARAMS_PATH, "loaded_at": None, "reloads": 0, "errors": 0, "error": None}
+
+
+def _param_names():
+    names = set()
+    for table in (_baseline["classes"], _baseline["overrides"]):
+        for params in table.values():
+            names.update(params)
+    return names
+
+
+def check_key(key):
+    head, _, name = key.partition(".")
+    if not name:
+        if head not in CONFIG_KEYS:
+            raise ValueError(f"unknown parameter {key!r}")
+    elif head == "LIQ_THRESHOLDS":
+        if name != "*" and name not in _baseline["liq"]:
+            raise ValueError(f"unknown symbol in {key!r}")
+    elif head not in _baseline["classes"] and head not in divergence.SYMBOL_CLASSES:
+        raise ValueError(f"unknown class or symbol in {key!r}")
+    elif name not in _param_names():
+        raise ValueError(f"unknown divergence parameter in {key!r}")
+
+
+def _check_value(key, value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{key}: expected a number, got {value!r}")
+    if key in _INT_KEYS and value != int(value):
+        raise ValueError(f"{key}: expected an integer, got {value!r}")
+    if key.endswith("_pressure") and not 0 < value < 1:
+        raise ValueError(f"{key}: pressure must be in (0, 1), got {value!r}")
+    if value < 0 or (value == 0 and not key.endswith("price_trend_delta")):
+        raise ValueError(f"{key}: must be positive, got {value!r}")
+
+
+def resolve(overrides):
+    """
+    Значения из кода + переопределения -> полный набор. LIQ_THRESHOLDS.*
+    ставится первым, пороги отдельных символов — поверх, в любом порядке
+    ключей. Ничего не меняет; ValueError — набор некорректен.
+    """
+    if not isinstance(overrides, dict):
+        raise ValueError("params must be a JSON object")
+
+    state = copy.deepcopy(_baseline)
+    for key, value in sorted(overrides.items(), key=lambda kv: kv[0] != "LIQ_THRESHOLDS.*"):
+        check_key(key)
+        _check_value(key, value)
+        head, _, name = key.partition(".")
+        if not name:
+            state["config"][head] = int(value) if head in _INT_KEYS else value
+        elif head == "LIQ_THRESHOLDS":
+            if name == "*":
+                state["liq"] = {s: t * value for s, t in _baseline["liq"].items()}
+            else:
+                state["liq"][name] = value
+        elif head in state["classes"]:
+            state["classes"][head][name] = value
+        else:
+            state["overrides"].setdefault(head, {})[name] = value
+
+    levels = state["config"]
+    if levels["EARLY_ALERT_LEVEL"] > levels["HARD_ALERT_LEVEL"]:
+        raise ValueError("EARLY_ALERT_LEVEL must not exceed HARD_ALERT_LEVEL")
+    return state
+
+
+def _replace(target, values):
+    target.clear()
+    target.update(values)
+
+
+def apply(overrides):
+    """
+    Проверяет и ставит набор. Словари меняются на месте — ссылки на
+    config.LIQ_THRESHOLDS в других модулях остаются действительными.
+    """
+    global current
+    state = resolve(overrides)
+
+    for key, value in state["config"].items():
+        setattr(config, key, value)
+        for module in _bound_modules():
+            if hasattr(module, key):
+                setattr(module, key, value)
+    _replace(config.LIQ_THRESHOLDS, state["liq"])
+    _replace(divergence.CLASS_DIVERGENCE_PARAMS, state["classes"])
+    _replace(divergence.SYMBOL_PARAM_OVERRIDES, state["overrides"])
+    divergence.compile_params()
+
+    current = dict(overrides)
+    return state
+
+
+# =========================
+# ФАЙЛ
+# =========================
+
+def load_file(path=None):
+    """Прочитать и поставить PARAMS_PATH; нет файла — значения из кода."""
+    path = path or PARAMS_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+    except FileNotFoundError:
+        overrides = {}
+    except (OSError, ValueError) as e:
+        status["errors"] += 1
+        status["error"] = f"{type(e).__name__}: {e}"
+        raise ValueError(status["error"]) from e
+
+    try:
+        apply(overrides)
+    except ValueError as e:
+        status["errors"] += 1
+        status["error"] = str(e)
+        raise
+
+    status.update(path=path, loaded_at=int(time.time()), error=None)
+    status["reloads"] += 1
+    return current
+
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+async def watch(on_reload=None, path=None, interval=PARAMS_WATCH_INTERVAL):
+    """
+    Фоновая задача: перечитывает файл при смене mtime/размера.
+    on_reload(params, error) — для логирования.
+    """
+    path = path or PARAMS_PATH
+    seen = _file_version(path)
+    while True:
+        await asyncio.sleep(interval)
+        version = _file_version(path)
+        if version == seen:
+            continue
+        seen = version
+        try:
+            params = load_file(path)
+            error = None
+        except ValueError as e:
+            params, error = current, str(e)
+        if on_reload is not None:
+            on_reload(params, error)
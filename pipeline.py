@@ -0,0 +1,290 @@
+# pipeline.py
+"""
+Многопроцессный режим: WS-ingestion и scoring на разных ядрах.
+
+    python pipeline.py
+
+Супервизор создаёт сегмент shared memory (shm_state.py) и запускает:
+  ingest-N — binance_ws по своей части символов; корзины сделок/ликвидаций
+             пишутся прямо в сегмент, funding/mark/счётчики публикуются
+             раз в PIPELINE_PUBLISH_INTERVAL вместе с пульсом процесса;
+  scoring  — bot.main(ingest=False): risk loop, триггеры, OI, логи, HTTP,
+             чекпоинты; состояние символов читает из сегмента без копий.
+Упавший или зависший (нет пульса PIPELINE_HEARTBEAT_TIMEOUT) процесс
+перезапускается с экспоненциальной задержкой. Обычный режим — python bot.py.
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import signal
+import time
+
+from config import (
+    PIPELINE_HEARTBEAT_TIMEOUT,
+    PIPELINE_INGEST_WORKERS,
+    PIPELINE_PUBLISH_INTERVAL,
+    PIPELINE_RESTART_MAX_BACKOFF,
+    RISK_TRIGGER_DEBOUNCE,
+    RISK_TRIGGERS_ENABLED,
+    ROLLING_MAX_HORIZON,
+    SYMBOLS,
+    WINDOW_SECONDS,
+)
+from shm_state import LIQS, TRADES, SharedLayout, SharedSymbolView
+
+
+def _child_setup(name):
+    """
+    До импорта logger/recorder: у каждого процесса свой спул и своя
+    папка записи, иначе процессы пишут в одни и те же файлы.
+    """
+    os.environ["LOG_SPOOL_DIR"] = os.path.join(os.getenv("LOG_SPOOL_DIR", "spool"), name)
+    if os.getenv("RECORD_DIR"):
+        os.environ["RECORD_DIR"] = os.path.join(os.environ["RECORD_DIR"], name)
+    # Ctrl+C получает вся группа процессов; останавливает детей супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# =========================
+# INGESTION
+# =========================
+
+async def _publish(layout, worker_id, states):
+    import ws_binance as ws
+
+    pid = os.getpid()
+    while True:
+        for st in states:
+            layout.publish_scalars(st)
+
+        shards = list(ws.shard_health.values())
+        layout.publish_worker(
+            worker_id,
+            pid=pid,
+            heartbeat=time.time(),
+            connected=bool(shards) and all(h["connected"] for h in shards),
+            messages=sum(h["messages"] for h in shards),
+            reconnects=sum(h["reconnects"] for h in shards),
+            backoff=max((h["backoff"] for h in shards), default=0),
+        )
+        await asyncio.sleep(PIPELINE_PUBLISH_INTERVAL)
+
+
+async def _ingest(layout, worker_id, symbols):
+    import ws_binance as ws
+    from bootstrap import BOOTSTRAP_TIMEOUT, warm_start
+    from logger import log_event, run_shipper
+    from symbol_state import SymbolState
+
+    # триггеры считает scoring-процесс по сегменту
+    ws.RISK_TRIGGERS_ENABLED = False
+
+    states = []
+    for s in symbols:
+        st = SymbolState(s, buffers=(
+            layout.window_buffers(s, TRADES),
+            layout.window_buffers(s, LIQS),
+        ))
+        layout.load_scalars(st)
+        ws.states[s] = st
+        states.append(st)
+
+    asyncio.create_task(run_shipper())
+    asyncio.create_task(_publish(layout, worker_id, states))
+
+    try:
+        await asyncio.wait_for(
+            warm_start(None, None, symbols=symbols), timeout=BOOTSTRAP_TIMEOUT
+        )
+    except Exception as e:
+        log_event("bootstrap_error", {"error_type": type(e).__name__, "error": str(e)})
+
+    await ws.binance_ws(symbols)
+
+
+def ingest_worker(spec, worker_id, symbols):
+    _child_setup(f"ingest-{worker_id}")
+    layout = SharedLayout(spec)
+    asyncio.run(_ingest(layout, worker_id, list(symbols)))
+
+
+# =========================
+# SCORING
+# =========================
+
+async def _shared_health(layout):
+    """shard_health scoring-процесса = здоровье ingestion-процессов из сегмента."""
+    import ws_binance as ws
+
+    while True:
+        now = time.time()
+        for i in range(layout.spec.workers):
+            w = layout.worker(i)
+            ws.shard_health[i] = {
+                "pid": int(w["pid"]),
+                "connected": bool(w["connected"]),
+                "messages": int(w["messages"]),
+                "reconnects": int(w["reconnects"]),
+                "backoff": w["backoff"],
+                "heartbeat_sec_ago": round(now - w["heartbeat"], 1) if w["heartbeat"] else None,
+            }
+        await asyncio.sleep(1)
+
+
+async def _shared_triggers():
+    """
+    Обработчики WS живут в другом процессе, поэтому проверки триггеров
+    (те же triggers.on_*) идут опросом сегмента раз в RISK_TRIGGER_DEBOUNCE.
+    """
+    import triggers
+    import ws_binance as ws
+
+    while True:
+        await asyncio.sleep(RISK_TRIGGER_DEBOUNCE)
+        for st in ws.states.values():
+            if st.funding is not None:
+                triggers.on_mark_price(st)
+            triggers.on_trade(st)
+            triggers.on_liquidation(st)
+
+
+async def _score(layout):
+    import bot
+    import ws_binance as ws
+
+    for s in layout.spec.symbols:
+        ws.states[s] = SharedSymbolView(layout, s)
+
+    asyncio.create_task(_shared_health(layout))
+    if RISK_TRIGGERS_ENABLED:
+        asyncio.create_task(_shared_triggers())
+    await bot.main(ingest=False)
+
+
+def scoring_worker(spec):
+    _child_setup("scoring")
+    layout = SharedLayout(spec)
+    asyncio.run(_score(layout))
+
+
+# =========================
+# SUPERVISOR
+# =========================
+
+class Supervisor:
+    def __init__(self, ctx, layout, workers):
+        """workers: name -> (target, args, ingest worker_id | None)."""
+        self.ctx = ctx
+        self.layout = layout
+        self.workers = workers
+        self.procs = {}
+        self.started = {}
+        self.failures = {name: 0 for name in workers}
+        self.restarts = {name: 0 for name in workers}
+        self.next_start = {}
+        self.stopping = False
+
+    def _start(self, name):
+        target, args, worker_id = self.workers[name]
+        if worker_id is not None:
+            # старый пульс не должен убить новый процесс до его первой публикации
+            self.layout.publish_worker(worker_id, pid=0, heartbeat=time.time(), connected=0)
+        proc = self.ctx.Process(target=target, args=args, name=name, daemon=False)
+        proc.start()
+        self.procs[name] = proc
+        self.started[name] = time.monotonic()
+        print(f"pipeline: started {name} pid={proc.pid}", flush=True)
+
+    def _hung(self, name):
+        worker_id = self.workers[name][2]
+        if worker_id is None:
+            return False
+        heartbeat = self.layout.worker(worker_id)["heartbeat"]
+        return heartbeat > 0 and time.time() - heartbeat > PIPELINE_HEARTBEAT_TIMEOUT
+
+    def check(self):
+        now = time.monotonic()
+        for name in self.workers:
+            proc = self.procs.get(name)
+
+            if proc is not None and proc.is_alive():
+                if self._hung(name):
+                    print(f"pipeline: {name} pid={proc.pid} missed heartbeat, restarting", flush=True)
+                    self._stop(proc)
+                elif now - self.started[name] > 60:
+                    self.failures[name] = 0
+                    continue
+                else:
+                    continue
+
+            if proc is not None:
+                self.failures[name] += 1
+                self.restarts[name] += 1
+                delay = min(2 ** (self.failures[name] - 1), PIPELINE_RESTART_MAX_BACKOFF)
+                self.next_start[name] = now + delay
+                self.procs[name] = None
+                print(
+                    f"pipeline: {name} exited code={proc.exitcode}, "
+                    f"restart #{self.restarts[name]} in {delay}s",
+                    flush=True,
+                )
+
+            if now >= self.next_start.get(name, 0):
+                self._start(name)
+
+    @staticmethod
+    def _stop(proc, timeout=10):
+        proc.terminate()
+        proc.join(timeout)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+
+    def run(self):
+        while not self.stopping:
+            self.check()
+            time.sleep(1)
+
+    def shutdown(self):
+        # scoring по SIGTERM пишет чекпоинт (bot._save_and_exit)
+        for proc in self.procs.values():
+            if proc is not None and proc.is_alive():
+                proc.terminate()
+        for proc in self.procs.values():
+            if proc is not None:
+                proc.join(15)
+                if proc.is_alive():
+                    proc.kill()
+                    proc.join()
+
+
+def main():
+    ctx = mp.get_context("spawn")
+    n = max(1, min(PIPELINE_INGEST_WORKERS, len(SYMBOLS)))
+    parts = [tuple(SYMBOLS[i::n]) for i in range(n)]
+
+    layout = SharedLayout.create(
+        f"riskbot-{os.getpid()}", SYMBOLS, WINDOW_SECONDS, ROLLING_MAX_HORIZON, n
+    )
+    workers = {"scoring": (scoring_worker, (layout.spec,), None)}
+    for i, part in enumerate(parts):
+        workers[f"ingest-{i}"] = (ingest_worker, (layout.spec, i, part), i)
+
+    supervisor = Supervisor(ctx, layout, workers)
+
+    def stop(signum, frame):
+        supervisor.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        supervisor.run()
+    finally:
+        supervisor.shutdown()
+        layout.close()
+        layout.shm.unlink()
+
+
+if __name__ == "__main__":
+    main()
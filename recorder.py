@@ -0,0 +1,114 @@
+# recorder.py
+"""
+Запись сырых входов (WS-кадры, ответы OI, маркеры проходов risk loop)
+для последующего проигрывания через replay.py.
+
+Включается переменной RECORD_DIR. Строка файла:
+    <ts>\t<kind>\t<payload>\n
+ts — clock.now(), payload — исходный кадр или JSON. Файлы gzip,
+новый файл каждые RECORD_ROTATE_SECONDS, старые сверх RECORD_MAX_FILES удаляются.
+"""
+import gzip
+import json
+import os
+
+import clock
+import metrics
+
+RECORD_DIR = os.getenv("RECORD_DIR", "")
+RECORD_ROTATE_SECONDS = int(os.getenv("RECORD_ROTATE_SECONDS", "3600"))
+RECORD_FLUSH_SECONDS = float(os.getenv("RECORD_FLUSH_SECONDS", "5"))
+RECORD_MAX_FILES = int(os.getenv("RECORD_MAX_FILES", "72"))
+RECORD_COMPRESS_LEVEL = int(os.getenv("RECORD_COMPRESS_LEVEL", "5"))
+
+ENABLED = bool(RECORD_DIR)
+
+_file = None
+_file_started = 0.0
+_last_flush = 0.0
+
+stats = {
+    "records": 0,
+    "bytes": 0,  # до сжатия (кадры ASCII — символы = байты)
+    "files": 0,
+}
+
+
+@metrics.collector
+def _recorder_metrics():
+    return [
+        ("record_rows_total", "counter", "Raw inputs written for replay", [({}, stats["records"])]),
+        ("record_bytes_total", "counter", "Recorded bytes before compression", [({}, stats["bytes"])]),
+        ("record_files_total", "counter", "Recording files opened", [({}, stats["files"])]),
+    ]
+
+
+def _rotate(now):
+    global _file, _file_started
+    if _file is not None:
+        _file.close()
+
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    path = os.path.join(RECORD_DIR, f"{int(now)}.rec.gz")
+    _file = gzip.open(path, "at", encoding="utf-8", compresslevel=RECORD_COMPRESS_LEVEL)
+    _file_started = now
+    stats["files"] += 1
+
+    files = list_files(RECORD_DIR)
+    for old in files[:-RECORD_MAX_FILES]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def record(kind, payload, ts=None):
+    """payload: str/bytes пишутся как есть (без переводов строк), остальное — JSON."""
+    global _last_flush
+    if not ENABLED:
+        return
+
+    if ts is None:
+        ts = clock.now()
+
+    if _file is None or ts - _file_started >= RECORD_ROTATE_SECONDS:
+        _rotate(ts)
+
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8")
+    elif not isinstance(payload, str):
+        payload = json.dumps(payload, separators=(",", ":"))
+
+    stats["bytes"] += _file.write(f"{ts:.3f}\t{kind}\t{payload}\n")
+    stats["records"] += 1
+
+    if ts - _last_flush >= RECORD_FLUSH_SECONDS:
+        _file.flush()
+        _last_flush = ts
+
+
+def close():
+    global _file
+    if _file is not None:
+        _file.close()
+        _file = None
+
+
+def list_files(path):
+    """Файлы записи в хронологическом порядке (имя — unix-время начала)."""
+    names = [n for n in os.listdir(path) if n.endswith(".rec.gz")]
+    names.sort(key=lambda n: int(n.split(".", 1)[0]))
+    return [os.path.join(path, n) for n in names]
+
+
+def read(path):
+    """(ts, kind, payload) из одного файла; обрезанный хвост (падение процесса) пропускается."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                ts, kind, payload = line.rstrip("\n").split("\t", 2)
+                yield float(ts), kind, payload
+        except (EOFError, gzip.BadGzipFile):
+            return
@@ -0,0 +1,210 @@
+# replay.py
+"""
+Проигрывание записи recorder.py (RECORD_DIR) через те же WS-обработчики,
+OI-поллер и risk loop, на симулированных часах.
+
+    python replay.py recordings/                 # как можно быстрее
+    python replay.py recordings/ --speed 100     # 100× реального времени
+    python replay.py 1718000000.rec.gz --quiet --alerts-out alerts.jsonl
+    python replay.py recordings/ --store tsdata-replay  # оценки в tsstore
+
+Проход risk loop и внеочередные оценки вызываются по маркерам sweep/trigger
+из записи — в тех же точках времени, что и вживую. Без маркеров
+(--schedule) проход идёт раз в INTERVAL_SECONDS симулированного времени.
+
+Запись pipeline.py — по подпапке на процесс (ingest-N, scoring): потоки
+подпапок сливаются по времени в один.
+"""
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import bootstrap
+import bot
+import clock
+import logger
+import recorder
+import triggers
+import tsstore
+import ws_binance as ws
+from config import INTERVAL_SECONDS, RISK_TRIGGERS_ENABLED, SYMBOLS
+
+
+def _expand(paths):
+    """Потоки записи: списки файлов, каждый в своём хронологическом порядке."""
+    files = []
+    streams = [files]
+    for p in paths:
+        if not os.path.isdir(p):
+            files.append(p)
+            continue
+        files.extend(recorder.list_files(p))
+        for name in sorted(os.listdir(p)):
+            sub = os.path.join(p, name)
+            if os.path.isdir(sub):
+                streams.append(recorder.list_files(sub))
+    return [s for s in streams if s]
+
+
+def _records(streams):
+    readers = [itertools.chain.from_iterable(map(recorder.read, s)) for s in streams]
+    if len(readers) == 1:
+        return readers[0]
+    return heapq.merge(*readers, key=lambda r: r[0])
+
+
+def _apply_oi(payload, ts):
+    item = json.loads(payload)
+    symbol = item["symbol"]
+    if symbol not in bot.oi_poller.oi_window:
+        return
+    before = bot.oi_poller.last_update_ts.get(symbol)
+    bot.oi_poller._apply(symbol, bot.oi_poller._parse(item["data"]), ts)
+    if RISK_TRIGGERS_ENABLED and bot.oi_poller.last_update_ts.get(symbol) != before:
+        triggers.mark_dirty(symbol, "oi")
+
+
+def _apply_oi_live(payload, ts):
+    item = json.loads(payload)
+    symbol = item["symbol"]
+    if symbol not in bot.oi_poller.oi_live:
+        return
+    if bot.oi_poller._apply_live(symbol, bot.oi_poller._parse_live(item["data"]), ts):
+        bot.mark_oi_live_dirty([symbol])
+
+
+def _apply_boot(kind, payload, ts):
+    item = json.loads(payload)
+    if kind == "boot_premium":
+        bootstrap.apply_premium(item)
+        return
+
+    symbol = item["symbol"]
+    if symbol not in SYMBOLS:
+        return
+    if kind == "boot_klines":
+        bootstrap.apply_klines(symbol, item["data"], bot.price_history)
+    elif kind == "boot_trades":
+        bootstrap.apply_trades(symbol, item["data"], ts)
+    elif kind == "oi_hist":
+        bot.oi_poller._apply_hist(symbol, item["data"])
+
+
+def replay(files, speed=0.0, schedule=False, store_dir=None):
+    """
+    files: список файлов или список потоков (см. _expand).
+    store_dir — писать оценки в tsstore там (по умолчанию не пишем).
+    """
+    streams = [files] if files and isinstance(files[0], str) else files
+    sim = clock.SimClock()
+    clock.set_clock(sim)
+    # во время проигрывания ничего не пишем наружу и не записываем заново
+    logger._LOG_TO_SUPABASE = False
+    recorder.ENABLED = False
+    tsstore.ENABLED = bool(store_dir)
+    if store_dir:
+        tsstore.TSSTORE_DIR = store_dir
+
+    table = ws.build_stream_table(SYMBOLS)
+    alerts = []
+    emit_alert = bot.emit_alert
+
+    def counting_emit(text, alert_meta, event_type="alert_sent"):
+        alerts.append({"ts": sim.t, "event": event_type, "text": text, **(alert_meta or {})})
+        emit_alert(text, alert_meta, event_type)
+
+    bot.emit_alert = counting_emit
+
+    kinds = Counter()
+    first_ts = None
+    next_sweep = None
+    wall_start = time.perf_counter()
+
+    try:
+        for ts, kind, payload in _records(streams):
+            if first_ts is None:
+                first_ts = ts
+                next_sweep = ts + INTERVAL_SECONDS
+
+            if speed > 0:
+                lag = (ts - first_ts) / speed - (time.perf_counter() - wall_start)
+                if lag > 0:
+                    time.sleep(lag)
+
+            if schedule:
+                while ts >= next_sweep:
+                    sim.advance(next_sweep)
+                    bot.risk_tick()
+                    next_sweep += INTERVAL_SECONDS
+
+            sim.advance(ts)
+            kinds[kind] += 1
+
+            if kind == "ws":
+                ws.dispatch(payload, table)
+            elif kind == "oi":
+                _apply_oi(payload, ts)
+            elif kind == "oi_live":
+                _apply_oi_live(payload, ts)
+            elif kind == "sweep":
+                if not schedule:
+                    bot.risk_tick()
+            elif kind == "trigger":
+                if not schedule:
+                    due = json.loads(payload)
+                    for symbol in due:
+                        triggers.dirty.pop(symbol, None)
+                    bot.evaluate_symbols(list(due), trigger_reasons=due)
+            elif kind.startswith("boot_") or kind == "oi_hist":
+                _apply_boot(kind, payload, ts)
+    finally:
+        bot.emit_alert = emit_alert
+        clock.set_clock()
+        tsstore.close()
+
+    wall = time.perf_counter() - wall_start
+    span = (sim.t - first_ts) if first_ts is not None else 0.0
+
+    return {
+        "files": sum(len(s) for s in streams),
+        "records": sum(kinds.values()),
+        "kinds": dict(kinds),
+        "sim_span_sec": round(span, 1),
+        "wall_sec": round(wall, 2),
+        "speedup": round(span / wall, 1) if wall > 0 else None,
+        "alerts": len(alerts),
+        "alerts_by_event": dict(Counter(a["event"] for a in alerts)),
+    }, alerts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded WS/OI input through the risk loop")
+    parser.add_argument("paths", nargs="+", help="record files or RECORD_DIR directories")
+    parser.add_argument("--speed", type=float, default=0.0, help="N× real time; 0 = as fast as possible")
+    parser.add_argument("--schedule", action="store_true", help="ignore sweep/trigger markers, sweep every INTERVAL_SECONDS")
+    parser.add_argument("--quiet", action="store_true", help="suppress per-alert output")
+    parser.add_argument("--alerts-out", help="write replayed alerts as JSON lines")
+    parser.add_argument("--store", help="write per-evaluation rows to a tsstore directory")
+    args = parser.parse_args(argv)
+
+    files = _expand(args.paths)
+    out = open(os.devnull, "w") if args.quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        summary, alerts = replay(files, args.speed, args.schedule, args.store)
+
+    if args.alerts_out:
+        with open(args.alerts_out, "w", encoding="utf-8") as f:
+            for a in alerts:
+                f.write(json.dumps(a, ensure_ascii=False, default=str) + "\n")
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,20 @@
-from config import FUNDING_EXTREME_THRESHOLD, FUNDING_SPIKE_THRESHOLD, OI_SPIKE_THRESHOLD
+from config import (
+    FUNDING_EXTREME_THRESHOLD,
+    FUNDING_SPIKE_THRESHOLD,
+    OI_LIVE_SPIKE_THRESHOLD,
+    OI_SPIKE_THRESHOLD,
+)
+
+
+def oi_live_change(oi_live):
+    """Относительное изменение живого OI за окно или None (мало точек)."""
+    if oi_live is None or len(oi_live) < 2:
+        return None
+    start = oi_live[0][1]
+    if start <= 0:
+        return None
+    return (oi_live[-1][1] - start) / start
+
 
 def calculate_risk(
     funding,
@@ -8,7 +24,8 @@ def calculate_risk(
     liquidations,
     liq_threshold,
     price=None,
-    liq_sides=None
+    liq_sides=None,
+    oi_live=None
 ):
     score = 0
     reasons = []
@@ -72,6 +89,15 @@ def calculate_risk(
                 if price is not None:
                     reasons.append("OI spike при движении цены")
 
+    # OI LIVE: тот же спайк по живому OI — виден за секунды, а не на границе 5m
+    live_change = oi_live_change(oi_live)
+    if not oi_spike and live_change is not None and abs(live_change) > OI_LIVE_SPIKE_THRESHOLD:
+        oi_spike = True
+        score += 3
+        reasons.append("OI растёт" if live_change > 0 else "OI падает")
+        if price is not None:
+            reasons.append("OI spike при движении цены")
+
     # LIQUIDATIONS
     if liquidations > liq_threshold:
         score += 3
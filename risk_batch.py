@@ -0,0 +1,357 @@
+# risk_batch.py
+"""
+Векторная версия risk.calculate_risk + кандидатов divergence.detect_divergence
+для всех символов сразу. Результат совпадает со скалярными функциями
+один-в-один; скалярный код остаётся эталоном.
+"""
+import math
+
+import numpy as np
+
+import config
+import divergence
+
+DIRECTIONS = (None, "LONG", "SHORT")
+DRIVERS = ("UNKNOWN", "CROWD", "LIQUIDATION", "FUNDING", "FUNDING SPIKE", "OI", "MIXED")
+TRENDS = {"FLAT": 0, "UP": 1, "DOWN": 2}
+
+# колонки BatchInputs в порядке кортежа add()
+_INPUT_COLUMNS = (
+    "funding", "prev_funding", "long_ratio", "oi_len", "oi_start", "oi_end",
+    "oi_live_len", "oi_live_start", "oi_live_end", "liquidations", "liq_threshold",
+    "liq_long", "liq_short", "price_trend", "has_price",
+)
+_INPUT_DTYPES = {"oi_len": np.int64, "price_trend": np.int8, "has_price": bool}
+
+
+class BatchInputs:
+    """
+    Входы по символам: add() кладёт одну строку-кортеж, колонки NumPy
+    собираются одним вызовом np.array в columns(). None -> NaN.
+    """
+
+    def __init__(self):
+        self.symbols = []
+        self.rows = []
+
+    def add(self, symbol, funding, prev_funding, long_ratio, oi_window, liquidations,
+            liq_threshold, price=None, liq_sides=None, price_trend="FLAT", oi_live=None):
+        self.symbols.append(symbol)
+        # пустой liq_sides в скалярной версии = «сторону не называем»
+        if liq_sides:
+            liq_long = liq_sides.get("long", 0)
+            liq_short = liq_sides.get("short", 0)
+        else:
+            liq_long = liq_short = math.nan
+        if oi_live:
+            live = (len(oi_live), oi_live[0][1], oi_live[-1][1])
+        else:
+            live = (0, 0.0, 0.0)
+        self.rows.append((
+            funding,
+            prev_funding,
+            long_ratio,
+            len(oi_window),
+            oi_window[0][1] if oi_window else 0.0,
+            oi_window[-1][1] if oi_window else 0.0,
+            *live,
+            liquidations,
+            liq_threshold,
+            liq_long,
+            liq_short,
+            TRENDS[price_trend],
+            price is not None,
+        ))
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+# биты кода причин: причины собираются из кода один раз на комбинацию
+_R_FUNDING_POS = 1
+_R_FUNDING_NEG = 2
+_R_LONG_EXTREME = 4
+_R_LONG_SKEW = 8
+_R_SHORT_EXTREME = 16
+_R_SHORT_SKEW = 32
+_R_OI_UP = 64
+_R_OI_DOWN = 128
+_R_OI_PRICE = 256
+_R_LIQ = 512
+_R_LIQ_LONG = 1024
+_R_LIQ_SHORT = 2048
+
+_REASON_TEXTS = (
+    (_R_FUNDING_POS, "Funding экстремально положительный"),
+    (_R_FUNDING_NEG, "Funding экстремально отрицательный"),
+    (_R_LONG_EXTREME, "Экстремальный перекос в лонги"),
+    (_R_LONG_SKEW, "Перекос в лонги"),
+    (_R_SHORT_EXTREME, "Экстремальный перекос в шорты"),
+    (_R_SHORT_SKEW, "Перекос в шорты"),
+    (_R_OI_UP, "OI растёт"),
+    (_R_OI_DOWN, "OI падает"),
+    (_R_OI_PRICE, "OI spike при движении цены"),
+    (_R_LIQ, "Крупные ликвидации"),
+    (_R_LIQ_LONG, "Преобладают ликвидации лонгов"),
+    (_R_LIQ_SHORT, "Преобладают ликвидации шортов"),
+)
+
+_reason_lists = {}  # код -> кортеж причин
+
+
+def reason_codes(r):
+    """Код причин по строкам результата compute() — тот же порядок, что в calculate_risk."""
+    oi = r["oi_spike"]
+    liq = r["liq_big"]
+    return (
+        _R_FUNDING_POS * r["funding_pos"]
+        + _R_FUNDING_NEG * r["funding_neg"]
+        + _R_LONG_EXTREME * r["long_extreme"]
+        + _R_LONG_SKEW * r["long_skew"]
+        + _R_SHORT_EXTREME * r["short_extreme"]
+        + _R_SHORT_SKEW * r["short_skew"]
+        + _R_OI_UP * (oi & r["oi_up"])
+        + _R_OI_DOWN * (oi & ~r["oi_up"])
+        + _R_OI_PRICE * (oi & r["has_price"])
+        + _R_LIQ * liq
+        + _R_LIQ_LONG * (liq & (r["liq_side"] == 1))
+        + _R_LIQ_SHORT * (liq & (r["liq_side"] == 2))
+    )
+
+
+def reasons_for(code):
+    reasons = _reason_lists.get(code)
+    if reasons is None:
+        reasons = _reason_lists[code] = tuple(text for bit, text in _REASON_TEXTS if code & bit)
+    return list(reasons)
+
+
+class BatchResult:
+    """
+    Результат хранится массивами NumPy (arrays); в списки Python переводятся
+    только поля, которые risk loop читает по каждому символу.
+    """
+
+    def __init__(self, symbols, div_masks, **cols):
+        self.symbols = symbols
+        self.index = {s: i for i, s in enumerate(symbols)}
+        self.arrays = cols
+        self.div_masks = div_masks
+        # построчный доступ к спискам Python в разы дешевле, чем к np-скалярам
+        self.score = cols["score"].tolist()
+        self.direction = cols["direction"].tolist()
+        self.driver = cols["driver"].tolist()
+        self.funding_spike = cols["funding_spike"].tolist()
+        self.oi_spike = cols["oi_spike"].tolist()
+        self.confidence = cols["confidence"].tolist()
+        self.reason_code = reason_codes(cols).tolist()
+        # кандидаты дивергенций — только по строкам, где они есть
+        self._candidates = {}
+        for div_type, mask in div_masks.items():
+            for i in np.flatnonzero(mask).tolist():
+                self._candidates.setdefault(i, []).append(div_type)
+
+    def reasons(self, i):
+        return reasons_for(self.reason_code[i])
+
+    def risk(self, i):
+        """Тот же кортеж, что risk.calculate_risk()."""
+        return (
+            self.score[i],
+            DIRECTIONS[self.direction[i]],
+            reasons_for(self.reason_code[i]),
+            self.funding_spike[i],
+            self.oi_spike[i],
+            DRIVERS[self.driver[i]],
+        )
+
+    def divergence_candidates(self, i):
+        """Типы сработавших правил дивергенций (до cooldown), в порядке проверки."""
+        return list(self._candidates.get(i, ()))
+
+
+def _divergence_masks(state, lr, oi_len, oi_start, oi_end, live_change, live_spike,
+                      price_trend, liq, param_col):
+    """Маски по divergence.COMPILED_RULES — те же правила, что в detect_divergence."""
+    n = len(lr)
+    # спайк живого OI перекрывает тренд часового окна
+    oi_trends = {
+        "UP": np.where(live_spike, live_change > 0, (oi_len >= 2) & (oi_end > oi_start)),
+        "DOWN": np.where(live_spike, live_change < 0, (oi_len >= 2) & (oi_end < oi_start)),
+    }
+    has_liq = liq > 0
+    param_cols = {}
+    masks = {}
+
+    for rule in divergence.COMPILED_RULES:
+        if state == "CALM" or state not in rule.states:
+            masks[rule.type] = np.zeros(n, dtype=bool)
+            continue
+
+        col = param_cols.get(rule.param)
+        if col is None:
+            col = param_cols[rule.param] = param_col(rule.param)
+
+        mask = rule.op(lr, col)
+        if rule.oi_trend is not None:
+            mask &= oi_trends[rule.oi_trend]
+        if rule.price_trends is not None:
+            mask &= np.isin(price_trend, [TRENDS[t] for t in rule.price_trends])
+        if rule.needs_liq:
+            mask &= has_liq
+        masks[rule.type] = mask
+
+    return masks
+
+
+def columns(inputs):
+    """BatchInputs -> колонки NumPy для compute(); одна конвертация на весь батч."""
+    n = len(inputs.rows)
+    m = np.array(inputs.rows, dtype=np.float64).reshape(n, len(_INPUT_COLUMNS)).T.copy()
+    cols = dict(zip(_INPUT_COLUMNS, m))
+    for name, dtype in _INPUT_DTYPES.items():
+        cols[name] = cols[name].astype(dtype)
+
+    # risk.oi_live_change: меньше двух точек или start <= 0 — None (NaN)
+    live_len = cols.pop("oi_live_len")
+    start = cols.pop("oi_live_start")
+    end = cols.pop("oi_live_end")
+    ok = (live_len >= 2) & (start > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cols["oi_live_change"] = np.where(ok, (end - start) / np.where(ok, start, 1.0), np.nan)
+    return cols
+
+
+def compute(cols, state, param_col):
+    """
+    Ядро evaluate() над готовыми колонками — его же гоняет sweep.py по истории.
+    param_col(name) -> колонка параметра дивергенций по строкам.
+    """
+    ext = config.FUNDING_EXTREME_THRESHOLD
+
+    f = cols["funding"]
+    pf = cols["prev_funding"]
+    lr = cols["long_ratio"]
+    oi_len = cols["oi_len"]
+    oi_start = cols["oi_start"]
+    oi_end = cols["oi_end"]
+    live_change = cols["oi_live_change"]
+    liq = cols["liquidations"]
+    liq_thr = cols["liq_threshold"]
+    liq_long = cols["liq_long"]
+    liq_short = cols["liq_short"]
+    price_trend = cols["price_trend"]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # FUNDING
+        funding_pos = f > ext
+        funding_neg = f < -ext
+        funding_extreme = np.abs(f) > ext
+        funding_spike = np.abs(f - pf) > config.FUNDING_SPIKE_THRESHOLD
+
+        # LONG / SHORT
+        long_extreme = lr > 0.85
+        long_skew = ~long_extreme & (lr > 0.7)
+        short_extreme = lr < 0.15
+        short_skew = ~short_extreme & (lr < 0.3)
+
+        # OI
+        oi_ok = (oi_len >= 2) & (oi_start > 0)
+        oi_change = np.where(oi_ok, (oi_end - oi_start) / np.where(oi_ok, oi_start, 1.0), 0.0)
+        hist_spike = oi_ok & (np.abs(oi_change) > config.OI_SPIKE_THRESHOLD)
+        live_spike = np.abs(live_change) > config.OI_LIVE_SPIKE_THRESHOLD  # NaN -> False
+        oi_spike = hist_spike | live_spike
+        oi_up = np.where(hist_spike, oi_change > 0, live_change > 0)
+
+        # LIQUIDATIONS
+        liq_big = liq > liq_thr
+        has_sides = ~np.isnan(liq_long)
+        liq_side = np.where(has_sides, np.where(liq_long > liq_short, 1, 2), 0)
+
+    score = (
+        3 * funding_pos + 3 * funding_neg
+        + 3 * long_extreme + 2 * long_skew
+        + 3 * short_extreme + 2 * short_skew
+        + 3 * oi_spike
+        + 3 * liq_big
+    ).astype(np.int64)
+
+    votes_long = funding_pos + 2 * long_extreme + long_skew
+    votes_short = funding_neg + 2 * short_extreme + short_skew
+    direction = np.where(
+        votes_long != votes_short,
+        np.where(votes_long > votes_short, 1, 2),
+        np.where(lr >= 0.7, 1, np.where(lr <= 0.3, 2, 0)),
+    ).astype(np.int8)
+
+    crowd = (lr >= 0.7) | (lr <= 0.3)
+    funding_drv = funding_extreme | funding_spike
+    n_drivers = crowd.astype(np.int8) + liq_big + funding_drv + oi_spike
+    single = np.select(
+        [crowd, liq_big, funding_extreme, funding_spike, oi_spike],
+        [1, 2, 3, 4, 5],
+        default=0,
+    )
+    driver = np.where(n_drivers > 1, 6, np.where(n_drivers == 1, single, 0)).astype(np.int8)
+
+    # meta.calculate_confidence
+    confidence = np.minimum(
+        (score >= 4).astype(np.int64) + (direction > 0) + oi_spike + funding_spike + (liq > 0), 5
+    )
+
+    # --- кандидаты дивергенций (cooldown применяется потом, по символу) ---
+    div_masks = _divergence_masks(state, lr, oi_len, oi_start, oi_end,
+                                  live_change, live_spike, price_trend, liq, param_col)
+
+    return {
+        "score": score,
+        "direction": direction,
+        "driver": driver,
+        "confidence": confidence,
+        "funding_pos": funding_pos,
+        "funding_neg": funding_neg,
+        "funding_spike": funding_spike,
+        "long_extreme": long_extreme,
+        "long_skew": long_skew,
+        "short_extreme": short_extreme,
+        "short_skew": short_skew,
+        "oi_spike": oi_spike,
+        "oi_up": oi_up,
+        "has_price": cols["has_price"],
+        "liq_big": liq_big,
+        "liq_side": liq_side,
+        "div_masks": div_masks,
+    }
+
+
+_PARAM_CACHE_MAX = 256
+_param_cache = {"table": None, "cols": {}}  # (параметр, символы) -> колонка
+
+
+def param_column(symbols, name):
+    """
+    Колонка параметра дивергенций по символам. Кэш живёт до следующего
+    compile_params() (новая PARAM_TABLE); внеочередные оценки дают разные
+    наборы символов, поэтому размер кэша ограничен.
+    """
+    if _param_cache["table"] is not divergence.PARAM_TABLE:
+        _param_cache["table"] = divergence.PARAM_TABLE
+        _param_cache["cols"] = {}
+    cols = _param_cache["cols"]
+    key = (name, tuple(symbols))
+    col = cols.get(key)
+    if col is None:
+        if len(cols) >= _PARAM_CACHE_MAX:
+            cols.clear()
+        col = cols[key] = np.array(
+            [divergence.get_divergence_params(s)[name] for s in symbols], dtype=np.float64,
+        )
+    return col
+
+
+def evaluate(inputs, state):
+    """Один проход NumPy по всем символам. `state` — текущий market regime."""
+    def param_col(name):
+        return param_column(inputs.symbols, name)
+
+    return BatchResult(inputs.symbols, **compute(columns(inputs), state, param_col))
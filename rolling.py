@@ -0,0 +1,130 @@
+# rolling.py
+import math
+from array import array
+
+
+class RollingWindow:
+    """
+    Кольцо посекундных корзин с двумя сторонами (long / short).
+
+    Память — O(size), независимо от числа сделок. Суммы за основное окно
+    (`window` секунд) ведутся инкрементально: add() и advance() — O(1)
+    амортизированно. Раз в `window` секунд суммы пересчитываются точно,
+    так что дрейф float не накапливается. Запросы за другие горизонты
+    (до `size` секунд) суммируют корзины напрямую.
+    """
+
+    __slots__ = (
+        "size", "window", "long", "short",
+        "_sec", "_long", "_short", "_now", "_expired_upto", "_next_resync", "_live",
+    )
+
+    def __init__(self, window, size=None, buffers=None):
+        """
+        buffers: (sec, long, short) — внешние буферы длины size с типами
+        "q"/"d"/"d" (напр. memoryview над shared memory, см. shm_state.py).
+        Их содержимое не сбрасывается: окно продолжает с того, что там есть.
+        """
+        self.window = window
+        self.size = max(size or window, window)
+
+        self.long = 0.0
+        self.short = 0.0
+
+        if buffers is None:
+            self._sec = array("q", [-1]) * self.size
+            self._long = array("d", [0.0]) * self.size
+            self._short = array("d", [0.0]) * self.size
+        else:
+            self._sec, self._long, self._short = buffers
+
+        self._now = None
+        self._expired_upto = None
+        self._next_resync = None
+        self._live = 0  # непустые корзины внутри основного окна
+
+    def add(self, ts, side, value):
+        """side: "long" | "short"."""
+        sec = int(ts)
+        self.advance(sec)
+
+        if sec <= self._now - self.size:
+            return
+
+        i = sec % self.size
+        if self._sec[i] != sec:
+            if self._sec[i] > sec:
+                return
+            self._sec[i] = sec
+            self._long[i] = 0.0
+            self._short[i] = 0.0
+            if sec > self._expired_upto:
+                self._live += 1
+
+        if side == "long":
+            self._long[i] += value
+            if sec > self._expired_upto:
+                self.long += value
+        else:
+            self._short[i] += value
+            if sec > self._expired_upto:
+                self.short += value
+
+    def advance(self, now):
+        """Сдвигает окно к `now` и вычитает вышедшие из него корзины."""
+        sec = int(now)
+        if self._now is None:
+            self._now = sec
+            self._expired_upto = sec - self.window
+            self._next_resync = sec + self.window
+            # внешние буферы могут прийти заполненными (рестарт процесса)
+            self.long, self.short = self._sum(self.window)
+            self._live = sum(1 for s in self._sec if s > self._expired_upto)
+            return
+        if sec <= self._now:
+            return
+
+        self._now = sec
+        target = sec - self.window
+
+        if target - self._expired_upto >= self.window:
+            # всё старое окно целиком вышло
+            self._live = 0
+        else:
+            for s in range(self._expired_upto + 1, target + 1):
+                i = s % self.size
+                if self._sec[i] == s:
+                    self.long -= self._long[i]
+                    self.short -= self._short[i]
+                    self._live -= 1
+        self._expired_upto = target
+
+        if self._live == 0:
+            # пустое окно — ровно ноль, без остатков округления
+            self.long = 0.0
+            self.short = 0.0
+
+        if sec >= self._next_resync:
+            self.long, self.short = self._sum(self.window)
+            self._next_resync = sec + self.window
+
+    def _sum(self, horizon):
+        lower = self._now - horizon
+        secs = self._sec
+        longs = []
+        shorts = []
+        for i in range(self.size):
+            if secs[i] > lower:
+                longs.append(self._long[i])
+                shorts.append(self._short[i])
+        return math.fsum(longs), math.fsum(shorts)
+
+    def totals(self, now=None, horizon=None):
+        """(long, short) за `horizon` секунд (по умолчанию — основное окно)."""
+        if now is not None:
+            self.advance(now)
+        if self._now is None:
+            return 0.0, 0.0
+        if horizon is None or horizon == self.window:
+            return self.long, self.short
+        return self._sum(min(horizon, self.size))
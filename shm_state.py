@@ -0,0 +1,279 @@
+# shm_state.py
+"""
+Состояние символов в multiprocessing.shared_memory для pipeline.py.
+
+Один сегмент на всю вселенную символов:
+    scalars [n, len(SCALARS)]        float64 — funding, mark price, счётчики...
+    sec     [n, 2, size]             int64   — метки секунд корзин (trades, liqs)
+    val     [n, 2, 2, size]          float64 — суммы корзин (окно, сторона)
+    workers [w, len(WORKER_FIELDS)]  float64 — пульс и здоровье ingestion-процессов
+
+Ingestion-процесс пишет корзины напрямую (RollingWindow поверх memoryview),
+скаляры публикует раз в PIPELINE_PUBLISH_INTERVAL. Scoring-процесс читает
+через numpy-представления того же буфера, без копирования.
+Блокировок нет: читатель может застать одну корзину в момент её сброса —
+для секундных корзин и оценки раз в минуты это допустимо.
+"""
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import numpy as np
+
+import clock
+from symbol_state import SymbolSnapshot
+from triggers import NEUTRAL_BAND
+
+SCALARS = (
+    "funding",
+    "mark_price",
+    "last_update",
+    "last_force_order_ts",
+    "mark_msgs",
+    "trade_msgs",
+    "liq_msgs",
+)
+_COL = {name: i for i, name in enumerate(SCALARS)}
+
+WORKER_FIELDS = ("pid", "heartbeat", "connected", "messages", "reconnects", "backoff")
+_WCOL = {name: i for i, name in enumerate(WORKER_FIELDS)}
+
+TRADES, LIQS = 0, 1
+LONG, SHORT = 0, 1
+
+
+class LayoutSpec(NamedTuple):
+    """Всё, что нужно дочернему процессу, чтобы подключиться к сегменту."""
+
+    name: str
+    symbols: tuple
+    window: int
+    size: int
+    workers: int
+
+
+class SharedLayout:
+    def __init__(self, spec, create=False):
+        self.spec = spec
+        self.index = {s: i for i, s in enumerate(spec.symbols)}
+        n, size, w = len(spec.symbols), spec.size, spec.workers
+
+        shapes = (
+            ("scalars", (n, len(SCALARS)), np.float64),
+            ("sec", (n, 2, size), np.int64),
+            ("val", (n, 2, 2, size), np.float64),
+            ("workers", (w, len(WORKER_FIELDS)), np.float64),
+        )
+        offsets = {}
+        total = 0
+        for name, shape, dtype in shapes:
+            offsets[name] = total
+            total += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        self._offsets = offsets
+
+        if create:
+            self.shm = shared_memory.SharedMemory(name=spec.name, create=True, size=total)
+        else:
+            # resource tracker у spawn-детей общий с супервизором: сегмент
+            # удаляется только с его выходом (или явным unlink), не с ребёнком
+            self.shm = shared_memory.SharedMemory(name=spec.name)
+
+        for name, shape, dtype in shapes:
+            setattr(self, name, np.ndarray(shape, dtype, buffer=self.shm.buf, offset=offsets[name]))
+
+        if create:
+            self.scalars.fill(np.nan)
+            self.sec.fill(-1)
+            self.val.fill(0.0)
+            self.workers.fill(0.0)
+
+    @classmethod
+    def create(cls, name, symbols, window, size, workers):
+        return cls(LayoutSpec(name, tuple(symbols), window, size, workers), create=True)
+
+    def window_buffers(self, symbol, kind):
+        """(sec, long, short) memoryview для RollingWindow писателя."""
+        i = self.index[symbol]
+        size = self.spec.size
+        buf = self.shm.buf
+
+        sec_start = self._offsets["sec"] + ((i * 2 + kind) * size) * 8
+        val_start = self._offsets["val"] + ((i * 2 + kind) * 2 * size) * 8
+        return (
+            buf[sec_start:sec_start + size * 8].cast("q"),
+            buf[val_start:val_start + size * 8].cast("d"),
+            buf[val_start + size * 8:val_start + 2 * size * 8].cast("d"),
+        )
+
+    # ---------- писатель (ingestion) ----------
+
+    def publish_scalars(self, st):
+        row = self.scalars[self.index[st.symbol]]
+        row[:] = (
+            np.nan if st.funding is None else st.funding,
+            np.nan if st.mark_price is None else st.mark_price,
+            np.nan if st.last_update is None else st.last_update,
+            np.nan if st.last_force_order_ts is None else st.last_force_order_ts,
+            st.mark_msgs,
+            st.trade_msgs,
+            st.liq_msgs,
+        )
+
+    def load_scalars(self, st):
+        """Продолжение после рестарта ingestion-процесса: скаляры из сегмента."""
+        row = self.scalars[self.index[st.symbol]].tolist()
+        st.funding = _opt(row[_COL["funding"]])
+        st.mark_price = _opt(row[_COL["mark_price"]])
+        st.last_update = _opt_int(row[_COL["last_update"]])
+        st.last_force_order_ts = _opt_int(row[_COL["last_force_order_ts"]])
+        st.mark_msgs = _count(row[_COL["mark_msgs"]])
+        st.trade_msgs = _count(row[_COL["trade_msgs"]])
+        st.liq_msgs = _count(row[_COL["liq_msgs"]])
+
+    def publish_worker(self, worker_id, **fields):
+        row = self.workers[worker_id]
+        for name, value in fields.items():
+            row[_WCOL[name]] = value
+
+    # ---------- читатель (scoring / супервизор) ----------
+
+    def worker(self, worker_id):
+        return dict(zip(WORKER_FIELDS, self.workers[worker_id].tolist()))
+
+    def close(self):
+        for name in ("scalars", "sec", "val", "workers"):
+            setattr(self, name, None)
+        self.shm.close()
+
+
+def _opt(x):
+    return None if x != x else x
+
+
+def _opt_int(x):
+    return None if x != x else int(x)
+
+
+def _count(x):
+    return 0 if x != x else int(x)
+
+
+class SharedWindowView:
+    """Окно только для чтения поверх корзин в сегменте; интерфейс как у RollingWindow."""
+
+    __slots__ = ("window", "size", "_sec", "_long", "_short")
+
+    def __init__(self, layout, i, kind):
+        self.window = layout.spec.window
+        self.size = layout.spec.size
+        self._sec = layout.sec[i, kind]
+        self._long = layout.val[i, kind, LONG]
+        self._short = layout.val[i, kind, SHORT]
+
+    def advance(self, now):
+        pass
+
+    def totals(self, now=None, horizon=None):
+        if now is None:
+            now = clock.now()
+        horizon = min(horizon or self.window, self.size)
+        mask = self._sec > int(now) - horizon
+        return float(self._long[mask].sum()), float(self._short[mask].sum())
+
+    @property
+    def long(self):
+        return self.totals()[0]
+
+    @property
+    def short(self):
+        return self.totals()[1]
+
+    @property
+    def _live(self):
+        return int(np.count_nonzero(self._sec > int(clock.now()) - self.window))
+
+
+class SharedSymbolView:
+    """
+    SymbolState для scoring-процесса: живые поля читаются из сегмента,
+    поля последней оценки (eval_*) — локальные, как в SymbolState.
+    """
+
+    __slots__ = (
+        "symbol", "trades", "liqs", "_row",
+        "eval_funding", "eval_band", "eval_liq_over", "last_eval_ts",
+    )
+
+    _EVAL_FIELDS = ("eval_funding", "eval_band", "eval_liq_over", "last_eval_ts")
+
+    def __init__(self, layout, symbol):
+        i = layout.index[symbol]
+        self.symbol = symbol
+        self.trades = SharedWindowView(layout, i, TRADES)
+        self.liqs = SharedWindowView(layout, i, LIQS)
+        self._row = layout.scalars[i]
+
+        self.eval_funding = None
+        self.eval_band = NEUTRAL_BAND
+        self.eval_liq_over = False
+        self.last_eval_ts = None
+
+    def _get(self, name):
+        return _opt(float(self._row[_COL[name]]))
+
+    @property
+    def funding(self):
+        return self._get("funding")
+
+    @property
+    def mark_price(self):
+        return self._get("mark_price")
+
+    @property
+    def last_update(self):
+        return _opt_int(float(self._row[_COL["last_update"]]))
+
+    @property
+    def last_force_order_ts(self):
+        return _opt_int(float(self._row[_COL["last_force_order_ts"]]))
+
+    @property
+    def mark_msgs(self):
+        return _count(float(self._row[_COL["mark_msgs"]]))
+
+    @property
+    def trade_msgs(self):
+        return _count(float(self._row[_COL["trade_msgs"]]))
+
+    @property
+    def liq_msgs(self):
+        return _count(float(self._row[_COL["liq_msgs"]]))
+
+    def checkpoint(self):
+        # живое состояние принадлежит ingestion-процессу и переживает рестарт в сегменте
+        return {name: getattr(self, name) for name in self._EVAL_FIELDS}
+
+    def restore(self, saved, now):
+        for name in self._EVAL_FIELDS:
+            if name in saved:
+                setattr(self, name, saved[name])
+
+    def snapshot(self, now=None):
+        if now is None:
+            now = clock.now()
+
+        row = self._row.tolist()
+        trade_long, trade_short = self.trades.totals(now)
+        liq_long, liq_short = self.liqs.totals(now)
+
+        return SymbolSnapshot(
+            symbol=self.symbol,
+            ts=now,
+            funding=_opt(row[_COL["funding"]]),
+            mark_price=_opt(row[_COL["mark_price"]]),
+            trade_long=trade_long,
+            trade_short=trade_short,
+            liq_long=liq_long,
+            liq_short=liq_short,
+            last_update=_opt_int(row[_COL["last_update"]]),
+            last_force_order_ts=_opt_int(row[_COL["last_force_order_ts"]]),
+        )
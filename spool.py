@@ -0,0 +1,209 @@
+# spool.py
+import json
+import os
+import time
+
+LOG_SPOOL_DIR = os.getenv("LOG_SPOOL_DIR", "spool")
+LOG_SPOOL_SEGMENT_BYTES = int(os.getenv("LOG_SPOOL_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+LOG_SPOOL_MAX_BYTES = int(os.getenv("LOG_SPOOL_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class LogSpool:
+    """
+    Append-only сегментированный спул на диске для недоставленных строк логов.
+
+    Каждый сегмент — файл JSON-строк `<seq>.log`. Запись идёт в последний
+    сегмент, fsync — один раз на батч. При превышении max_bytes самые
+    старые сегменты удаляются (строки считаются в dropped_rows).
+    Доставка at-least-once: после рестарта сегмент может уйти повторно.
+    """
+
+    def __init__(self, path=LOG_SPOOL_DIR, segment_bytes=LOG_SPOOL_SEGMENT_BYTES,
+                 max_bytes=LOG_SPOOL_MAX_BYTES):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+
+        os.makedirs(path, exist_ok=True)
+
+        # seq -> [size_bytes, rows]
+        self.segments = {}
+        for name in os.listdir(path):
+            if name.endswith(".log") and name[:-4].isdigit():
+                seq = int(name[:-4])
+                full = os.path.join(path, name)
+                with open(full, "rb") as f:
+                    rows = sum(1 for _ in f)
+                self.segments[seq] = [os.path.getsize(full), rows]
+
+        self._fh = None
+        self._fh_seq = None
+        self._replay_seq = None
+        self._replay_offset = 0  # строк сегмента уже подтверждено
+        self._replay_pos = 0     # байтовая позиция первой неподтверждённой строки
+        self._pending = []       # по строкам последнего батча: (позиция после неё, строк до неё включительно)
+
+        self.spooled_rows = 0
+        self.replayed_rows = 0
+        self.dropped_rows = 0
+        self.replay_started = None
+        self.replay_rows_per_sec = 0.0
+        self._session_rows = 0
+
+    # ---------- запись ----------
+
+    def _file(self, seq):
+        return os.path.join(self.path, f"{seq:012d}.log")
+
+    def _open_tail(self):
+        if self._fh is not None and self.segments[self._fh_seq][0] < self.segment_bytes:
+            return self._fh
+
+        if self._fh is not None:
+            self._fh.close()
+
+        seq = max(self.segments, default=0) + 1
+        self.segments[seq] = [0, 0]
+        self._fh = open(self._file(seq), "ab")
+        self._fh_seq = seq
+        return self._fh
+
+    def append(self, rows):
+        if not rows:
+            return
+
+        fh = self._open_tail()
+        data = b"".join(
+            json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+            for r in rows
+        )
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+        seg = self.segments[self._fh_seq]
+        seg[0] += len(data)
+        seg[1] += len(rows)
+        self.spooled_rows += len(rows)
+
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        while self.backlog_bytes > self.max_bytes and len(self.segments) > 1:
+            oldest = min(self.segments)
+            if oldest == self._fh_seq:
+                break
+            _, rows = self.segments.pop(oldest)
+            if oldest == self._replay_seq:
+                rows -= self._replay_offset
+                self._reset_replay(None)
+            self.dropped_rows += rows
+            os.remove(self._file(oldest))
+
+    # ---------- replay ----------
+
+    def read_batch(self, size):
+        """Следующие `size` строк из самого старого сегмента (без удаления)."""
+        while self.segments:
+            rows = self._read_oldest(size)
+            if rows:
+                return rows
+            # сегмент пуст или дочитан — удаляем и идём к следующему
+            self.commit(0)
+        return []
+
+    def _reset_replay(self, seq):
+        self._replay_seq = seq
+        self._replay_offset = 0
+        self._replay_pos = 0
+        self._pending = []
+
+    def _read_oldest(self, size):
+        """
+        Читает с сохранённой байтовой позиции (seek), а не с начала сегмента:
+        дренаж большого спула линейный по его размеру.
+        """
+        seq = min(self.segments)
+        if seq == self._fh_seq:
+            # сегмент, в который пишем, закрываем — дальше пишем в новый
+            self._fh.close()
+            self._fh = None
+            self._fh_seq = None
+
+        if seq != self._replay_seq:
+            self._reset_replay(seq)
+
+        rows = []
+        self._pending = []
+        skipped = 0
+        with open(self._file(seq), "rb") as f:
+            f.seek(self._replay_pos)
+            while len(rows) < size:
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # битая (недописанная) строка — пропускаем
+                    if not rows:
+                        self._replay_pos = f.tell()
+                        self._replay_offset += 1
+                    else:
+                        skipped += 1
+                    continue
+                self._pending.append((f.tell(), skipped + 1))
+                skipped = 0
+        return rows
+
+    def commit(self, count):
+        """Подтверждает доставку `count` строк, выданных read_batch()."""
+        if self._replay_seq is None:
+            return
+
+        if count:
+            now = time.time()
+            if self.replay_started is None:
+                self.replay_started = now
+                self._session_rows = 0
+
+            self._replay_pos = self._pending[count - 1][0]
+            self._replay_offset += sum(n for _, n in self._pending[:count])
+            self._pending = self._pending[count:]
+            self.replayed_rows += count
+            self._session_rows += count
+
+            elapsed = now - self.replay_started
+            if elapsed > 0:
+                self.replay_rows_per_sec = round(self._session_rows / elapsed, 1)
+
+        _, rows = self.segments[self._replay_seq]
+        if self._replay_offset >= rows:
+            self.segments.pop(self._replay_seq)
+            os.remove(self._file(self._replay_seq))
+            self._reset_replay(None)
+
+        if not self.segments:
+            self.replay_started = None
+
+    # ---------- счётчики ----------
+
+    @property
+    def backlog_bytes(self):
+        return sum(size for size, _ in self.segments.values())
+
+    @property
+    def backlog_rows(self):
+        rows = sum(r for _, r in self.segments.values())
+        return rows - self._replay_offset
+
+    def stats(self):
+        return {
+            "backlog_rows": self.backlog_rows,
+            "backlog_bytes": self.backlog_bytes,
+            "backlog_segments": len(self.segments),
+            "spooled_rows": self.spooled_rows,
+            "replayed_rows": self.replayed_rows,
+            "replay_rows_per_sec": self.replay_rows_per_sec,
+            "dropped_rows": self.dropped_rows,
+        }
@@ -0,0 +1,414 @@
+# sweep.py
+"""
+Перебор порогов риска и дивергенций по истории оценок из tsstore.
+
+    python sweep.py tsdata --spec spec.json --out sweep.jsonl
+    python sweep.py tsdata --spec spec.json --start 2026-10-01 --end 2026-10-08 --workers 8
+
+spec.json — сетка или случайный поиск:
+
+    {"grid": {"OI_SPIKE_THRESHOLD": [0.008, 0.01, 0.012],
+              "L1.long_trap_pressure": [0.65, 0.68, 0.72]}}
+    {"random": {"FUNDING_EXTREME_THRESHOLD": [0.0003, 0.0008],
+                "LIQ_THRESHOLDS.*": [0.5, 2.0]}, "n": 1000, "seed": 1}
+
+Ключи параметров:
+  FUNDING_EXTREME_THRESHOLD, ...   — константы config (params.CONFIG_KEYS)
+  LIQ_THRESHOLDS.BTCUSDT           — порог ликвидаций символа
+  LIQ_THRESHOLDS.*                 — множитель к порогам всех символов
+  L1.long_trap_pressure            — параметр класса (CLASS_DIVERGENCE_PARAMS)
+  ZECUSDT.price_trend_delta        — оверрайд символа (SYMBOL_PARAM_OVERRIDES)
+Формат — как у файла params.py: params лучшего кандидата кладутся в
+PARAMS_PATH как есть.
+
+Кандидат считается тем же risk_batch.compute, что и живой risk loop, по
+входам, записанным в tsstore; первым идёт baseline — значения из кода ({}),
+без переопределений из PARAMS_PATH.
+Market regime берётся как записан: он зависит от алертов прошлых тиков,
+и пересчёт по истории под каждый кандидат сюда не входит.
+
+HARD/BUILDUP на внеочередных оценках (trigger) считаются по правилу
+bot.trigger_alert_due, дивергенции — на всех строках, как в боте.
+
+По кандидату: число HARD / BUILDUP / DIVERGENCE алертов, hit rate — доля
+алертов, после которых цена за --horizon секунд прошла --hit-move в сторону
+сигнала, и дивергенции, подавленные cooldown. Кандидаты раздаются по пулу
+процессов; каждый процесс один раз загружает историю в память.
+"""
+import argparse
+import bisect
+import datetime
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import config
+import divergence
+import params as overrides
+import risk_batch
+import tsstore
+
+# куда должна пойти цена после сигнала: -1 вниз, 1 вверх
+DIVERGENCE_EXPECTED = {
+    "LONG_TRAP": -1,
+    "SHORT_SQUEEZE": 1,
+    "FAKE_MOVE": -1,
+    "CAPITULATION": 1,
+}
+
+_COLUMNS = (
+    "funding", "prev_funding", "long_ratio", "oi_len", "oi_start", "oi_end",
+    "oi_live_change", "liquidations", "liq_long", "liq_short", "has_price",
+)
+
+_data = None  # история процесса, см. load()
+
+
+# =========================
+# ИСТОРИЯ
+# =========================
+
+def _forward_returns(rows, horizon):
+    """Изменение цены от строки до первой цены не раньше ts + horizon."""
+    ts = rows["ts"]
+    price = rows["price"]
+    valid = ~np.isnan(price)
+    vts = ts[valid]
+    vprice = price[valid]
+
+    j = np.searchsorted(vts, ts + horizon, side="left")
+    ahead = j < len(vts)
+    out = np.full(len(rows), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[ahead] = vprice[j[ahead]] / price[ahead] - 1.0
+    return out
+
+
+def load(root, start, end, horizon):
+    """
+    Все символы за [start, end) одним набором колонок, по символу и времени.
+    Строки LOW-качества не оцениваются (в боте они не доходят до алертов),
+    но их цены участвуют в forward returns.
+    """
+    first = tsstore.day_of(start)
+    last = tsstore.day_of(max(end - 1e-6, start))
+    names = sorted({
+        s for day in tsstore.days(root) if first <= day <= last
+        for s in tsstore.symbols(day, root)
+    })
+
+    symbols, parts, fwd, codes = [], [], [], []
+    low = tsstore.QUALITY_CODES["LOW"]
+    for symbol in names:
+        rows = tsstore.query(symbol, start, end, root)
+        if not len(rows):
+            continue
+        keep = rows["quality"] != low
+        code = len(symbols)
+        symbols.append(symbol)
+        parts.append(np.asarray(rows[keep]))
+        fwd.append(_forward_returns(rows, horizon)[keep])
+        codes.append(np.full(int(keep.sum()), code, dtype=np.int32))
+
+    if not parts:
+        rows = np.empty(0, dtype=tsstore.DTYPE)
+        fwd = np.empty(0)
+        sym = np.empty(0, dtype=np.int32)
+    else:
+        rows = np.concatenate(parts)
+        fwd = np.concatenate(fwd)
+        sym = np.concatenate(codes)
+
+    cols = {
+        "funding": rows["funding"],
+        "prev_funding": rows["prev_funding"],
+        "long_ratio": rows["pressure"],
+        "oi_len": rows["oi_len"].astype(np.int64),
+        # как BatchInputs.add для пустого окна
+        "oi_start": np.nan_to_num(rows["oi_start"], nan=0.0),
+        "oi_end": np.nan_to_num(rows["oi"], nan=0.0),
+        "oi_live_change": rows["oi_live_change"],
+        "liquidations": rows["liq"],
+        "liq_long": rows["liq_long"],
+        "liq_short": rows["liq_short"],
+        "has_price": ~np.isnan(rows["price"]),
+    }
+
+    groups = []
+    for code in np.unique(rows["regime"]):
+        idx = np.flatnonzero(rows["regime"] == code)
+        groups.append((tsstore.REGIMES[code], idx, {k: cols[k][idx] for k in _COLUMNS}))
+
+    return {
+        "symbols": symbols,
+        "sym": sym,
+        "ts": rows["ts"],
+        "trigger": rows["trigger"] != 0,
+        "price_delta": rows["price_delta"],
+        "fwd": fwd,
+        "groups": groups,
+    }
+
+
+# =========================
+# КАНДИДАТЫ
+# =========================
+
+def candidates(spec):
+    """Кандидаты из spec: baseline ({}), затем сетка или случайные точки."""
+    yield {}
+    if "grid" in spec:
+        keys = list(spec["grid"])
+        for values in itertools.product(*(spec["grid"][k] for k in keys)):
+            yield dict(zip(keys, values))
+    if "random" in spec:
+        rng = random.Random(spec.get("seed"))
+        ranges = spec["random"]
+        for _ in range(int(spec.get("n", 100))):
+            params = {}
+            for key, (lo, hi) in ranges.items():
+                if isinstance(lo, int) and isinstance(hi, int):
+                    params[key] = rng.randint(lo, hi)
+                else:
+                    params[key] = rng.uniform(lo, hi)
+            yield params
+
+
+# =========================
+# ОЦЕНКА КАНДИДАТА
+# =========================
+
+def _per_symbol(fn):
+    return np.array([fn(s) for s in _data["symbols"]], dtype=np.float64)
+
+
+def _hits(fwd, expected, hit_move):
+    """(сигналов с известным исходом, из них попаданий)."""
+    known = ~np.isnan(fwd) & (expected != 0)
+    hit = known & (fwd * expected >= hit_move)
+    return int(known.sum()), int(hit.sum())
+
+
+def _cooldown(rows, sym, ts, ttl):
+    """
+    Какие кандидаты прошли бы cooldown. Строки упорядочены по символу и
+    времени, поэтому следующий прошедший — бинарный поиск от прошлого + ttl:
+    шагов столько, сколько алертов, а не кандидатов.
+    """
+    if not len(rows):
+        return rows
+    cand_sym = sym[rows]
+    cand_ts = ts[rows].tolist()
+    starts = np.flatnonzero(np.diff(cand_sym)) + 1
+    emitted = []
+    for lo, hi in zip([0, *starts.tolist()], [*starts.tolist(), len(cand_ts)]):
+        step = ttl[cand_sym[lo]]
+        j = lo
+        while j < hi:
+            emitted.append(j)
+            j = bisect.bisect_left(cand_ts, cand_ts[j] + step, j + 1, hi)
+    return rows[np.asarray(emitted, dtype=np.int64)]
+
+
+def _sent(level, trigger, sym, ts):
+    """
+    Строки, где бот отправил бы HARD/BUILDUP уровня level (0 — нет алерта):
+    плановый проход — всегда, внеочередная оценка — как bot.trigger_alert_due:
+    уровень вырос с прошлой оценки символа и не чаще раза в INTERVAL_SECONDS.
+    """
+    prev = np.zeros_like(level)
+    prev[1:] = level[:-1]
+    prev[np.flatnonzero(np.diff(sym)) + 1] = 0
+    rising = np.flatnonzero(trigger & (level > prev))
+    interval = [config.INTERVAL_SECONDS] * len(_data["symbols"])
+    sent = ~trigger
+    sent[_cooldown(rising, sym, ts, interval)] = True
+    return sent
+
+
+def evaluate(params, hit_move):
+    overrides.apply(params)
+    d = _data
+    n = len(d["ts"])
+    sym = d["sym"]
+
+    trend_delta = _per_symbol(divergence.get_price_trend_delta)[sym]
+    pd = d["price_delta"]
+    with np.errstate(invalid="ignore"):
+        price_trend = np.where(pd > trend_delta, 1, np.where(pd < -trend_delta, 2, 0)).astype(np.int8)
+    liq_threshold = _per_symbol(lambda s: config.LIQ_THRESHOLDS.get(s, math.inf))[sym]
+
+    score = np.zeros(n, dtype=np.int64)
+    direction = np.zeros(n, dtype=np.int8)
+    confidence = np.zeros(n, dtype=np.int64)
+    div = {t: np.zeros(n, dtype=bool) for t in DIVERGENCE_EXPECTED}
+
+    for state, idx, cols in d["groups"]:
+        group_sym = sym[idx]
+        tables = {}
+
+        def param_col(name):
+            if name not in tables:
+                tables[name] = _per_symbol(lambda s: divergence.get_divergence_params(s)[name])
+            return tables[name][group_sym]
+
+        cols = dict(cols, price_trend=price_trend[idx], liq_threshold=liq_threshold[idx])
+        r = risk_batch.compute(cols, state, param_col)
+        score[idx] = r["score"]
+        direction[idx] = r["direction"]
+        # надбавки за спайки, как в bot.process_symbol
+        confidence[idx] = np.minimum(r["confidence"] + r["funding_spike"] + r["oi_spike"], 5)
+        for t, mask in r["div_masks"].items():
+            div.setdefault(t, np.zeros(n, dtype=bool))[idx] = mask
+
+    hard = (score >= config.HARD_ALERT_LEVEL) & (direction > 0) & (confidence >= 3)
+    buildup = ~hard & (score >= config.EARLY_ALERT_LEVEL)
+    level = np.where(hard, 2, np.where(buildup, 1, 0))
+    sent = _sent(level, d["trigger"], sym, d["ts"])
+    hard &= sent
+    buildup &= sent
+
+    # LONG — толпа в лонгах, риск вниз; SHORT — вверх
+    expected = np.where(direction == 1, -1, np.where(direction == 2, 1, 0))
+    fwd = d["fwd"]
+
+    result = {"params": params, "rows": n, "alerts": {}, "hit_rate": {}, "divergence": {}}
+    hits = {}
+    for name, mask in (("HARD", hard), ("BUILDUP", buildup)):
+        result["alerts"][name] = int(mask.sum())
+        hits[name] = _hits(fwd[mask], expected[mask], hit_move)
+
+    emitted_total = suppressed_total = 0
+    div_known = div_hit = 0
+    for t, mask in div.items():
+        rows = np.flatnonzero(mask)
+        ttl = _per_symbol(lambda s: divergence.cooldown_ttl(s, t))
+        emitted = _cooldown(rows, sym, d["ts"], ttl.tolist())
+        known, hit = _hits(fwd[emitted], np.full(len(emitted), DIVERGENCE_EXPECTED.get(t, 0)), hit_move)
+        result["divergence"][t] = {
+            "candidates": len(rows),
+            "emitted": len(emitted),
+            "suppressed": len(rows) - len(emitted),
+            "hit_rate": round(hit / known, 4) if known else None,
+        }
+        emitted_total += len(emitted)
+        suppressed_total += len(rows) - len(emitted)
+        div_known += known
+        div_hit += hit
+    result["alerts"]["DIVERGENCE"] = emitted_total
+    result["cooldown_suppressed"] = suppressed_total
+    hits["DIVERGENCE"] = (div_known, div_hit)
+
+    for name, (known, hit) in hits.items():
+        result["hit_rate"][name] = round(hit / known, 4) if known else None
+    known = sum(k for k, _ in hits.values())
+    hit = sum(h for _, h in hits.values())
+    result["hit_rate"]["ALL"] = round(hit / known, 4) if known else None
+    return result
+
+
+def _init(root, start, end, horizon):
+    global _data
+    _data = load(root, start, end, horizon)
+
+
+def _run(args):
+    params, hit_move = args
+    try:
+        return evaluate(params, hit_move)
+    except ValueError as e:
+        # несовместимая точка random-поиска (например, EARLY > HARD)
+        return {"params": params, "rows": len(_data["ts"]), "error": str(e)}
+
+
+# =========================
+# CLI
+# =========================
+
+def _parse_time(value):
+    """YYYY-MM-DD (UTC) или unix-секунды."""
+    try:
+        return float(value)
+    except ValueError:
+        day = datetime.datetime.strptime(value, "%Y-%m-%d")
+        return day.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _summary_line(r):
+    a = r["alerts"]
+    h = r["hit_rate"]
+
+    def pct(v):
+        return "   -" if v is None else f"{v * 100:3.0f}%"
+
+    return (
+        f"HARD {a['HARD']:6d} {pct(h['HARD'])}  BUILDUP {a['BUILDUP']:6d} {pct(h['BUILDUP'])}  "
+        f"DIV {a['DIVERGENCE']:6d} {pct(h['DIVERGENCE'])}  suppressed {r['cooldown_suppressed']:6d}  "
+        f"{json.dumps(r['params'])}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep risk/divergence thresholds over tsstore history")
+    parser.add_argument("store", help="tsstore directory (TSSTORE_DIR)")
+    parser.add_argument("--spec", required=True, help="JSON file with a grid or random search spec")
+    parser.add_argument("--start", type=_parse_time, default=0.0, help="YYYY-MM-DD or unix seconds")
+    parser.add_argument("--end", type=_parse_time, default=None, help="YYYY-MM-DD or unix seconds (exclusive)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--horizon", type=float, default=3600, help="seconds after an alert to score it")
+    parser.add_argument("--hit-move", type=float, default=0.005, help="price move in the signal direction that counts as a hit")
+    parser.add_argument("--out", help="write one JSON line per candidate")
+    parser.add_argument("--top", type=int, default=10, help="print N best candidates by overall hit rate")
+    args = parser.parse_args(argv)
+
+    end = args.end if args.end is not None else time.time() + 86400
+
+    with open(args.spec, encoding="utf-8") as f:
+        spec = json.load(f)
+    for key in itertools.chain(spec.get("grid", {}), spec.get("random", {})):
+        overrides.check_key(key)
+    todo = list(candidates(spec))
+
+    t0 = time.perf_counter()
+    results = []
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max(1, args.workers),
+            initializer=_init,
+            initargs=(args.store, args.start, end, args.horizon),
+        ) as pool:
+            chunksize = max(1, len(todo) // (max(1, args.workers) * 8))
+            jobs = ((params, args.hit_move) for params in todo)
+            for r in pool.map(_run, jobs, chunksize=chunksize):
+                results.append(r)
+                if out:
+                    out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    finally:
+        if out:
+            out.close()
+
+    elapsed = time.perf_counter() - t0
+    if not results or not results[0]["rows"]:
+        print(f"no tsstore rows in {args.store}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{len(results)} candidates x {results[0]['rows']} rows in {elapsed:.1f}s", file=sys.stderr)
+    print(f"baseline  {_summary_line(results[0])}")
+    valid = [r for r in results[1:] if "error" not in r]
+    if len(valid) < len(results) - 1:
+        print(f"{len(results) - 1 - len(valid)} candidates rejected by params validation", file=sys.stderr)
+    ranked = sorted(valid, key=lambda r: r["hit_rate"]["ALL"] or 0.0, reverse=True)
+    for i, r in enumerate(ranked[:args.top], 1):
+        print(f"{i:8d}  {_summary_line(r)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# symbol_state.py
+from typing import NamedTuple, Optional
+
+import clock
+from config import ROLLING_MAX_HORIZON, WINDOW_SECONDS
+from rolling import RollingWindow
+from triggers import NEUTRAL_BAND
+
+
+class SymbolSnapshot(NamedTuple):
+    """Согласованный срез состояния символа на момент `ts`."""
+
+    symbol: str
+    ts: float
+    funding: Optional[float]
+    mark_price: Optional[float]
+    trade_long: float
+    trade_short: float
+    liq_long: float
+    liq_short: float
+    last_update: Optional[int]
+    last_force_order_ts: Optional[int]
+
+    @property
+    def liquidations(self):
+        return self.liq_long + self.liq_short
+
+    @property
+    def pressure_ratio(self):
+        total = self.trade_long + self.trade_short
+        return self.trade_long / total if total else 0.5
+
+    @property
+    def liq_sides(self):
+        return {"long": self.liq_long, "short": self.liq_short}
+
+
+# что переживает рестарт (checkpoint.py); счётчики кадров — нет
+_CHECKPOINT_FIELDS = (
+    "funding",
+    "mark_price",
+    "last_update",
+    "last_force_order_ts",
+    "trades",
+    "liqs",
+    "eval_funding",
+    "eval_band",
+    "eval_liq_over",
+    "last_eval_ts",
+)
+
+
+class SymbolState:
+    """
+    Всё живое состояние символа в одном объекте: WS-обработчики пишут
+    в атрибуты напрямую, читатели (risk loop, quality, HTTP) берут snapshot().
+    """
+
+    __slots__ = (
+        "symbol",
+        "funding",
+        "mark_price",
+        "last_update",
+        "last_force_order_ts",
+        "trades",
+        "liqs",
+        # счётчики кадров по стримам (для /metrics)
+        "mark_msgs",
+        "trade_msgs",
+        "liq_msgs",
+        # входы последней оценки risk loop — база для триггеров (triggers.py)
+        "eval_funding",
+        "eval_band",
+        "eval_liq_over",
+        "last_eval_ts",
+    )
+
+    def __init__(self, symbol, window=WINDOW_SECONDS, horizon=ROLLING_MAX_HORIZON, buffers=None):
+        """buffers: (trades, liqs) — внешние буферы окон, см. RollingWindow."""
+        self.symbol = symbol
+        self.funding = None
+        self.mark_price = None
+        self.last_update = None
+        self.last_force_order_ts = None
+        # посекундные корзины: память ограничена длиной окна, а не числом сделок
+        trade_buffers, liq_buffers = buffers or (None, None)
+        self.trades = RollingWindow(window, horizon, trade_buffers)
+        self.liqs = RollingWindow(window, horizon, liq_buffers)
+        self.mark_msgs = 0
+        self.trade_msgs = 0
+        self.liq_msgs = 0
+
+        self.eval_funding = None
+        self.eval_band = NEUTRAL_BAND
+        self.eval_liq_over = False
+        self.last_eval_ts = None
+
+    def checkpoint(self):
+        return {name: getattr(self, name) for name in _CHECKPOINT_FIELDS}
+
+    def restore(self, saved, now):
+        """Состояние из чекпоинта; окна сразу сдвигаются к `now`."""
+        for name in _CHECKPOINT_FIELDS:
+            if name in saved:
+                setattr(self, name, saved[name])
+        self.trades.advance(now)
+        self.liqs.advance(now)
+
+    def snapshot(self, now=None):
+        if now is None:
+            now = clock.now()
+
+        trade_long, trade_short = self.trades.totals(now)
+        liq_long, liq_short = self.liqs.totals(now)
+
+        return SymbolSnapshot(
+            symbol=self.symbol,
+            ts=now,
+            funding=self.funding,
+            mark_price=self.mark_price,
+            trade_long=trade_long,
+            trade_short=trade_short,
+            liq_long=liq_long,
+            liq_short=liq_short,
+            last_update=self.last_update,
+            last_force_order_ts=self.last_force_order_ts,
+        )
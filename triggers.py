@@ -0,0 +1,82 @@
+# triggers.py
+import asyncio
+from bisect import bisect_right
+
+from config import FUNDING_SPIKE_THRESHOLD, LIQ_THRESHOLDS
+
+# Границы давления, на которых меняется risk score (см. risk.calculate_risk)
+PRESSURE_BANDS = (0.15, 0.3, 0.7, 0.85)
+
+dirty = {}  # symbol -> причина, по которой символ надо переоценить
+_event = None
+
+
+def pressure_band(ratio):
+    return bisect_right(PRESSURE_BANDS, ratio)
+
+
+NEUTRAL_BAND = pressure_band(0.5)
+
+
+def mark_dirty(symbol, reason):
+    if symbol in dirty:
+        return
+    dirty[symbol] = reason
+    if _event is not None:
+        _event.set()
+
+
+# =========================
+# ПРОВЕРКИ ИЗ WS-ОБРАБОТЧИКОВ (O(1))
+# =========================
+
+def on_mark_price(st):
+    if st.eval_funding is not None and abs(st.funding - st.eval_funding) > FUNDING_SPIKE_THRESHOLD:
+        mark_dirty(st.symbol, "funding")
+
+
+def on_trade(st):
+    w = st.trades
+    total = w.long + w.short
+    ratio = w.long / total if total else 0.5
+    if pressure_band(ratio) != st.eval_band:
+        mark_dirty(st.symbol, "pressure")
+
+
+def on_liquidation(st):
+    w = st.liqs
+    threshold = LIQ_THRESHOLDS.get(st.symbol)
+    if threshold is not None and (w.long + w.short > threshold) != st.eval_liq_over:
+        mark_dirty(st.symbol, "liquidations")
+
+
+# =========================
+# SCHEDULER
+# =========================
+
+def mark_evaluated(st, snap, liq_threshold):
+    """Запоминает входы последней оценки — от них считаются следующие триггеры."""
+    st.eval_funding = snap.funding
+    st.eval_band = pressure_band(snap.pressure_ratio)
+    st.eval_liq_over = snap.liquidations > liq_threshold
+    st.last_eval_ts = snap.ts
+    dirty.pop(st.symbol, None)
+
+
+async def wait_dirty():
+    global _event
+    if _event is None:
+        _event = asyncio.Event()
+    if not dirty:
+        await _event.wait()
+    _event.clear()
+
+
+def take_due(states, min_interval, now):
+    """Грязные символы, которые не оценивались последние `min_interval` секунд."""
+    due = {}
+    for symbol in list(dirty):
+        last = states[symbol].last_eval_ts
+        if last is None or now - last >= min_interval:
+            due[symbol] = dirty.pop(symbol)
+    return due
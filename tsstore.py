@@ -0,0 +1,195 @@
+# tsstore.py
+"""
+Локальное колоночное хранилище входов и результатов каждой оценки риска.
+
+    <TSSTORE_DIR>/<YYYY-MM-DD>/<SYMBOL>.v2.bin
+
+Файл — подряд записи фиксированной ширины (DTYPE) одного символа за сутки
+UTC, только дописывается. Чтение — np.memmap без разбора: query() отдаёт
+структурированный массив, колонки — rows["score"], rows["oi"] и т.д.
+Запись, оборванная падением процесса, отбрасывается при чтении.
+
+    import tsstore
+    rows = tsstore.query("BTCUSDT", start, end)
+    rows["ts"], rows["pressure"], rows["score"]
+"""
+import datetime
+import os
+
+import numpy as np
+
+import metrics
+
+TSSTORE_DIR = os.getenv("TSSTORE_DIR", "tsdata")
+
+ENABLED = bool(TSSTORE_DIR)
+
+VERSION = 2  # 2: + входы risk_batch целиком (prev_funding, oi_start, ...), quality
+
+DTYPE = np.dtype([
+    ("ts", "<f8"),              # clock.now() оценки
+    ("funding", "<f8"),         # NaN — нет данных
+    ("prev_funding", "<f8"),
+    ("pressure", "<f8"),        # доля лонгов в сделках окна
+    ("oi_start", "<f8"),        # окно openInterestHist, как его видел risk
+    ("oi", "<f8"),
+    ("oi_len", "<i2"),
+    ("oi_live", "<f8"),         # последняя точка живого OI
+    ("oi_live_change", "<f8"),  # risk.oi_live_change
+    ("liq", "<f8"),
+    ("liq_long", "<f8"),
+    ("liq_short", "<f8"),
+    ("price", "<f8"),
+    ("price_delta", "<f8"),     # изменение цены по price_history (тренд — от порога символа)
+    ("score", "<i2"),
+    ("direction", "i1"),        # индекс в risk_batch.DIRECTIONS
+    ("driver", "i1"),           # индекс в risk_batch.DRIVERS
+    ("regime", "i1"),           # индекс в REGIMES
+    ("trigger", "i1"),          # 0 — плановый проход, 1 — внеочередная оценка
+    ("quality", "i1"),          # индекс в QUALITY (meta.stream_quality)
+])
+
+REGIMES = ("UNKNOWN", "CALM", "NEUTRAL", "LATENT_STRESS", "CROWD_IMBALANCE", "STRESS")
+REGIME_CODES = {name: i for i, name in enumerate(REGIMES)}
+QUALITY = ("LOW", "MEDIUM", "GOOD")
+QUALITY_CODES = {name: i for i, name in enumerate(QUALITY)}
+
+_FLOAT_FIELDS = tuple(name for name in DTYPE.names if DTYPE[name].kind == "f")
+
+_files = {}  # symbol -> (day, file)
+
+stats = {"rows": 0, "files": 0, "errors": 0}
+
+
+@metrics.collector
+def _tsstore_metrics():
+    return [
+        ("tsstore_rows_total", "counter", "Evaluation rows appended", [({}, stats["rows"])]),
+        ("tsstore_files_total", "counter", "Per-symbol day files opened", [({}, stats["files"])]),
+        ("tsstore_errors_total", "counter", "Rows lost to write errors", [({}, stats["errors"])]),
+        ("tsstore_open_files", "gauge", "Day files held open", [({}, len(_files))]),
+    ]
+
+
+def day_of(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+def path_for(day, symbol, root=None):
+    return os.path.join(root or TSSTORE_DIR, day, f"{symbol}.v{VERSION}.bin")
+
+
+def _file(symbol, day):
+    current = _files.get(symbol)
+    if current is not None and current[0] == day:
+        return current[1]
+    if current is not None:
+        current[1].close()
+
+    os.makedirs(os.path.join(TSSTORE_DIR, day), exist_ok=True)
+    path = path_for(day, symbol)
+    # хвост от оборванной записи срезаем, иначе все следующие сдвинутся
+    if os.path.exists(path):
+        size = os.path.getsize(path)
+        if size % DTYPE.itemsize:
+            os.truncate(path, size - size % DTYPE.itemsize)
+
+    f = open(path, "ab", buffering=0)
+    _files[symbol] = (day, f)
+    stats["files"] += 1
+    return f
+
+
+def append(symbol, **fields):
+    """
+    Одна запись: поля DTYPE по имени, None -> NaN. regime и quality — строки,
+    direction/driver — коды risk_batch. Не переданные поля — NaN / 0.
+    """
+    if not ENABLED:
+        return
+    row = np.zeros(1, dtype=DTYPE)
+    for name in _FLOAT_FIELDS:
+        row[name] = np.nan
+    for name, value in fields.items():
+        if name == "regime":
+            value = REGIME_CODES.get(value, 0)
+        elif name == "quality":
+            value = QUALITY_CODES.get(value, 0)
+        row[name] = _f(value)
+    try:
+        _file(symbol, day_of(row["ts"][0])).write(row.tobytes())
+        stats["rows"] += 1
+    except OSError as e:
+        stats["errors"] += 1
+        print(f"TSSTORE ERROR {symbol}: {type(e).__name__} {e}", flush=True)
+
+
+def _f(value):
+    return np.nan if value is None else value
+
+
+def close():
+    for _, f in _files.values():
+        f.close()
+    _files.clear()
+
+
+# =========================
+# ЧТЕНИЕ
+# =========================
+
+def days(root=None):
+    root = root or TSSTORE_DIR
+    try:
+        return sorted(d for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+    except FileNotFoundError:
+        return []
+
+
+def symbols(day, root=None):
+    suffix = f".v{VERSION}.bin"
+    try:
+        names = os.listdir(os.path.join(root or TSSTORE_DIR, day))
+    except FileNotFoundError:
+        return []
+    return sorted(n[:-len(suffix)] for n in names if n.endswith(suffix))
+
+
+def load_day(symbol, day, root=None):
+    """Все записи символа за сутки: memmap (только чтение) или пустой массив."""
+    path = path_for(day, symbol, root)
+    try:
+        n = os.path.getsize(path) // DTYPE.itemsize
+    except FileNotFoundError:
+        n = 0
+    if n == 0:
+        return np.empty(0, dtype=DTYPE)
+    return np.memmap(path, dtype=DTYPE, mode="r", shape=(n,))
+
+
+def query(symbol, start, end, root=None):
+    """
+    Записи символа с start <= ts < end (unix-секунды), по времени.
+    Внутри суток записи идут по возрастанию ts — границы ищутся бинарным
+    поиском; для одних суток возвращается срез memmap без копирования.
+    """
+    first = day_of(start)
+    last = day_of(max(end - 1e-6, start))
+
+    parts = []
+    for day in days(root):
+        if not first <= day <= last:
+            continue
+        rows = load_day(symbol, day, root)
+        if len(rows):
+            ts = rows["ts"]
+            lo = np.searchsorted(ts, start, side="left")
+            hi = np.searchsorted(ts, end, side="left")
+            if hi > lo:
+                parts.append(rows[lo:hi])
+
+    if not parts:
+        return np.empty(0, dtype=DTYPE)
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts)
@@ -3,125 +3,249 @@ import json
 import random
 import time
 import websockets
-from collections import deque
-from config import SYMBOLS, WINDOW_SECONDS
+import clock
+import metrics
+import recorder
+import triggers
+from config import (
+    RISK_TRIGGERS_ENABLED,
+    SYMBOLS,
+    WS_MAX_STREAMS_PER_CONN,
+    WS_SHARDS,
+    WS_STALL_SECONDS,
+)
 from logger import log_event
+from symbol_state import SymbolState
 
-funding = {}
-mark_price = {}
-long_short_ratio = {}
-liquidations = {}
-liq_sides = {}
-last_update = {}
-last_force_order_ts = {}
-
-trades_window = {s: deque() for s in SYMBOLS}
-liq_window = {s: deque() for s in SYMBOLS}
-trade_totals = {s: {"long": 0.0, "short": 0.0} for s in SYMBOLS}
-liq_totals = {s: {"long": 0.0, "short": 0.0} for s in SYMBOLS}
-
-def touch(symbol):
-    last_update[symbol] = int(time.time())
-
-
-def cleanup_trades(symbol):
-    now = time.time()
-    dq = trades_window[symbol]
-    removed = 0
-    while dq and now - dq[0][0] > WINDOW_SECONDS:
-        _, qty, side = dq.popleft()
-        trade_totals[symbol][side] = max(0.0, trade_totals[symbol][side] - qty)
-        removed += 1
-    return removed
-
-
-def cleanup_liq(symbol):
-    now = time.time()
-    dq = liq_window[symbol]
-    while dq and now - dq[0][0] > WINDOW_SECONDS:
-        _, qty, side = dq.popleft()
-        liq_totals[symbol][side] = max(0.0, liq_totals[symbol][side] - qty)
-
-async def binance_ws():
-    streams = []
-
-    for s in SYMBOLS:
-        s = s.lower()
-
-        streams += [
-            f"{s}@markPrice@1s",
-            f"{s}@aggTrade",
-            f"{s}@forceOrder"
-        ]
-
-    url = f"wss://fstream.binance.com/stream?streams={'/'.join(streams)}"
-    backoff = 1
-    max_backoff = 60
+# orjson в разы быстрее stdlib на мелких кадрах; без него — обычный json
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Всё состояние по символам — один объект со __slots__ на символ,
+# создаётся заранее для всей вселенной
+states = {s: SymbolState(s) for s in SYMBOLS}
+
+
+def add_trade(symbol, ts, qty, side):
+    states[symbol].trades.add(ts, side, qty)
+
+
+def snapshot(symbol, now=None):
+    return states[symbol].snapshot(now)
+
+
+def snapshot_all(now=None):
+    if now is None:
+        now = clock.now()
+    return {s: st.snapshot(now) for s, st in states.items()}
+
+
+def freshest_update():
+    """Время последнего сообщения по любому символу (None — ещё не было)."""
+    return max(
+        (st.last_update for st in states.values() if st.last_update is not None),
+        default=None,
+    )
+
+
+def window_totals(symbol, horizon):
+    """Сделки и ликвидации (long, short) за произвольный горизонт, напр. 60/300/900 с."""
+    now = clock.now()
+    st = states[symbol]
+    return st.trades.totals(now, horizon), st.liqs.totals(now, horizon)
+
+
+# =========================
+# HANDLERS
+# =========================
+
+def handle_mark_price(st, data, now):
+    st.funding = float(data["r"])
+    st.mark_price = float(data["p"])
+    st.last_update = int(now)
+    st.mark_msgs += 1
+    if RISK_TRIGGERS_ENABLED:
+        triggers.on_mark_price(st)
+
+
+def handle_agg_trade(st, data, now):
+    st.trades.add(now, "short" if data["m"] else "long", float(data["q"]))
+    st.last_update = int(now)
+    st.trade_msgs += 1
+    if RISK_TRIGGERS_ENABLED:
+        triggers.on_trade(st)
 
-    while True:
-        try:
-            async with websockets.connect(url, ping_interval=20) as ws:
-                backoff = 1
-                async for raw in ws:
-                    msg = json.loads(raw)
-                    data = msg.get("data", {})
-                    stream = msg.get("stream", "")
 
-                    symbol = data.get("s", "").upper()
-                    if symbol not in SYMBOLS:
-                        continue
+def handle_force_order(st, data, now):
+    order = data.get("o", {})
+    qty = float(order.get("q", 0) or 0)
+    side = "long" if order.get("S") == "SELL" else "short"
 
-                    now = time.time()
+    liq_price = float(order.get("ap") or order.get("p") or 0)
+    if liq_price <= 0:
+        liq_price = st.mark_price or 0
 
-                    if "markPrice" in stream:
-                        funding[symbol] = float(data["r"])
-                        mark_price[symbol] = float(data["p"])
-                        touch(symbol)
+    st.liqs.add(now, side, qty * liq_price)
+    st.last_force_order_ts = int(now)
+    st.last_update = int(now)
+    st.liq_msgs += 1
+    if RISK_TRIGGERS_ENABLED:
+        triggers.on_liquidation(st)
 
-                    elif "aggTrade" in stream:
-                        qty = float(data["q"])
-                        side = "short" if data["m"] else "long"
 
-                        trades_window[symbol].append((now, qty, side))
-                        trade_totals[symbol][side] += qty
-                        cleanup_trades(symbol)
+STREAM_HANDLERS = (
+    ("markPrice@1s", handle_mark_price),
+    ("aggTrade", handle_agg_trade),
+    ("forceOrder", handle_force_order),
+)
 
-                        long_short_ratio[symbol] = {
-                            "long": trade_totals[symbol]["long"],
-                            "short": trade_totals[symbol]["short"]
-                        }
 
-                        touch(symbol)
+def build_stream_table(symbols):
+    """stream name -> (SymbolState, handler); строится один раз на подключение."""
+    return {
+        f"{s.lower()}@{suffix}": (states[s], handler)
+        for s in symbols
+        for suffix, handler in STREAM_HANDLERS
+    }
 
-                    elif "forceOrder" in stream:
-                        order = data.get("o", {})
-                        qty = float(order.get("q", 0) or 0)
-                        side = "long" if order.get("S") == "SELL" else "short"
 
-                        liq_price = float(order.get("ap") or order.get("p") or 0)
-                        if liq_price <= 0:
-                            liq_price = mark_price.get(symbol, 0)
+def dispatch(raw, table):
+    """Декодирует кадр combined stream и вызывает обработчик. False — кадр не наш."""
+    msg = _loads(raw)
+    entry = table.get(msg.get("stream"))
+    if entry is None:
+        return False
 
-                        liq_notional = qty * liq_price
+    st, handler = entry
+    handler(st, msg["data"], clock.now())
+    return True
 
-                        liq_window[symbol].append((now, liq_notional, side))
-                        liq_totals[symbol][side] += liq_notional
-                        cleanup_liq(symbol)
 
-                        liq_sides[symbol] = {
-                            "long": liq_totals[symbol]["long"],
-                            "short": liq_totals[symbol]["short"],
-                        }
+# =========================
+# SHARDS
+# =========================
+
+BINANCE_WS_URL = "wss://fstream.binance.com/stream"
+
+shard_health = {}  # shard_id -> {"connected", "symbols", "messages", ...}
+
+HANDLER_SECONDS = metrics.Histogram(
+    "binance_ws_handler_seconds",
+    f"Frame decode + handler time, sampled every {metrics.HANDLER_SAMPLE_EVERY}th frame",
+)
+
+
+@metrics.collector
+def _ws_metrics():
+    st_list = list(states.values())
+    shards = list(shard_health.items())
+    return [
+        ("binance_ws_messages_total", "counter", "Frames handled per symbol and stream", [
+            ({"symbol": st.symbol, "stream": stream}, n)
+            for st in st_list
+            for stream, n in (
+                ("markPrice", st.mark_msgs),
+                ("aggTrade", st.trade_msgs),
+                ("forceOrder", st.liq_msgs),
+            )
+        ]),
+        ("binance_window_buckets", "gauge", "Occupied one-second buckets in rolling windows", [
+            ({"symbol": st.symbol, "window": name}, w._live)
+            for st in st_list
+            for name, w in (("trades", st.trades), ("liqs", st.liqs))
+        ]),
+        ("binance_ws_connected", "gauge", "Shard connection state", [
+            ({"shard": i}, h["connected"]) for i, h in shards
+        ]),
+        ("binance_ws_reconnects_total", "counter", "Shard reconnects", [
+            ({"shard": i}, h["reconnects"]) for i, h in shards
+        ]),
+        ("binance_ws_backoff_seconds", "gauge", "Current reconnect backoff", [
+            ({"shard": i}, h["backoff"]) for i, h in shards
+        ]),
+        ("binance_ws_shard_messages_total", "counter", "Frames received per shard", [
+            ({"shard": i}, h["messages"]) for i, h in shards
+        ]),
+    ]
+
+
+def plan_shards(symbols, shards=WS_SHARDS, max_streams=WS_MAX_STREAMS_PER_CONN):
+    """
+    Делит символы между соединениями. Все стримы символа живут в одном
+    шарде; раздача по кругу разводит самые активные (BTC, ETH, ...) по
+    разным сокетам.
+    """
+    per_symbol = len(STREAM_HANDLERS)
+    per_conn = max(1, max_streams // per_symbol)
+    n = max(1, shards, -(-len(symbols) // per_conn))
+    n = min(n, len(symbols)) or 1
+    return [symbols[i::n] for i in range(n)]
+
+
+async def _stall_guard(ws, health):
+    # тишина дольше WS_STALL_SECONDS = мёртвый шард, закрываем и переподключаемся
+    while True:
+        await asyncio.sleep(WS_STALL_SECONDS / 2)
+        if time.time() - health["last_msg_ts"] > WS_STALL_SECONDS:
+            await ws.close()
+            return
+
+
+async def run_shard(shard_id, symbols):
+    table = build_stream_table(symbols)
+    url = f"{BINANCE_WS_URL}?streams={'/'.join(table)}"
+    backoff = 1
+    max_backoff = 60
+
+    health = shard_health[shard_id] = {
+        "symbols": len(symbols),
+        "connected": False,
+        "connects": 0,
+        "reconnects": 0,
+        "messages": 0,
+        "last_msg_ts": None,
+        "backoff": 0,
+        "last_error": None,
+    }
+
+    while True:
+        try:
+            async with websockets.connect(url, ping_interval=20) as ws:
+                backoff = 1
+                health["connected"] = True
+                health["connects"] += 1
+                health["backoff"] = 0
+                health["last_msg_ts"] = int(time.time())
+
+                guard = asyncio.create_task(_stall_guard(ws, health))
+                try:
+                    async for raw in ws:
+                        if recorder.ENABLED:
+                            recorder.record("ws", raw)
+                        if health["messages"] % metrics.HANDLER_SAMPLE_EVERY:
+                            dispatch(raw, table)
+                        else:
+                            t0 = time.perf_counter()
+                            dispatch(raw, table)
+                            HANDLER_SECONDS.observe(time.perf_counter() - t0)
+                        health["messages"] += 1
+                        health["last_msg_ts"] = int(time.time())
+                finally:
+                    guard.cancel()
 
-                        liquidations[symbol] = (
-                            liq_sides[symbol]["long"] + liq_sides[symbol]["short"]
-                        )
-                        last_force_order_ts[symbol] = int(now)
-                        touch(symbol)
+            raise ConnectionError("stream closed")
 
         except Exception as exc:
+            health["connected"] = False
+            health["reconnects"] += 1
+            health["backoff"] = backoff
+            health["last_error"] = type(exc).__name__
 
             log_event("ws_error", {
+                "shard": shard_id,
                 "error_type": type(exc).__name__,
                 "error": str(exc),
                 "backoff": backoff,
@@ -131,3 +255,9 @@ async def binance_ws():
             backoff = min(backoff * 2, max_backoff)
 
 
+async def binance_ws(symbols=SYMBOLS):
+    """Запускает по шарду на соединение; все пишут в общее состояние по символам."""
+    shard_health.clear()
+    await asyncio.gather(
+        *(run_shard(i, part) for i, part in enumerate(plan_shards(symbols)))
+    )